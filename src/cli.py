@@ -0,0 +1,243 @@
+# cli.py
+"""Headless command line interface for the search and export engine.
+
+Examples:
+    python cli.py export --folder profiles --output out.csv -x "//unit/@id" --headers "Unit Id"
+    python cli.py watch --folder drop --output out.csv -x "//unit/@id" --headers "Unit Id" --rewrite
+    python cli.py batch --folder profiles --output-dir exports --job "Config A" --job "Config B"
+    python cli.py export --folder /mnt/archive --output /mnt/share/out.2.csv -x "//unit/@id" --headers "Unit Id" --shard 2/4
+    python cli.py merge --output /mnt/share/out.csv --order-by-filename /mnt/share/out.*.csv
+    python cli.py export --folder profiles --output out.csv -x "//unit/@id" --headers "Unit Id" --retry-failed
+    python cli.py export --folder profiles --output out.csv -x "//unit/@id" --headers "Unit Id" --trace --trace-sample 10
+    python cli.py export --folder profiles --output out.csv -x "//unit/@id" --headers "Unit Id" --layout long --max-column-matches 1000
+    python cli.py export --folder profiles --output out.xlsx -x "//unit/@id" --headers "Unit Id"
+"""
+from pathlib import Path
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+
+from modules.export_sharding import merge_shard_outputs, parse_shard
+from modules.folder_watcher import OUTPUT_APPEND, OUTPUT_REWRITE, WatchExport
+from modules.memory_budget import AUTO_MEMORY_BUDGET
+from modules.multi_job_export import create_multi_job_exporter, jobs_from_saved_configs
+from modules.row_expansion import ROW_LAYOUT_WIDE, ROW_LAYOUTS
+from modules.task_scheduler import SCHEDULING_POLICIES
+from modules.xml_namespaces import parse_namespace_map
+from modules.xpath_search_and_csv_export import create_xpath_searcher_and_csv_exporter
+
+
+def connect_logging_signals(worker):
+    """Route the signals of an export worker to logging instead of widgets."""
+    worker.signals.program_output_progress_append.connect(logging.info)
+    worker.signals.program_output_progress_set_text.connect(logging.info)
+    worker.signals.info_occurred.connect(lambda title, message: logging.info(f"{title}: {message}"))
+    worker.signals.warning_occurred.connect(lambda title, message: logging.warning(f"{title}: {message}"))
+    worker.signals.error_occurred.connect(lambda title, message: logging.error(f"{title}: {message}"))
+
+
+def _add_job_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--folder", required=True, help="Folder with the XML files")
+    parser.add_argument("--output", required=True,
+                        help="Output CSV file, or .xlsx for a workbook split into sheets at Excel's row limit")
+    parser.add_argument("-x", "--xpath", action="append", required=True, dest="xpaths",
+                        help="XPath expression, repeat for several columns")
+    parser.add_argument("--headers", required=True, help="Comma separated CSV headers, one per XPath")
+    parser.add_argument("--group-matches", action="store_true", help="One row per file, values joined with ';'")
+    parser.add_argument("--threads", default="auto", help="Worker threads or 'auto' (default)")
+    parser.add_argument("--scheduling", choices=SCHEDULING_POLICIES, default="directory", help="Task scheduling policy")
+    parser.add_argument("--dedup", action="store_true", help="Evaluate identical files once")
+    parser.add_argument("--namespaces", help="Namespace prefixes as 'prefix=uri,prefix2=uri2' (default: detect)")
+    parser.add_argument("--io-threads", type=int, default=0,
+                        help="Threads reading files ahead of the parser threads (default 0: no prefetch)")
+    parser.add_argument("--trust-declared-encoding", action="store_false", dest="detect_encodings",
+                        help="Parse files in their declared encoding instead of detecting it from the content")
+    parser.add_argument("--memory-budget-mb", type=_memory_budget, default=AUTO_MEMORY_BUDGET, dest="memory_budget",
+                        help="Memory for parsed XML trees in MB, 'auto' (default) or 0 for no limit")
+    parser.add_argument("--layout", choices=ROW_LAYOUTS, default=ROW_LAYOUT_WIDE,
+                        help="Rows with a column per XPath (wide, default) or Filename, Column, Index, Value (long)")
+    parser.add_argument("--max-column-matches", type=int, default=0,
+                        help="Values written per column of a file at most (default 0: all)")
+    parser.add_argument("--max-file-rows", type=int, default=0,
+                        help="Rows written per file at most (default 0: all)")
+
+
+def _memory_budget(value: str) -> int | str:
+    """--memory-budget-mb value as memory_budget_bytes."""
+    if value == AUTO_MEMORY_BUDGET:
+        return value
+    return int(float(value) * 1_048_576)
+
+
+def _job_options(args: argparse.Namespace) -> dict:
+    options = {
+        "scheduling_policy": args.scheduling,
+        "deduplicate_files": args.dedup,
+        "io_threads": args.io_threads,
+        "memory_budget_bytes": args.memory_budget,
+        "detect_encodings": args.detect_encodings,
+        "row_layout": args.layout,
+        "max_column_matches": args.max_column_matches,
+        "max_file_rows": args.max_file_rows,
+    }
+    if args.namespaces:
+        options["namespaces"] = parse_namespace_map(args.namespaces.replace(",", "\n"))
+    return options
+
+
+def _headers(args: argparse.Namespace) -> list:
+    return [h.strip() for h in args.headers.split(",") if h.strip()]
+
+
+def run_export(args: argparse.Namespace) -> int:
+    exporter = create_xpath_searcher_and_csv_exporter(
+        args.folder, args.xpaths, args.output, _headers(args), args.group_matches, args.threads,
+        shard=args.shard, retry_failed_files=args.retry_failed,
+        trace_stages=args.trace, trace_sample_every=args.trace_sample,
+        write_metrics=args.metrics, prometheus_textfile_dir=args.prometheus_dir, **_job_options(args)
+    )
+    failed = []
+    connect_logging_signals(exporter)
+    exporter.signals.error_occurred.connect(lambda title, message: failed.append(title))
+    exporter.signals.warning_occurred.connect(lambda title, message: failed.append(title))
+    # Ctrl+C aborts like the GUI's stop button. stop() takes the pool's lock, which the
+    # interrupted main thread may hold, so it runs on a thread of its own
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: threading.Thread(target=exporter.stop, daemon=True).start())
+    exporter.run()
+    return 1 if failed else 0
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    try:
+        watch = WatchExport(
+            args.folder, args.output, args.xpaths, _headers(args),
+            group_matches_flag=args.group_matches,
+            max_threads=args.threads,
+            poll_interval=args.interval,
+            debounce=args.debounce,
+            output_policy=OUTPUT_REWRITE if args.rewrite else OUTPUT_APPEND,
+            max_batch_files=args.max_batch_files,
+            process_existing=not args.skip_existing,
+            export_options=_job_options(args),
+            connect_signals=connect_logging_signals,
+        )
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+    stop_event = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop_event.set())
+    watch.run(stop_event, max_cycles=1 if args.once else None)
+    logging.info(f"Watcher stopped after {watch.cycles} cycles, {watch.exported_files} files exported, "
+                 f"{watch.rejected_files} incomplete files skipped")
+    return 0
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    with open(args.config, "r", encoding="utf-8") as f:
+        configs = json.load(f).get("custom_xpaths_autofill", {})
+    names = args.jobs or list(configs)
+    missing = [name for name in names if name not in configs]
+    if missing:
+        logging.error(f"Unknown saved configs: {', '.join(missing)} (available: {', '.join(configs)})")
+        return 2
+
+    exporter = create_multi_job_exporter(
+        args.folder, jobs_from_saved_configs(configs, names, args.output_dir, args.group_matches),
+        args.threads, args.scheduling, memory_budget_bytes=args.memory_budget
+    )
+    failed = []
+    connect_logging_signals(exporter)
+    exporter.signals.error_occurred.connect(lambda title, message: failed.append(title))
+    exporter.signals.warning_occurred.connect(lambda title, message: failed.append(title))
+    exporter.run()
+    return 1 if failed else 0
+
+
+def run_merge(args: argparse.Namespace) -> int:
+    try:
+        result = merge_shard_outputs(args.inputs, args.output, args.order_by_filename)
+    except ValueError as e:
+        logging.error(str(e))
+        return 2
+    stats = result.stats
+    logging.info(f"Merged {len(args.inputs)} shard outputs into {result.output_path}: {result.rows_written} rows, "
+                 f"{stats['processed_files']}/{stats['total_files']} files, {stats['total_matches']} matches")
+    return 1 if result.warnings else 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="xmluvation", description="Headless XML search and CSV export")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Debug logging")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = commands.add_parser("export", help="Export all files of a folder once")
+    _add_job_arguments(export_parser)
+    export_parser.add_argument("--shard", type=parse_shard,
+                               help="Only export shard i of N (e.g. 2/4), files are assigned by a hash of their name")
+    export_parser.add_argument("--retry-failed", action="store_true",
+                               help="Only export the files journaled as failed by the last run (<output>.errors.jsonl) "
+                                    "and append their rows")
+    export_parser.add_argument("--trace", action="store_true",
+                               help="Write the time of every pipeline stage per thread to <output>.trace.json "
+                                    "(Chrome trace format, open in chrome://tracing or ui.perfetto.dev)")
+    export_parser.add_argument("--trace-sample", type=int, default=1, metavar="N",
+                               help="Only trace the stages of every N-th file (default 1: all files)")
+    export_parser.add_argument("--no-metrics", action="store_false", dest="metrics",
+                               help="Don't write the run metrics to <output>.metrics.json")
+    export_parser.add_argument("--prometheus-dir", metavar="DIR",
+                               help="Also write the run metrics as a .prom file for the node exporter "
+                                    "textfile collector")
+    export_parser.set_defaults(func=run_export)
+
+    watch_parser = commands.add_parser("watch", help="Watch a folder and export new or changed files")
+    _add_job_arguments(watch_parser)
+    watch_parser.add_argument("--interval", type=float, default=2.0, help="Seconds between folder scans")
+    watch_parser.add_argument("--debounce", type=float, default=5.0,
+                              help="Seconds a file must stay unchanged before it is exported")
+    watch_parser.add_argument("--rewrite", action="store_true",
+                              help="Replace the rows of changed and deleted files instead of appending")
+    watch_parser.add_argument("--max-batch-files", type=int, default=2000, help="Files exported per cycle at most")
+    watch_parser.add_argument("--skip-existing", action="store_true",
+                              help="Only export files that appear or change after the start")
+    watch_parser.add_argument("--once", action="store_true", help="Run a single cycle and exit")
+    watch_parser.set_defaults(func=run_watch)
+
+    batch_parser = commands.add_parser("batch", help="Run several saved configs in one pass over a folder")
+    batch_parser.add_argument("--folder", required=True, help="Folder with the XML files")
+    batch_parser.add_argument("--output-dir", required=True, help="Folder for the '<config name>.csv' outputs")
+    batch_parser.add_argument("--config", default=str(Path(__file__).parent / "config" / "config.json"),
+                              help="config.json with the pre-built XPaths (default: the GUI config)")
+    batch_parser.add_argument("--job", action="append", dest="jobs",
+                              help="Saved config name, repeat for several (default: all)")
+    batch_parser.add_argument("--group-matches", action="store_true", help="One row per file, values joined with ';'")
+    batch_parser.add_argument("--threads", default="auto", help="Worker threads or 'auto' (default)")
+    batch_parser.add_argument("--scheduling", choices=SCHEDULING_POLICIES, default="directory",
+                              help="Task scheduling policy")
+    batch_parser.add_argument("--memory-budget-mb", type=_memory_budget, default=AUTO_MEMORY_BUDGET,
+                              dest="memory_budget",
+                              help="Memory for parsed XML trees in MB, 'auto' (default) or 0 for no limit")
+    batch_parser.set_defaults(func=run_batch)
+
+    merge_parser = commands.add_parser("merge", help="Combine the outputs of a sharded export")
+    merge_parser.add_argument("--output", required=True, help="Merged CSV file")
+    merge_parser.add_argument("--order-by-filename", action="store_true",
+                              help="K-way merge the rows by filename instead of concatenating the shards")
+    merge_parser.add_argument("inputs", nargs="+", help="Shard CSV outputs")
+    merge_parser.set_defaults(func=run_merge)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(message)s")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
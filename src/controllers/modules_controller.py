@@ -8,6 +8,10 @@ from modules.xpath_search_and_csv_export import create_xpath_searcher_and_csv_ex
 from modules.file_cleanup import create_lobster_profile_cleaner, create_csv_column_dropper
 from modules.xml_parser import create_xml_parser
 from modules.csv_converter import create_csv_conversion_thread
+from modules.corpus_index import create_corpus_indexer
+from modules.columnar_store import create_columnar_store_builder
+from modules.multi_job_export import create_multi_job_exporter, jobs_from_saved_configs
+from modules.worker_pool import PRIORITY_INTERACTIVE, PRIORITY_NORMAL
 
 from typing import TYPE_CHECKING
 
@@ -214,8 +218,8 @@ class CSVConversionHandler:
             converter = create_csv_conversion_thread(
                 "convert_csv", self.csv_file_to_convert, self.extension_type, self.write_index, self.label_loading_gif)
             self.main_window.connect_csv_conversion_signals(converter)
-            # Start the conversion thread
-            self.main_window.thread_pool.start(converter)
+            # Start the conversion on the shared worker pool
+            self.main_window.worker_pool.start(converter, PRIORITY_NORMAL)
             # Optional: Keep track of the worker
             self.main_window.active_workers.append(converter)
         except FileNotFoundError as e:
@@ -282,7 +286,7 @@ class AddXPathExpressionToListHandler:
                     self.main_window, "Empty XPath", "Please enter a XPath expression.")
                 return False
 
-            validator = create_xpath_validator()
+            validator = create_xpath_validator(namespace_map=self.main_window.namespace_map)
 
             if "," in self.xpath_expression:
                 try:
@@ -350,7 +354,7 @@ class SearchAndExportToCSVHandler:
     functions as a service that orchestrates business logic.
     """
 
-    def __init__(self, main_window: "MainWindow", xml_folder_path: str, xpath_filters: list, csv_folder_output_path: str, csv_headers_input: str, group_matches_flag: bool, set_max_threads: int):
+    def __init__(self, main_window: "MainWindow", xml_folder_path: str, xpath_filters: list, csv_folder_output_path: str, csv_headers_input: str, group_matches_flag: bool, set_max_threads: int | str, export_options: dict | None = None):
         self.main_window = main_window
         self.xml_folder_path = xml_folder_path
         self.xpath_filters = xpath_filters
@@ -358,6 +362,8 @@ class SearchAndExportToCSVHandler:
         self.csv_headers_input = csv_headers_input
         self.group_matches_flag = group_matches_flag
         self.set_max_threads = set_max_threads
+        # Additional keyword options for the exporter (scheduling policy, ...)
+        self.export_options = export_options or {}
         self.current_exporter = None
 
     # === CSV Exporting Process === #
@@ -365,7 +371,7 @@ class SearchAndExportToCSVHandler:
         """Initializes and starts the CSV export in a new thread."""
         try:
             exporter = create_xpath_searcher_and_csv_exporter(self.xml_folder_path, self.xpath_filters, self.csv_folder_output_path, self._parse_csv_headers(
-                self.csv_headers_input), self.group_matches_flag, self.set_max_threads)
+                self.csv_headers_input), self.group_matches_flag, self.set_max_threads, **self.export_options)
             self.current_exporter = exporter
             self.main_window.connect_csv_export_signals(self.current_exporter)
             self.main_window.thread_pool.start(self.current_exporter)
@@ -392,6 +398,95 @@ class SearchAndExportToCSVHandler:
         return [h.strip() for h in raw_headers.split(",") if h.strip()]
     
 
+class MultiJobExportHandler:
+    """Runs several saved XPath configs over one folder, parsing every file once."""
+
+    def __init__(self, main_window: "MainWindow", xml_folder_path: str, configs: dict, config_names: list,
+                 output_folder: str, group_matches_flag: bool, set_max_threads: int | str, export_options: dict | None = None):
+        self.main_window = main_window
+        self.xml_folder_path = xml_folder_path
+        self.configs = configs
+        self.config_names = config_names
+        self.output_folder = output_folder
+        self.group_matches_flag = group_matches_flag
+        self.set_max_threads = set_max_threads
+        self.export_options = export_options or {}
+        self.current_exporter = None
+
+    def start_multi_job_export(self) -> None:
+        """Initializes and starts the single-pass export of all selected configs."""
+        try:
+            jobs = jobs_from_saved_configs(self.configs, self.config_names, self.output_folder, self.group_matches_flag)
+            exporter = create_multi_job_exporter(
+                self.xml_folder_path, jobs, self.set_max_threads,
+                self.export_options.get("scheduling_policy", "directory"),
+                self.export_options.get("namespaces"),
+                self.export_options.get("memory_budget_bytes", "auto")
+            )
+            self.current_exporter = exporter
+            self.main_window.connect_csv_export_signals(exporter)
+            self.main_window.thread_pool.start(exporter)
+            # Optional: Keep track of the worker
+            self.main_window.active_workers.append(exporter)
+
+        except Exception as ex:
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments: {ex.args!r}"
+            QMessageBox.critical(
+                self.main_window, "Exception on starting the single-pass export", message)
+
+    def stop_csv_export(self) -> None:
+        """Signals the running single-pass export to stop."""
+        if self.current_exporter:
+            self.current_exporter.stop()
+            self.current_exporter = None
+
+
+class CorpusIndexHandler:
+    """Builds or incrementally updates the corpus index of an XML folder in a background thread."""
+
+    def __init__(self, main_window: "MainWindow", xml_folder_path: str, set_max_threads: int | str):
+        self.main_window = main_window
+        self.xml_folder_path = xml_folder_path
+        self.set_max_threads = set_max_threads
+
+    def start_corpus_index_build(self) -> None:
+        """Initializes and starts the corpus index build as a new thread."""
+        try:
+            indexer = create_corpus_indexer(self.xml_folder_path, self.set_max_threads)
+            self.main_window.connect_corpus_index_signals(indexer)
+            self.main_window.thread_pool.start(indexer)
+            # Optional: Keep track of the worker
+            self.main_window.active_workers.append(indexer)
+
+        except Exception as ex:
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments: {ex.args!r}"
+            QMessageBox.critical(
+                self.main_window, "Exception on starting to build the corpus index", message)
+
+
+class ColumnarStoreHandler:
+    """Shreds an XML folder into the columnar Parquet store in a background thread."""
+
+    def __init__(self, main_window: "MainWindow", xml_folder_path: str, set_max_threads: int | str):
+        self.main_window = main_window
+        self.xml_folder_path = xml_folder_path
+        self.set_max_threads = set_max_threads
+
+    def start_columnar_store_build(self) -> None:
+        """Initializes and starts the columnar store build as a new thread."""
+        try:
+            builder = create_columnar_store_builder(self.xml_folder_path, self.set_max_threads)
+            self.main_window.connect_columnar_store_signals(builder)
+            self.main_window.thread_pool.start(builder)
+            # Optional: Keep track of the worker
+            self.main_window.active_workers.append(builder)
+
+        except Exception as ex:
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments: {ex.args!r}"
+            QMessageBox.critical(
+                self.main_window, "Exception on starting to build the columnar store", message)
+
+
 class LobsterProfileExportCleanupHandler:
     """Handles methods and logic of the lobster profile cleanup based on the selected csv file and the folder path that contains all lobster profile exports as XML files."""
 
@@ -481,9 +576,10 @@ class ParseXMLFileHandler:
     def start_xml_parsing(self) -> None:
         """Parse XML file and display content."""
         try:
-            xml_parser = create_xml_parser(self.xml_file_path)
+            xml_parser = create_xml_parser(self.xml_file_path, self.main_window.namespace_map)
             self.main_window.connect_xml_parsing_signals(xml_parser)
-            self.main_window.thread_pool.start(xml_parser)
+            # Interactive, runs ahead of the tasks of a running export
+            self.main_window.worker_pool.start(xml_parser, PRIORITY_INTERACTIVE)
             # Optional: Keep track of the worker
             self.main_window.active_workers.append(xml_parser)
 
@@ -534,7 +630,8 @@ class XPathBuildHandler:
                 self.radio_contains,
                 self.radio_starts_with,
                 self.radio_greater,
-                self.radio_smaller
+                self.radio_smaller,
+                self.main_window.namespace_map
             )
 
             self.main_window.connect_xpath_builder_signals(builder)
@@ -42,6 +42,18 @@ class SignalConnector:
         worker.signals.visible_state_widget.connect(self.main_window.handle_visible_state_widget)
         worker.signals.finished.connect(self.main_window.handle_csv_export_finished)
     
+    def connect_corpus_index_signals(self, worker):
+        """Connect signals for corpus index builds."""
+        worker.signals.error_occurred.connect(self.main_window.handle_critical_message)
+        worker.signals.program_output_progress_append.connect(self.main_window.handle_program_output_append)
+        worker.signals.progressbar_update.connect(self.main_window.handle_progress_bar_update)
+
+    def connect_columnar_store_signals(self, worker):
+        """Connect signals for columnar store builds."""
+        worker.signals.error_occurred.connect(self.main_window.handle_critical_message)
+        worker.signals.program_output_progress_append.connect(self.main_window.handle_program_output_append)
+        worker.signals.progressbar_update.connect(self.main_window.handle_progress_bar_update)
+
     def connect_file_cleanup_signals(self, worker):
         """Connect signals for file cleanup operations."""
         worker.signals.error_occurred.connect(self.main_window.handle_critical_message)
@@ -102,7 +102,8 @@ class ButtonEventHandler:
         self.main_window.helper.browse_save_file_as_helper(
             dialog_message="Save as",
             line_widget=self.main_window.ui.line_edit_csv_output_path,
-            file_extension_filter="CSV File (*.csv)",
+            # A workbook is written directly, split into sheets at Excel's row limit
+            file_extension_filter="CSV File (*.csv);;Excel Workbook (*.xlsx)",
             filename_placeholder=f"Evaluation_{datetime.datetime.now().strftime('%Y.%m.%d_%H%M')}.csv"
         )
     
@@ -226,6 +227,7 @@ class ButtonEventHandler:
                 csv_headers_input=csv_headers_input,
                 group_matches_flag=group_matches_flag,
                 set_max_threads=self.main_window.set_max_threads,
+                export_options=self.main_window.get_export_options(),
             )
             self.main_window._csv_exporter_handler_ref.start_csv_export()
         except Exception as ex:
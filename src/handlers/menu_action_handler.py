@@ -1,7 +1,8 @@
 # File: controllers/menu_action_handler.py
 """Handler for menu bar action events."""
 import webbrowser
-from PySide6.QtWidgets import QMessageBox
+from PySide6.QtWidgets import QMessageBox, QInputDialog, QDialog, QDialogButtonBox, QListWidget, QListWidgetItem, QVBoxLayout
+from PySide6.QtCore import Qt
 from PySide6.QtCore import Slot
 from typing import TYPE_CHECKING
 
@@ -116,6 +117,102 @@ class MenuActionHandler:
         is_checked = self.main_window.ui.prompt_on_exit_action.isChecked()
         self.main_window.settings.setValue("prompt_on_exit", is_checked)
     
+    @Slot()
+    def on_edit_namespace_prefixes(self):
+        """Edit the namespace prefix map used by the XPath builder and the export."""
+        from modules.xml_namespaces import detect_folder_namespace_map, format_namespace_map, parse_namespace_map
+
+        try:
+            namespace_map = self.main_window.namespace_map
+            folder_path = self.main_window.ui.line_edit_xml_folder_path_input.text()
+            if not namespace_map and folder_path:
+                # Nothing set yet, start from the namespaces of a sample of the input folder
+                namespace_map = detect_folder_namespace_map(folder_path)
+
+            text, ok = QInputDialog.getMultiLineText(
+                self.main_window,
+                "Namespace Prefixes",
+                "One prefix=namespace URI per line, use the prefixes in XPath expressions (e.g. //ns:item).\n"
+                "Leave empty to detect the namespaces from the XML files on export.",
+                format_namespace_map(namespace_map)
+            )
+            if ok:
+                self.main_window.set_namespace_map(parse_namespace_map(text))
+        except ValueError as e:
+            QMessageBox.warning(self.main_window, "Invalid Namespace Prefixes", str(e))
+        except Exception as ex:
+            message = f"An exception of type {type(ex).__name__} occurred. Arguments: {ex.args!r}"
+            QMessageBox.critical(self.main_window, "Exception editing namespace prefixes", message)
+
+    def on_build_corpus_index(self):
+        """Build or incrementally update the corpus index of the XML input folder."""
+        import os
+        from controllers.modules_controller import CorpusIndexHandler
+
+        folder_path = self.main_window.ui.line_edit_xml_folder_path_input.text()
+        if not folder_path or not os.path.isdir(folder_path):
+            QMessageBox.warning(self.main_window, "No Folder Selected", "Please select a folder with XML files first.")
+            return
+        CorpusIndexHandler(self.main_window, folder_path, self.main_window.set_max_threads).start_corpus_index_build()
+
+    def on_build_columnar_store(self):
+        """Shred the XML input folder into the columnar store."""
+        import os
+        from controllers.modules_controller import ColumnarStoreHandler
+
+        folder_path = self.main_window.ui.line_edit_xml_folder_path_input.text()
+        if not folder_path or not os.path.isdir(folder_path):
+            QMessageBox.warning(self.main_window, "No Folder Selected", "Please select a folder with XML files first.")
+            return
+        ColumnarStoreHandler(self.main_window, folder_path, self.main_window.set_max_threads).start_columnar_store_build()
+
+    def on_run_saved_configs_in_one_pass(self):
+        """Export several pre-built XPath configs with a single parse of every file.
+
+        Each config writes '<config name>.csv' into the folder of the CSV output path.
+        """
+        import os
+        from controllers.modules_controller import MultiJobExportHandler
+
+        folder_path = self.main_window.ui.line_edit_xml_folder_path_input.text()
+        csv_output_path = self.main_window.ui.line_edit_csv_output_path.text()
+        if not folder_path or not os.path.isdir(folder_path):
+            QMessageBox.information(self.main_window, "Invalid XML Folder", "Please select a valid XML folder directory.")
+            return
+        if not csv_output_path:
+            QMessageBox.information(self.main_window, "Invalid CSV Output", "Please select a CSV output directory.")
+            return
+
+        configs = self.main_window.config_handler.get("custom_xpaths_autofill", {})
+        dialog = QDialog(self.main_window)
+        dialog.setWindowTitle("Run Several in One Pass")
+        layout = QVBoxLayout(dialog)
+        list_widget = QListWidget(dialog)
+        for name in configs:
+            item = QListWidgetItem(name, list_widget)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Unchecked)
+        buttons = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel, dialog)
+        buttons.accepted.connect(dialog.accept)
+        buttons.rejected.connect(dialog.reject)
+        layout.addWidget(list_widget)
+        layout.addWidget(buttons)
+        if dialog.exec() != QDialog.Accepted:
+            return
+
+        names = [list_widget.item(i).text() for i in range(list_widget.count())
+                 if list_widget.item(i).checkState() == Qt.Checked]
+        if not names:
+            return
+        self.main_window._csv_exporter_handler_ref = MultiJobExportHandler(
+            self.main_window, folder_path, configs, names,
+            os.path.dirname(csv_output_path) or ".",
+            self.main_window.ui.checkbox_group_matches.isChecked(),
+            self.main_window.set_max_threads,
+            self.main_window.get_export_options()
+        )
+        self.main_window._csv_exporter_handler_ref.start_multi_job_export()
+
     @Slot(str)
     def on_set_xpath_expression_in_input(self, expression: str):
         """Set XPath expression in input field."""
@@ -7,7 +7,7 @@ from pathlib import Path
 from PySide6.QtWidgets import QMessageBox
 from PySide6.QtGui import QIcon, QMovie
 from PySide6.QtCore import Slot
-from typing import List, TYPE_CHECKING
+from typing import Dict, List, TYPE_CHECKING
 
 from gui.main.XMLuvation_ui import Ui_MainWindow
 
@@ -30,7 +30,7 @@ class SignalHandlerMixin:
     recent_xpath_expressions: List[str]
     settings: 'QSettings'
     cb_state_controller: 'ComboboxStateHandler'
-    set_max_threads: int
+    set_max_threads: int | str
     current_theme: str
     config_handler: 'ConfigHandler'
     theme_icon: QIcon
@@ -38,6 +38,7 @@ class SignalHandlerMixin:
     _main_thread_loading_movie_ref: QMovie | None = None
     helper: 'HelperMethods'
     ui_state_manager: 'UIStateManager'  # UI state management service
+    namespace_map: Dict[str, str]  # Job namespace prefix map
     
     def initialize_handlers(self):
         """Initialize all specialized event handlers."""
@@ -79,6 +80,14 @@ class SignalHandlerMixin:
         """Connect signals for CSV export operations."""
         self.signal_connector.connect_csv_export_signals(worker)
     
+    def connect_corpus_index_signals(self, worker):
+        """Connect signals for corpus index builds."""
+        self.signal_connector.connect_corpus_index_signals(worker)
+    
+    def connect_columnar_store_signals(self, worker):
+        """Connect signals for columnar store builds."""
+        self.signal_connector.connect_columnar_store_signals(worker)
+    
     def connect_file_cleanup_signals(self, worker):
         """Connect signals for file cleanup operations."""
         self.signal_connector.connect_file_cleanup_signals(worker)
@@ -234,6 +243,10 @@ class SignalHandlerMixin:
             self.ui.text_edit_program_output.append(info_message)
 
             self._parsed_xml_data_ref = result
+            # Keep prefixes of newly seen namespaces so built XPaths stay valid for the export
+            namespace_map = result.get("namespace_map", {})
+            if namespace_map and namespace_map != self.namespace_map:
+                self.set_namespace_map(namespace_map)
             # Pass the new result data to the ComboBoxStateController
             self.cb_state_controller.set_parsed_data(result)
 
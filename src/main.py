@@ -32,6 +32,8 @@ from gui.main.XMLuvation_ui import Ui_MainWindow
 from handlers.signal_handlers import SignalHandlerMixin
 from utils.helper_methods import HelperMethods
 from services.ui_state_manager import UIStateManager
+from modules.xml_namespaces import dumps_namespace_map, loads_namespace_map
+from modules.worker_pool import WorkerPool, shared_worker_pool
 from gui.dialogs.exit_dialog import ExitDialog
 
 # ----------------------------
@@ -114,7 +116,10 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
 
     settings: QSettings
     thread_pool: QThreadPool
-    set_max_threads: int
+    worker_pool: WorkerPool
+    set_max_threads: int | str
+    export_options: Dict[str, Any]
+    namespace_map: Dict[str, str]
 
     cb_state_controller: 'ComboboxStateHandler'
     xml_text_searcher: 'SearchXMLOutputTextHandler'
@@ -170,8 +175,30 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
 
         self.thread_pool = QThreadPool()
         max_threads = self.thread_pool.maxThreadCount()
-        self.set_max_threads = max_threads
         self.thread_pool.setMaxThreadCount(max_threads)
+        # Threads shared by the tasks of exports, index builds, parsing and conversions, see WorkerPool
+        self.worker_pool = shared_worker_pool()
+        # Worker threads for the CSV export, "auto" adapts to the CPU quota and measured throughput
+        self.set_max_threads = "auto"
+        # Additional options passed to the CSV exporter, persisted under "export_options/<key>"
+        self.export_options = {
+            "scheduling_policy": "directory",
+            "resume_from_checkpoint": True,
+            "deduplicate_files": False,
+            "output_mode": "rows",
+            "use_corpus_index": False,
+            "use_columnar_store": False,
+            # Threads of the I/O stage reading files ahead of the parser threads, 0 = off
+            "io_threads": 0,
+            "detect_encodings": True,
+            # <output>.metrics.json with throughput, stage timings and errors of every run
+            "write_metrics": True,
+            # Rows with a column per XPath ("wide") or one row per value ("long"), values per column at most
+            "row_layout": "wide",
+            "max_column_matches": 0,
+        }
+        # Namespace prefix map used by the XPath builder, validation and export
+        self.namespace_map = {}
 
         self.active_workers = []
         self.config_handler = ConfigHandler(
@@ -197,6 +224,12 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
         self._update_paths_menu()
         self._update_autofill_menu()
         self._update_themes_menu()
+        self._update_worker_threads_menu()
+        self._update_scheduling_menu()
+        self._update_output_mode_menu()
+        self._update_row_layout_menu()
+        self._update_io_prefetch_menu()
+        self._update_export_options_menu()
 
     def setup_widgets_and_visibility_states(self):
         # Use UIStateManager for initial setup
@@ -235,6 +268,10 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
         self.settings.setValue("group_matches", self.ui.checkbox_group_matches.isChecked())
         self.settings.setValue("prompt_on_exit", self.ui.prompt_on_exit_action.isChecked())
         self.settings.setValue("recent_xpath_expressions", self.recent_xpath_expressions)
+        self.settings.setValue("max_threads", str(self.set_max_threads))
+        for key, value in self.export_options.items():
+            self.settings.setValue(f"export_options/{key}", value)
+        self.settings.setValue("namespace_map", dumps_namespace_map(self.namespace_map))
         save_window_state(self, self.settings) # Save windows location and state
         # optional: force write to disk
         self.settings.sync()
@@ -264,6 +301,17 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
         # Group matches checkbox
         self.ui.checkbox_group_matches.setChecked(self.group_matches_setting)
 
+        # Worker threads setting, either "auto" or a pinned thread count
+        max_threads = str(self.settings.value("max_threads", "auto"))
+        self.set_max_threads = int(max_threads) if max_threads.isdigit() else "auto"
+
+        # Export options, keep the default type of each option
+        for key, default in self.export_options.items():
+            self.export_options[key] = self.settings.value(f"export_options/{key}", default, type=type(default))
+
+        # Namespace prefix map, stored as JSON
+        self.namespace_map = loads_namespace_map(self.settings.value("namespace_map", "{}"))
+
         # Prompt on exit setting load
         prompt_value = self.settings.value("prompt_on_exit",
                                         self.ui.prompt_on_exit_action.isChecked(),
@@ -295,6 +343,7 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
 
         # always save other app settings once here
         self._save_app_settings()
+        self.worker_pool.shutdown(wait=False, cancel_futures=True)
         super().closeEvent(event)
 
     # ============= HELPER METHODS =============
@@ -344,6 +393,12 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
                 )
             )
             self.ui.menu_autofill.addAction(action)
+
+        if custom_autofill:
+            self.ui.menu_autofill.addSeparator()
+            batch_action = QAction("Run Several in One Pass...", self)
+            batch_action.triggered.connect(self.menu_handler.on_run_saved_configs_in_one_pass)
+            self.ui.menu_autofill.addAction(batch_action)
             
     def _update_themes_menu(self):
         """Update the themes menu with available themes."""
@@ -360,6 +415,183 @@ class MainWindow(QMainWindow, SignalHandlerMixin):
             if theme_name.endswith("light_theme_default"):
                 self.ui.theme_menu.addSeparator()
 
+    def _update_worker_threads_menu(self):
+        """Create the worker threads submenu in the manage menu."""
+        from modules.worker_tuning import AUTO_WORKERS, detect_cpu_budget, MAX_WORKER_CEILING
+
+        if not hasattr(self, "worker_threads_menu"):
+            self.worker_threads_menu = self.ui.settings_menu.addMenu("Worker Threads")
+        self.worker_threads_menu.clear()
+
+        cpu_budget = detect_cpu_budget()
+        choices = [AUTO_WORKERS] + [n for n in (1, 2, 4, 8, 16, 32) if n <= max(cpu_budget * 2, 1) and n <= MAX_WORKER_CEILING]
+        if cpu_budget not in choices:
+            choices.append(cpu_budget)
+        if isinstance(self.set_max_threads, int) and self.set_max_threads not in choices:
+            choices.append(self.set_max_threads)
+
+        for choice in choices:
+            label = f"Auto (CPU budget: {cpu_budget})" if choice == AUTO_WORKERS else str(choice)
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(str(choice) == str(self.set_max_threads))
+            action.triggered.connect(
+                lambda checked, value=choice: self.set_worker_threads(value)
+            )
+            self.worker_threads_menu.addAction(action)
+            if choice == AUTO_WORKERS:
+                self.worker_threads_menu.addSeparator()
+
+    def set_worker_threads(self, value: int | str):
+        """Set the worker threads used by the CSV export, "auto" or a pinned count."""
+        self.set_max_threads = value
+        self.settings.setValue("max_threads", str(value))
+        self._update_worker_threads_menu()
+
+    def _update_scheduling_menu(self):
+        """Create the task scheduling submenu in the manage menu."""
+        from modules.task_scheduler import SCHEDULING_POLICIES
+
+        if not hasattr(self, "scheduling_menu"):
+            self.scheduling_menu = self.ui.settings_menu.addMenu("Task Scheduling")
+        self.scheduling_menu.clear()
+
+        for policy in SCHEDULING_POLICIES:
+            action = QAction(policy.replace("_", " ").title(), self)
+            action.setCheckable(True)
+            action.setChecked(policy == self.export_options.get("scheduling_policy"))
+            action.triggered.connect(
+                lambda checked, value=policy: self.set_export_option("scheduling_policy", value, self._update_scheduling_menu)
+            )
+            self.scheduling_menu.addAction(action)
+
+    def _update_output_mode_menu(self):
+        """Create the output mode submenu (one row per match or corpus aggregate)."""
+        from modules.xpath_search_and_csv_export import OUTPUT_ROWS, OUTPUT_AGGREGATE
+
+        labels = {
+            OUTPUT_ROWS: "Rows (One Per Match)",
+            OUTPUT_AGGREGATE: "Aggregate (Value Frequencies)",
+        }
+
+        if not hasattr(self, "output_mode_menu"):
+            self.output_mode_menu = self.ui.settings_menu.addMenu("Output Mode")
+        self.output_mode_menu.clear()
+
+        for mode, label in labels.items():
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(mode == self.export_options.get("output_mode"))
+            action.triggered.connect(
+                lambda checked, value=mode: self.set_export_option("output_mode", value, self._update_output_mode_menu)
+            )
+            self.output_mode_menu.addAction(action)
+
+    def _update_row_layout_menu(self):
+        """Create the row layout submenu (wide or long rows, cap of the values per column)."""
+        from modules.row_expansion import ROW_LAYOUT_WIDE, ROW_LAYOUT_LONG
+
+        layouts = {
+            ROW_LAYOUT_WIDE: "Wide (Column Per XPath)",
+            ROW_LAYOUT_LONG: "Long (Row Per Value)",
+        }
+        caps = {0: "All Matches", 100: "First 100 Matches Per Column", 1000: "First 1000 Matches Per Column"}
+
+        if not hasattr(self, "row_layout_menu"):
+            self.row_layout_menu = self.ui.settings_menu.addMenu("Row Layout")
+        self.row_layout_menu.clear()
+
+        for layout, label in layouts.items():
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(layout == self.export_options.get("row_layout"))
+            action.triggered.connect(
+                lambda checked, value=layout: self.set_export_option("row_layout", value, self._update_row_layout_menu)
+            )
+            self.row_layout_menu.addAction(action)
+        self.row_layout_menu.addSeparator()
+        for cap, label in caps.items():
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(cap == self.export_options.get("max_column_matches"))
+            action.triggered.connect(
+                lambda checked, value=cap: self.set_export_option("max_column_matches", value,
+                                                                  self._update_row_layout_menu)
+            )
+            self.row_layout_menu.addAction(action)
+
+    def _update_io_prefetch_menu(self):
+        """Create the I/O prefetch submenu (threads reading files ahead of the parser threads)."""
+        labels = {0: "Off (Workers Read Files)", 2: "2 Threads", 4: "4 Threads", 8: "8 Threads"}
+
+        if not hasattr(self, "io_prefetch_menu"):
+            self.io_prefetch_menu = self.ui.settings_menu.addMenu("I/O Prefetch")
+        self.io_prefetch_menu.clear()
+
+        for io_threads, label in labels.items():
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(io_threads == self.export_options.get("io_threads"))
+            action.triggered.connect(
+                lambda checked, value=io_threads: self.set_export_option("io_threads", value,
+                                                                         self._update_io_prefetch_menu)
+            )
+            self.io_prefetch_menu.addAction(action)
+
+    def _update_export_options_menu(self):
+        """Create the export options submenu with the on/off export options."""
+        toggles = {
+            "resume_from_checkpoint": "Resume Interrupted Exports",
+            "deduplicate_files": "Skip Duplicate Files (Content Hash)",
+            "use_corpus_index": "Use Corpus Index (Skip Non-Matching Files)",
+            "use_columnar_store": "Use Columnar Store (Answer Simple XPaths)",
+            "detect_encodings": "Detect File Encodings (Fix Misdeclared Files)",
+            "write_metrics": "Write Run Metrics (JSON)",
+        }
+
+        if not hasattr(self, "export_options_menu"):
+            self.export_options_menu = self.ui.settings_menu.addMenu("Export Options")
+        self.export_options_menu.clear()
+
+        for key, label in toggles.items():
+            action = QAction(label, self)
+            action.setCheckable(True)
+            action.setChecked(bool(self.export_options.get(key)))
+            action.triggered.connect(
+                lambda checked, k=key: self.set_export_option(k, checked)
+            )
+            self.export_options_menu.addAction(action)
+
+        self.export_options_menu.addSeparator()
+        namespaces_action = QAction(f"Namespace Prefixes ({len(self.namespace_map)})...", self)
+        namespaces_action.triggered.connect(self.menu_handler.on_edit_namespace_prefixes)
+        self.export_options_menu.addAction(namespaces_action)
+        index_action = QAction("Build/Update Corpus Index", self)
+        index_action.triggered.connect(self.menu_handler.on_build_corpus_index)
+        self.export_options_menu.addAction(index_action)
+        store_action = QAction("Build Columnar Store", self)
+        store_action.triggered.connect(self.menu_handler.on_build_columnar_store)
+        self.export_options_menu.addAction(store_action)
+
+    def get_export_options(self) -> Dict[str, Any]:
+        """Options for the CSV exporter, an empty prefix map lets the exporter detect one."""
+        options = dict(self.export_options)
+        options["namespaces"] = dict(self.namespace_map) if self.namespace_map else None
+        return options
+
+    def set_namespace_map(self, namespace_map: Dict[str, str]):
+        """Set and persist the job namespace prefix map."""
+        self.namespace_map = dict(namespace_map)
+        self.settings.setValue("namespace_map", dumps_namespace_map(self.namespace_map))
+        self._update_export_options_menu()
+
+    def set_export_option(self, key: str, value: Any, refresh_menu=None):
+        """Set and persist an export option, optionally rebuilding the menu that shows it."""
+        self.export_options[key] = value
+        self.settings.setValue(f"export_options/{key}", value)
+        if refresh_menu:
+            refresh_menu()
+
     def set_theme_by_key(self, theme_key: str, save: bool = True):
         """Apply a theme by its key from THEME_FILES and optionally save the choice.
 
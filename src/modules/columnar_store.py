@@ -0,0 +1,436 @@
+# modules/columnar_store.py
+from PySide6.QtCore import QObject, QRunnable, Signal, Slot
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+import logging
+import os
+import re
+import shutil
+import threading
+import time
+
+from lxml import etree as ET
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from modules.worker_pool import PRIORITY_BULK, shared_worker_pool
+from modules.xml_encoding import detect_encoding
+from modules.worker_tuning import resolve_max_threads
+
+
+STORE_DIRNAME = ".xmluvation_store"
+NODES_FILENAME = "nodes.parquet"
+FILES_FILENAME = "files.parquet"
+# Rows buffered before a Parquet row group is written
+ROW_GROUP_ROWS = 256 * 1024
+# files.parquet metadata of stores whose files were parsed in their detected encoding
+ENCODINGS_DETECTED_KEY = b"xmluvation.encodings_detected"
+
+# Node kinds
+ELEMENT_NODE = "element"
+ATTRIBUTE_NODE = "attribute"
+TEXT_NODE = "text"
+
+NODE_SCHEMA = pa.schema([
+    ("file_id", pa.int32()),
+    ("node_id", pa.int64()),
+    ("parent_id", pa.int64()),
+    ("depth", pa.int32()),
+    ("kind", pa.dictionary(pa.int8(), pa.string())),
+    ("path", pa.string()),
+    ("tag", pa.string()),
+    ("attribute", pa.string()),
+    ("value", pa.string()),
+])
+
+FILE_SCHEMA = pa.schema([
+    ("file_id", pa.int32()),
+    ("name", pa.string()),
+    ("size", pa.int64()),
+    ("mtime_ns", pa.int64()),
+])
+
+_NAME = re.compile(r"(?:[A-Za-z_][\w.-]*:)?[A-Za-z_][\w.-]*")
+
+
+def default_store_path(folder: str | Path) -> Path:
+    """Location of the columnar store of a folder, stored next to the XML files."""
+    return Path(folder) / STORE_DIRNAME
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+def shred_xml_file(xml_file_path: str | Path, file_id: int) -> Optional[pa.RecordBatch]:
+    """Shred a document into one row per element, attribute and text node.
+
+    Nodes are numbered in document order. Attribute and text rows carry the path
+    and tag of their element; text rows hold the stripped text, whitespace-only
+    text is dropped like the export drops empty values. Names use Clark notation.
+    The file is parsed in its detected encoding, as the export parses it.
+
+    Returns:
+        RecordBatch with NODE_SCHEMA, or None if the file can't be parsed
+    """
+    try:
+        with open(xml_file_path, "rb") as f:
+            data = f.read()
+        parser = ET.XMLParser(recover=True, huge_tree=True, encoding=detect_encoding(data).parser_encoding)
+        root = ET.fromstring(data, parser, base_url=str(xml_file_path))
+    except (ET.XMLSyntaxError, OSError) as e:
+        logging.warning(f"Could not shred {xml_file_path}: {e}")
+        return None
+    if root is None:
+        return None
+
+    columns: Dict[str, list] = {name: [] for name in NODE_SCHEMA.names}
+
+    def add(node_id, parent_id, depth, kind, path, tag, attribute, value):
+        columns["node_id"].append(node_id)
+        columns["parent_id"].append(parent_id)
+        columns["depth"].append(depth)
+        columns["kind"].append(kind)
+        columns["path"].append(path)
+        columns["tag"].append(tag)
+        columns["attribute"].append(attribute)
+        columns["value"].append(value)
+
+    node_id = 0
+    # (element node id, path, depth, tag) of the open elements
+    stack: List[Tuple[int, str, int, str]] = []
+    for event, node in ET.iterwalk(root, events=("start", "end", "comment", "pi")):
+        if event == "start":
+            parent_id = stack[-1][0] if stack else None
+            path = f"{stack[-1][1] if stack else ''}/{node.tag}"
+            depth = len(stack)
+            element_id = node_id
+            add(element_id, parent_id, depth, ELEMENT_NODE, path, node.tag, None, None)
+            node_id += 1
+            for name, value in node.attrib.items():
+                add(node_id, element_id, depth + 1, ATTRIBUTE_NODE, path, node.tag, name, value)
+                node_id += 1
+            text = node.text.strip() if node.text else ""
+            if text:
+                add(node_id, element_id, depth + 1, TEXT_NODE, path, node.tag, None, text)
+                node_id += 1
+            stack.append((element_id, path, depth, node.tag))
+        else:
+            if event == "end":
+                stack.pop()
+            # The tail is a text node of the enclosing element, the root's tail is outside the document
+            tail = node.tail.strip() if node.tail else ""
+            if tail and stack:
+                parent_id, path, depth, tag = stack[-1]
+                add(node_id, parent_id, depth + 1, TEXT_NODE, path, tag, None, tail)
+                node_id += 1
+
+    columns["file_id"] = [file_id] * node_id
+    return pa.RecordBatch.from_pydict(columns, schema=NODE_SCHEMA)
+
+
+@dataclass
+class SimpleXPath:
+    """A location path the store can answer: child steps, optionally descendant at the start."""
+    descendant: bool
+    steps: List[str]  # Clark element names
+    kind: str  # ELEMENT_NODE, ATTRIBUTE_NODE or TEXT_NODE
+    attribute: Optional[str] = None
+
+    @property
+    def suffix(self) -> str:
+        return "/" + "/".join(self.steps)
+
+
+def _clark(name: str, namespaces: Dict[str, str]) -> Optional[str]:
+    if ":" not in name:
+        return name
+    prefix, local = name.split(":", 1)
+    uri = namespaces.get(prefix)
+    return f"{{{uri}}}{local}" if uri is not None else None
+
+
+def parse_simple_xpath(xpath: str, namespaces: Optional[Dict[str, str]] = None) -> Optional[SimpleXPath]:
+    """Parse expressions like ``/a/b/text()``, ``//x/@y`` or ``//a/b``.
+
+    Returns:
+        SimpleXPath, or None if the expression needs real XPath evaluation
+        (predicates, wildcards, axes, functions, inner '//' ...)
+    """
+    namespaces = namespaces or {}
+    xpath = xpath.strip()
+    if xpath.startswith("//"):
+        descendant, body = True, xpath[2:]
+    elif xpath.startswith("/"):
+        descendant, body = False, xpath[1:]
+    else:
+        return None
+    if not body or "//" in body:
+        return None
+
+    steps = body.split("/")
+    kind, attribute = ELEMENT_NODE, None
+    if steps[-1] == "text()":
+        kind = TEXT_NODE
+        steps = steps[:-1]
+    elif steps[-1].startswith("@"):
+        kind = ATTRIBUTE_NODE
+        if not _NAME.fullmatch(steps[-1][1:]):
+            return None
+        attribute = _clark(steps[-1][1:], namespaces)
+        if attribute is None:
+            return None
+        steps = steps[:-1]
+
+    if not steps:
+        return None
+    clark_steps = []
+    for step in steps:
+        if not _NAME.fullmatch(step):
+            return None
+        name = _clark(step, namespaces)
+        if name is None:
+            return None
+        clark_steps.append(name)
+    return SimpleXPath(descendant, clark_steps, kind, attribute)
+
+
+class ColumnarStore:
+    """Parquet store of shredded documents, answers simple path XPaths with Arrow filters.
+
+    Layout: ``nodes.parquet`` (NODE_SCHEMA) and ``files.parquet`` (FILE_SCHEMA) in the
+    store directory. A build replaces the whole store.
+    """
+
+    def __init__(self, folder: str | Path, store_path: Optional[str | Path] = None):
+        self.folder = Path(folder)
+        self.store_path = Path(store_path) if store_path else default_store_path(self.folder)
+        self._files: Optional[Dict[str, Tuple[int, int, int]]] = None
+
+    @property
+    def nodes_path(self) -> Path:
+        return self.store_path / NODES_FILENAME
+
+    @property
+    def files_path(self) -> Path:
+        return self.store_path / FILES_FILENAME
+
+    def exists(self) -> bool:
+        return self.nodes_path.is_file() and self.files_path.is_file()
+
+    def detects_encodings(self) -> bool:
+        """True if the files were stored in their detected encoding, stores of older builds took the declared one."""
+        metadata = pq.read_schema(self.files_path).metadata or {}
+        return metadata.get(ENCODINGS_DETECTED_KEY) == b"1"
+
+    # ============= BUILD =============
+
+    def build(self,
+              xml_files: Optional[List[str]] = None,
+              max_workers: int = 1,
+              terminate_event: Optional[threading.Event] = None,
+              progress: Optional[Callable[[int, int], None]] = None) -> Tuple[int, int]:
+        """Shred all files in parallel and replace the store.
+
+        Workers parse and shred, the coordinating thread writes row groups, so memory
+        is bounded by the submission window plus one row group.
+
+        Returns:
+            Tuple of (files stored, node rows written); (0, 0) if terminated
+        """
+        if xml_files is None:
+            xml_files = [f.name for f in self.folder.glob("*.xml") if f.is_file()]
+
+        tmp_path = self.store_path.with_name(self.store_path.name + ".tmp")
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        tmp_path.mkdir(parents=True)
+
+        def shred_one(file_id: int, xml_file: str):
+            if terminate_event is not None and terminate_event.is_set():
+                return None, None
+            signature = _file_signature(self.folder / xml_file)
+            return signature, shred_xml_file(self.folder / xml_file, file_id)
+
+        files = {name: [] for name in FILE_SCHEMA.names}
+        rows = 0
+        buffered: List[pa.RecordBatch] = []
+        buffered_rows = 0
+        done = 0
+        window = max(1, max_workers) * 4
+        work = iter(enumerate(xml_files))
+        pending = {}
+
+        with pq.ParquetWriter(tmp_path / NODES_FILENAME, NODE_SCHEMA, compression="zstd") as writer, \
+                shared_worker_pool().job("columnar store", max(1, max_workers), PRIORITY_BULK) as executor:
+            while True:
+                while len(pending) < window and not (terminate_event is not None and terminate_event.is_set()):
+                    item = next(work, None)
+                    if item is None:
+                        break
+                    pending[executor.submit(shred_one, *item)] = item
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    file_id, xml_file = pending.pop(future)
+                    signature, batch = future.result()
+                    done += 1
+                    if progress is not None:
+                        progress(done, len(xml_files))
+                    if batch is None or signature is None:
+                        continue
+                    files["file_id"].append(file_id)
+                    files["name"].append(xml_file)
+                    files["size"].append(signature[0])
+                    files["mtime_ns"].append(signature[1])
+                    buffered.append(batch)
+                    buffered_rows += batch.num_rows
+                    if buffered_rows >= ROW_GROUP_ROWS:
+                        writer.write_table(pa.Table.from_batches(buffered, NODE_SCHEMA))
+                        rows += buffered_rows
+                        buffered, buffered_rows = [], 0
+            if buffered:
+                writer.write_table(pa.Table.from_batches(buffered, NODE_SCHEMA))
+                rows += buffered_rows
+
+        if terminate_event is not None and terminate_event.is_set():
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            return 0, 0
+
+        pq.write_table(pa.Table.from_pydict(files, schema=FILE_SCHEMA.with_metadata({ENCODINGS_DETECTED_KEY: b"1"})),
+                       tmp_path / FILES_FILENAME)
+        old_path = self.store_path.with_name(self.store_path.name + ".old")
+        shutil.rmtree(old_path, ignore_errors=True)
+        if self.store_path.exists():
+            os.replace(self.store_path, old_path)
+        os.replace(tmp_path, self.store_path)
+        shutil.rmtree(old_path, ignore_errors=True)
+        self._files = None
+        return len(files["name"]), rows
+
+    # ============= QUERIES =============
+
+    def files(self) -> Dict[str, Tuple[int, int, int]]:
+        """Stored files as name -> (file_id, size, mtime_ns)."""
+        if self._files is None:
+            table = pq.read_table(self.files_path)
+            self._files = {
+                name: (file_id, size, mtime_ns) for file_id, name, size, mtime_ns in zip(
+                    *(table.column(column).to_pylist() for column in FILE_SCHEMA.names))
+            }
+        return self._files
+
+    def fresh_files(self, xml_files: List[str]) -> Dict[str, int]:
+        """Files whose stored version is current, as name -> file_id."""
+        stored = self.files()
+        fresh = {}
+        for xml_file in xml_files:
+            entry = stored.get(xml_file)
+            if entry is not None and _file_signature(self.folder / xml_file) == entry[1:]:
+                fresh[xml_file] = entry[0]
+        return fresh
+
+    def can_answer(self, xpath_expressions: List[str], namespaces: Optional[Dict[str, str]] = None) -> bool:
+        return all(parse_simple_xpath(xpath, namespaces) is not None for xpath in xpath_expressions)
+
+    def query(self, simple: SimpleXPath, file_ids: Optional[List[int]] = None) -> pa.Table:
+        """Rows matching a simple XPath, sorted in document order per file."""
+        dataset = ds.dataset(self.nodes_path, format="parquet")
+        condition = (ds.field("kind") == simple.kind) & (ds.field("tag") == simple.steps[-1])
+        if simple.attribute is not None:
+            condition &= ds.field("attribute") == simple.attribute
+        if file_ids is not None:
+            condition &= ds.field("file_id").isin(file_ids)
+        table = dataset.to_table(columns=["file_id", "node_id", "path", "value"], filter=condition)
+
+        if len(simple.steps) > 1 or not simple.descendant:
+            if simple.descendant:
+                mask = pc.ends_with(table.column("path"), simple.suffix)
+            else:
+                mask = pc.equal(table.column("path"), simple.suffix)
+            table = table.filter(mask)
+        return table.sort_by([("file_id", "ascending"), ("node_id", "ascending")])
+
+    def execute_xpaths(self,
+                       xpath_expressions: List[str],
+                       file_ids: Dict[str, int],
+                       namespaces: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, list]]:
+        """Evaluate simple XPaths over the store.
+
+        Returns:
+            Per file name the XPath results, like OptimizedXMLProcessor.execute_xpath_batch:
+            values for text and attribute paths, node ids for element paths
+        """
+        names = {file_id: name for name, file_id in file_ids.items()}
+        results: Dict[str, Dict[str, list]] = {name: {} for name in file_ids}
+        for xpath in xpath_expressions:
+            simple = parse_simple_xpath(xpath, namespaces)
+            table = self.query(simple, list(names))
+            column = "node_id" if simple.kind == ELEMENT_NODE else "value"
+            for file_id, item in zip(table.column("file_id").to_pylist(), table.column(column).to_pylist()):
+                results[names[file_id]].setdefault(xpath, []).append(item)
+        return results
+
+
+class ColumnarStoreSignals(QObject):
+    """Signals class for ColumnarStoreThread operations."""
+    error_occurred = Signal(str, str)
+    program_output_progress_append = Signal(str)
+    progressbar_update = Signal(int)
+
+
+class ColumnarStoreThread(QRunnable):
+    """Worker thread that shreds the XML files of a folder into the columnar store."""
+
+    def __init__(self, folder_path: str, max_threads: int | str = "auto"):
+        super().__init__()
+        self.folder_path = folder_path
+        self.max_threads, _ = resolve_max_threads(max_threads)
+        self.signals = ColumnarStoreSignals()
+        self._terminate_event = threading.Event()
+        self.setAutoDelete(True)
+
+    def stop(self):
+        self._terminate_event.set()
+
+    @Slot()
+    def run(self):
+        try:
+            self.signals.program_output_progress_append.emit(
+                f"Building columnar store of {self.folder_path} with {self.max_threads} threads...")
+
+            def progress(done: int, total: int):
+                self.signals.progressbar_update.emit(int(done / total * 100) if total else 100)
+
+            start = time.perf_counter()
+            store = ColumnarStore(self.folder_path)
+            files, rows = store.build(max_workers=self.max_threads,
+                                      terminate_event=self._terminate_event, progress=progress)
+            self.signals.program_output_progress_append.emit(
+                f"Columnar store built in {time.perf_counter() - start:.2f} seconds: "
+                f"{files} files, {rows} nodes, saved to {store.store_path}"
+            )
+        except Exception as e:
+            self.signals.error_occurred.emit("Columnar Store Error", str(e))
+
+
+def create_columnar_store_builder(folder_path: str, max_threads: int | str = "auto") -> ColumnarStoreThread:
+    """
+    Factory function to create a columnar store builder thread.
+
+    Args:
+        folder_path: Folder with the XML files, the store is saved inside it
+        max_threads: Shredding threads, "auto" uses the CPU budget
+
+    Returns:
+        Configured ColumnarStoreThread instance
+    """
+    return ColumnarStoreThread(folder_path=folder_path, max_threads=max_threads)
@@ -0,0 +1,162 @@
+# modules/content_dedup.py
+from collections import Counter
+from pathlib import Path
+from threading import Condition, Event, Thread
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import logging
+import time
+
+
+DIGEST_SIZE = 16
+
+
+def hash_file(path: Path) -> Optional[str]:
+    """Fast content hash (BLAKE2b, 128 bit) of a file, None if it can't be read."""
+    try:
+        with open(path, "rb") as f:
+            return hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=DIGEST_SIZE)).hexdigest()
+    except OSError as e:
+        logging.warning(f"Could not hash {path}: {e}")
+        return None
+
+
+class ContentHasher:
+    """Hashes files on a background I/O thread, ahead of the workers that parse them.
+
+    The files are hashed in the given order so the coordinator rarely has to wait;
+    ``digest()`` blocks until the requested file is hashed.
+    """
+
+    def __init__(self, folder: Path, xml_files: Iterable[str]):
+        self.folder = Path(folder)
+        self._files = list(xml_files)
+        self._digests: Dict[str, Optional[str]] = {}
+        self._condition = Condition()
+        self._stop = Event()
+        self.finished = False
+        self.seconds = 0.0
+        self.counts: Counter = Counter()
+        self._thread = Thread(target=self._run, daemon=True, name="ContentHasherThread")
+
+    def start(self) -> "ContentHasher":
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify_all()
+
+    def _run(self):
+        start = time.perf_counter()
+        for xml_file in self._files:
+            if self._stop.is_set():
+                break
+            digest = hash_file(self.folder / xml_file)
+            with self._condition:
+                self._digests[xml_file] = digest
+                if digest is not None:
+                    self.counts[digest] += 1
+                self._condition.notify_all()
+        self.seconds = time.perf_counter() - start
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def digest(self, xml_file: str) -> Optional[str]:
+        """Wait for and return the digest of a file (None if unreadable or stopped)."""
+        with self._condition:
+            while xml_file not in self._digests and not (self.finished or self._stop.is_set()):
+                self._condition.wait(timeout=0.5)
+            return self._digests.get(xml_file)
+
+    def expected_count(self, digest: str) -> Optional[int]:
+        """Total number of files with this digest, known once hashing finished."""
+        with self._condition:
+            return self.counts[digest] if self.finished else None
+
+
+class DuplicateTracker:
+    """Maps identical contents to one canonical file and replays its result for duplicates.
+
+    A result is cached only while more duplicates of its content can still arrive.
+    Until hashing finished that is unknown, so ``release_finished`` drops the results
+    cached in the meantime that no duplicate will ask for.
+    """
+
+    def __init__(self, hasher: ContentHasher):
+        self.hasher = hasher
+        self.duplicates = 0
+        self._canonical: Dict[str, str] = {}
+        self._waiting: Dict[str, List[str]] = {}
+        self._results: Dict[str, Any] = {}
+        self._seen: Counter = Counter()
+        self._released_finished = False
+
+    def claim(self, xml_file: str) -> Tuple[bool, List[Tuple[str, Any]]]:
+        """Register a file before submission.
+
+        Returns:
+            Tuple of (must_process, ready) where ready holds (duplicate_file, cached_result)
+            pairs that can be emitted right away
+        """
+        digest = self.hasher.digest(xml_file)
+        if digest is None:
+            return True, []
+        self._seen[digest] += 1
+        if digest not in self._canonical:
+            self._canonical[digest] = xml_file
+            return True, []
+
+        self.duplicates += 1
+        if digest in self._results:
+            ready = [(xml_file, self._results[digest])]
+            self._release(digest)
+            return False, ready
+        self._waiting.setdefault(digest, []).append(xml_file)
+        return False, []
+
+    def complete(self, xml_file: str, result: Any) -> List[Tuple[str, Any]]:
+        """Record the result of a processed file and return the duplicates it unblocks."""
+        digest = self.hasher.digest(xml_file)
+        if digest is None or self._canonical.get(digest) != xml_file:
+            return []
+        self._results[digest] = result
+        ready = [(dup, result) for dup in self._waiting.pop(digest, [])]
+        self._release(digest)
+        return ready
+
+    def fail(self, xml_file: str) -> List[str]:
+        """Forget a canonical file that failed and return the duplicates that waited for its result.
+
+        The next duplicate of its content is processed on its own.
+        """
+        digest = self.hasher.digest(xml_file)
+        if digest is None or self._canonical.get(digest) != xml_file:
+            return []
+        del self._canonical[digest]
+        return self._waiting.pop(digest, [])
+
+    def release_finished(self) -> int:
+        """Once hashing finished, drop the cached results whose duplicates have all been claimed.
+
+        Results of unique files cached while hashing ran get no later claim that would
+        release them. Called from the coordinator loop, only the first call after hashing
+        finished does any work.
+
+        Returns:
+            Number of results dropped
+        """
+        if self._released_finished or not self.hasher.finished:
+            return 0
+        self._released_finished = True
+        cached = len(self._results)
+        for digest in list(self._results):
+            self._release(digest)
+        return cached - len(self._results)
+
+    def _release(self, digest: str):
+        expected = self.hasher.expected_count(digest)
+        if expected is not None and self._seen[digest] >= expected and not self._waiting.get(digest):
+            self._results.pop(digest, None)
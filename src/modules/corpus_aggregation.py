@@ -0,0 +1,112 @@
+# modules/corpus_aggregation.py
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+import csv
+
+from modules.xpath_analysis import format_scalar
+
+
+@dataclass
+class ColumnAggregate:
+    """Running aggregate of one output column.
+
+    Memory grows with the number of distinct values, not with the number of matches.
+    """
+    values: Counter = field(default_factory=Counter)  # value -> occurrences
+    files: Counter = field(default_factory=Counter)   # value -> files containing it
+    files_with_values: int = 0
+    numeric_count: int = 0
+    numeric_min: Optional[float] = None
+    numeric_max: Optional[float] = None
+
+    @property
+    def total(self) -> int:
+        return sum(self.values.values())
+
+    def add_file_values(self, values: Iterable[str]):
+        """Add all values one file produced for this column."""
+        counts = Counter(values)
+        if not counts:
+            return
+        self.values.update(counts)
+        self.files.update(counts.keys())
+        self.files_with_values += 1
+        for value, occurrences in counts.items():
+            try:
+                number = float(value)
+            except ValueError:
+                continue
+            if number != number:  # NaN
+                continue
+            self.numeric_count += occurrences
+            if self.numeric_min is None or number < self.numeric_min:
+                self.numeric_min = number
+            if self.numeric_max is None or number > self.numeric_max:
+                self.numeric_max = number
+
+    def merge(self, other: "ColumnAggregate"):
+        """Merge a partial aggregate (from another file or worker) into this one."""
+        self.values.update(other.values)
+        self.files.update(other.files)
+        self.files_with_values += other.files_with_values
+        self.numeric_count += other.numeric_count
+        if other.numeric_min is not None and (self.numeric_min is None or other.numeric_min < self.numeric_min):
+            self.numeric_min = other.numeric_min
+        if other.numeric_max is not None and (self.numeric_max is None or other.numeric_max > self.numeric_max):
+            self.numeric_max = other.numeric_max
+
+
+@dataclass
+class CorpusAggregate:
+    """Aggregates of the chosen columns over the whole corpus."""
+    columns: Dict[str, ColumnAggregate] = field(default_factory=dict)
+    files: int = 0
+
+    def add_file(self, column_values: Dict[str, List[str]]):
+        """Add the values of one file, keyed by output column."""
+        self.files += 1
+        for column, values in column_values.items():
+            self.columns.setdefault(column, ColumnAggregate()).add_file_values(values)
+
+    def merge(self, other: "CorpusAggregate"):
+        self.files += other.files
+        for column, aggregate in other.columns.items():
+            self.columns.setdefault(column, ColumnAggregate()).merge(aggregate)
+
+    @property
+    def distinct_values(self) -> int:
+        return sum(len(aggregate.values) for aggregate in self.columns.values())
+
+    def write_csv(self, output_path: Path, column_order: List[str]) -> Path:
+        """Write the value frequencies to output_path and per-column figures to a summary CSV.
+
+        Returns:
+            Path of the summary CSV (``<output stem>_summary.csv``)
+        """
+        output_path = Path(output_path)
+        summary_path = output_path.with_name(f"{output_path.stem}_summary{output_path.suffix}")
+        columns = [c for c in column_order if c in self.columns]
+
+        with open(output_path, "w", newline="", encoding="utf-8", buffering=1_048_576) as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Column", "Value", "Count", "Files"])
+            for column in columns:
+                aggregate = self.columns[column]
+                for value, count in aggregate.values.most_common():
+                    writer.writerow([column, value, count, aggregate.files[value]])
+
+        with open(summary_path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(["Column", "Total Values", "Distinct Values", "Files With Values",
+                             "Numeric Values", "Min", "Max"])
+            for column in columns:
+                aggregate = self.columns[column]
+                writer.writerow([
+                    column, aggregate.total, len(aggregate.values), aggregate.files_with_values,
+                    aggregate.numeric_count,
+                    "" if aggregate.numeric_min is None else format_scalar(aggregate.numeric_min),
+                    "" if aggregate.numeric_max is None else format_scalar(aggregate.numeric_max),
+                ])
+        return summary_path
@@ -0,0 +1,523 @@
+# modules/corpus_index.py
+from PySide6.QtCore import QObject, QRunnable, Signal, Slot
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from lxml import etree as ET
+
+from modules.worker_pool import PRIORITY_BULK, shared_worker_pool
+from modules.worker_tuning import resolve_max_threads
+
+
+INDEX_VERSION = 1
+INDEX_FILENAME = ".xmluvation_index.sqlite"
+# Longer attribute/text values are not indexed, value queries can't find them
+MAX_INDEXED_VALUE_LENGTH = 256
+# Files parsed before the coordinator commits them in one transaction
+COMMIT_EVERY_FILES = 200
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS files (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paths_name ON paths (name);
+CREATE TABLE IF NOT EXISTS file_paths (
+    path_id INTEGER NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (path_id, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS file_paths_file ON file_paths (file_id);
+CREATE TABLE IF NOT EXISTS file_values (
+    path_id INTEGER NOT NULL,
+    value TEXT NOT NULL,
+    file_id INTEGER NOT NULL,
+    PRIMARY KEY (path_id, value, file_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS file_values_value ON file_values (value);
+CREATE INDEX IF NOT EXISTS file_values_file ON file_values (file_id);
+"""
+
+_SIMPLE_STEP = re.compile(r"@?(?:[A-Za-z_][\w.-]*:)?[A-Za-z_][\w.-]*")
+
+
+def default_index_path(folder: str | Path) -> Path:
+    """Location of the index of a folder, stored next to the XML files."""
+    return Path(folder) / INDEX_FILENAME
+
+
+def _file_signature(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+    except OSError:
+        return None
+
+
+@dataclass
+class FileEntries:
+    """Everything the index records about one file.
+
+    Names are stored in Clark notation (``{uri}local``) so the index does not
+    depend on the prefixes of any particular job.
+    """
+    paths: Dict[str, str]  # path -> last step name, attributes keep their '@'
+    values: Set[Tuple[str, str]]  # (path, value)
+
+
+def extract_file_entries(xml_file_path: str | Path, index_text: bool = False) -> FileEntries:
+    """Stream a file and collect its element paths, attribute names and values.
+
+    Args:
+        xml_file_path: XML file to scan
+        index_text: Also record the text values of elements
+
+    Returns:
+        FileEntries with paths like ``/root/item`` and ``/root/item/@id``
+    """
+    paths: Dict[str, str] = {}
+    values: Set[Tuple[str, str]] = set()
+    stack: List[str] = []
+
+    for event, elem in ET.iterparse(str(xml_file_path), events=("start", "end"), huge_tree=True):
+        if event == "start":
+            stack.append(f"{stack[-1] if stack else ''}/{elem.tag}")
+            path = stack[-1]
+            paths[path] = elem.tag
+            for name, value in elem.attrib.items():
+                attribute_path = f"{path}/@{name}"
+                paths[attribute_path] = f"@{name}"
+                if len(value) <= MAX_INDEXED_VALUE_LENGTH:
+                    values.add((attribute_path, value))
+        else:
+            if index_text and elem.text:
+                text = elem.text.strip()
+                if text and len(text) <= MAX_INDEXED_VALUE_LENGTH:
+                    values.add((stack[-1], text))
+            stack.pop()
+            # Free the subtree, only the paths are needed
+            elem.clear(keep_tail=True)
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    return FileEntries(paths, values)
+
+
+def _strip_predicates(xpath: str) -> Optional[str]:
+    """Remove [...] predicates (which may contain quotes and nested brackets)."""
+    result = []
+    depth = 0
+    quote = None
+    for char in xpath:
+        if quote:
+            if char == quote:
+                quote = None
+            continue
+        if depth and char in ("'", '"'):
+            quote = char
+        elif char == "[":
+            depth += 1
+        elif char == "]":
+            depth -= 1
+            if depth < 0:
+                return None
+        elif not depth:
+            result.append(char)
+    return "".join(result) if depth == 0 and quote is None else None
+
+
+def xpath_required_names(xpath: str, namespaces: Optional[Dict[str, str]] = None) -> Optional[List[str]]:
+    """Element and attribute names every file matching the XPath must contain.
+
+    Only the main location path is analysed, predicates are ignored (they only
+    narrow the match). Expressions using unions, functions, parent or explicit axes
+    can't be analysed.
+
+    Args:
+        xpath: XPath expression
+        namespaces: Prefix map the expression is evaluated with
+
+    Returns:
+        Clark names (attributes prefixed with '@'), or None if unknown
+    """
+    location = _strip_predicates(xpath.strip())
+    if not location or "|" in location or "::" in location or ".." in location:
+        return None
+
+    names = []
+    for step in re.split(r"/+", location):
+        step = step.strip()
+        if step in ("", ".", "*", "@*", "text()", "node()"):
+            continue
+        if not _SIMPLE_STEP.fullmatch(step):
+            return None
+        attribute = step.startswith("@")
+        name = step[1:] if attribute else step
+        if ":" in name:
+            prefix, local = name.split(":", 1)
+            uri = (namespaces or {}).get(prefix)
+            if uri is None:
+                return None
+            name = f"{{{uri}}}{local}"
+        names.append(f"@{name}" if attribute else name)
+    return names
+
+
+def to_clark_path(path: str, namespaces: Optional[Dict[str, str]] = None) -> str:
+    """Convert a prefixed path like ``/ns:root/ns:item/@id`` to the Clark form stored in the index."""
+    steps = []
+    for step in path.strip("/").split("/"):
+        attribute = step.startswith("@")
+        name = step[1:] if attribute else step
+        if ":" in name and not name.startswith("{"):
+            prefix, local = name.split(":", 1)
+            if prefix in (namespaces or {}):
+                name = f"{{{namespaces[prefix]}}}{local}"
+        steps.append(f"@{name}" if attribute else name)
+    return "/" + "/".join(steps)
+
+
+@dataclass
+class IndexUpdateStats:
+    """Outcome of an incremental index update."""
+    added: int = 0
+    updated: int = 0
+    removed: int = 0
+    unchanged: int = 0
+    failed: int = 0
+    seconds: float = 0.0
+
+    @property
+    def indexed(self) -> int:
+        return self.added + self.updated
+
+
+class CorpusIndex:
+    """Persistent SQLite inverted index of a folder of XML files.
+
+    Records per file the element paths, attribute paths and attribute values
+    (optionally element text values). Files are re-indexed only when their size
+    or mtime changed. Only the coordinating thread touches the connection.
+    """
+
+    def __init__(self, folder: str | Path, index_path: Optional[str | Path] = None, index_text: bool = False):
+        self.folder = Path(folder)
+        self.index_path = Path(index_path) if index_path else default_index_path(self.folder)
+        self.index_text = index_text
+        self._connection: Optional[sqlite3.Connection] = None
+
+    def __enter__(self) -> "CorpusIndex":
+        return self.open()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        if self._connection is None:
+            self.open()
+        return self._connection
+
+    def exists(self) -> bool:
+        return self.index_path.is_file()
+
+    def open(self) -> "CorpusIndex":
+        if self._connection is not None:
+            return self
+        self._connection = sqlite3.connect(self.index_path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+        meta = dict(self._connection.execute("SELECT key, value FROM meta"))
+        if meta.get("version") != str(INDEX_VERSION) or meta.get("index_text") != str(int(self.index_text)):
+            # Layout or indexed content changed, start over
+            if meta:
+                logging.info(f"Rebuilding corpus index {self.index_path}")
+            self._clear()
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [("version", str(INDEX_VERSION)), ("index_text", str(int(self.index_text)))]
+            )
+            self._connection.commit()
+        return self
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _clear(self):
+        for table in ("file_values", "file_paths", "paths", "files"):
+            self._connection.execute(f"DELETE FROM {table}")
+
+    # ============= UPDATE =============
+
+    def _indexed_signatures(self) -> Dict[str, Tuple[int, int]]:
+        return {name: (size, mtime_ns) for name, size, mtime_ns
+                in self.connection.execute("SELECT name, size, mtime_ns FROM files")}
+
+    def stale_files(self, xml_files: Iterable[str]) -> List[str]:
+        """Files that are not indexed or changed since they were indexed."""
+        indexed = self._indexed_signatures()
+        return [f for f in xml_files if indexed.get(f) != _file_signature(self.folder / f)]
+
+    def update(self,
+               xml_files: Optional[List[str]] = None,
+               max_workers: int = 1,
+               terminate_event: Optional[threading.Event] = None,
+               progress: Optional[Callable[[int, int], None]] = None) -> IndexUpdateStats:
+        """Incrementally bring the index up to date with the folder.
+
+        Changed and new files are parsed on a thread pool, the coordinator writes
+        them in batched transactions. Files no longer in the folder are removed.
+
+        Args:
+            xml_files: File names to index, default all ``*.xml`` in the folder
+            max_workers: Parser threads
+            terminate_event: Stops the update, indexed files so far are kept
+            progress: Called with (done, total) after each indexed file
+
+        Returns:
+            IndexUpdateStats of this update
+        """
+        start = time.perf_counter()
+        stats = IndexUpdateStats()
+        if xml_files is None:
+            xml_files = [f.name for f in self.folder.glob("*.xml") if f.is_file()]
+
+        indexed = self._indexed_signatures()
+        current = set(xml_files)
+        removed = [name for name in indexed if name not in current]
+        if removed:
+            for name in removed:
+                self._delete_file(name)
+            self.connection.commit()
+        stats.removed = len(removed)
+
+        stale = []
+        for xml_file in xml_files:
+            signature = _file_signature(self.folder / xml_file)
+            if signature is None:
+                continue
+            if indexed.get(xml_file) == signature:
+                stats.unchanged += 1
+            else:
+                stale.append((xml_file, signature))
+
+        def index_one(xml_file: str) -> Optional[FileEntries]:
+            if terminate_event is not None and terminate_event.is_set():
+                return None
+            try:
+                return extract_file_entries(self.folder / xml_file, self.index_text)
+            except (ET.XMLSyntaxError, OSError) as e:
+                logging.warning(f"Corpus index skipped {xml_file}: {e}")
+                return None
+
+        window = max(1, max_workers) * 4
+        done = 0
+        pending = {}
+        queue = iter(stale)
+        path_ids: Dict[str, int] = {}
+        with shared_worker_pool().job("corpus index", max(1, max_workers), PRIORITY_BULK) as executor:
+            while True:
+                while len(pending) < window and not (terminate_event is not None and terminate_event.is_set()):
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    pending[executor.submit(index_one, item[0])] = item
+                if not pending:
+                    break
+                finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    xml_file, signature = pending.pop(future)
+                    entries = future.result()
+                    if entries is None:
+                        if not (terminate_event is not None and terminate_event.is_set()):
+                            stats.failed += 1
+                        continue
+                    if xml_file in indexed:
+                        stats.updated += 1
+                    else:
+                        stats.added += 1
+                    self._store_file(xml_file, signature, entries, path_ids)
+                    done += 1
+                    if done % COMMIT_EVERY_FILES == 0:
+                        self.connection.commit()
+                    if progress is not None:
+                        progress(done, len(stale))
+        self.connection.commit()
+        stats.seconds = time.perf_counter() - start
+        return stats
+
+    def _delete_file(self, xml_file: str):
+        row = self.connection.execute("SELECT id FROM files WHERE name = ?", (xml_file,)).fetchone()
+        if row is None:
+            return
+        file_id = row[0]
+        self.connection.execute("DELETE FROM file_paths WHERE file_id = ?", (file_id,))
+        self.connection.execute("DELETE FROM file_values WHERE file_id = ?", (file_id,))
+        self.connection.execute("DELETE FROM files WHERE id = ?", (file_id,))
+
+    def _path_id(self, path: str, name: str, path_ids: Dict[str, int]) -> int:
+        path_id = path_ids.get(path)
+        if path_id is None:
+            row = self.connection.execute("SELECT id FROM paths WHERE path = ?", (path,)).fetchone()
+            if row is None:
+                path_id = self.connection.execute(
+                    "INSERT INTO paths (path, name) VALUES (?, ?)", (path, name)).lastrowid
+            else:
+                path_id = row[0]
+            path_ids[path] = path_id
+        return path_id
+
+    def _store_file(self, xml_file: str, signature: Tuple[int, int], entries: FileEntries, path_ids: Dict[str, int]):
+        self._delete_file(xml_file)
+        file_id = self.connection.execute(
+            "INSERT INTO files (name, size, mtime_ns) VALUES (?, ?, ?)", (xml_file, *signature)).lastrowid
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO file_paths (path_id, file_id) VALUES (?, ?)",
+            ((self._path_id(path, name, path_ids), file_id) for path, name in entries.paths.items())
+        )
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO file_values (path_id, value, file_id) VALUES (?, ?, ?)",
+            ((path_ids[path], value, file_id) for path, value in entries.values)
+        )
+
+    # ============= QUERIES =============
+
+    def file_count(self) -> int:
+        return self.connection.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def files_with_path(self, path: str, namespaces: Optional[Dict[str, str]] = None) -> Set[str]:
+        """Files containing an exact element or attribute path, e.g. ``/root/item/@id``."""
+        return {name for (name,) in self.connection.execute(
+            "SELECT f.name FROM paths p JOIN file_paths fp ON fp.path_id = p.id "
+            "JOIN files f ON f.id = fp.file_id WHERE p.path = ?",
+            (to_clark_path(path, namespaces),)
+        )}
+
+    def files_with_name(self, name: str) -> Set[str]:
+        """Files containing an element (``item``) or attribute (``@id``) name anywhere, in Clark notation."""
+        return {file_name for (file_name,) in self.connection.execute(
+            "SELECT DISTINCT f.name FROM paths p JOIN file_paths fp ON fp.path_id = p.id "
+            "JOIN files f ON f.id = fp.file_id WHERE p.name = ?",
+            (name,)
+        )}
+
+    def files_with_value(self, value: str, path: Optional[str] = None,
+                         namespaces: Optional[Dict[str, str]] = None) -> Set[str]:
+        """Files with an attribute (or, if indexed, text) value, optionally only at one path."""
+        query = ("SELECT DISTINCT f.name FROM file_values v JOIN files f ON f.id = v.file_id "
+                 "JOIN paths p ON p.id = v.path_id WHERE v.value = ?")
+        parameters: Tuple = (value,)
+        if path is not None:
+            query += " AND p.path = ?"
+            parameters += (to_clark_path(path, namespaces),)
+        return {name for (name,) in self.connection.execute(query, parameters)}
+
+    def candidate_files(self,
+                        xpath_expressions: List[str],
+                        xml_files: List[str],
+                        namespaces: Optional[Dict[str, str]] = None) -> Optional[List[str]]:
+        """Files that may match at least one of the XPath expressions.
+
+        A file is skipped only if the index proves it lacks a name the expression
+        requires. Files that are not indexed or changed are always candidates.
+
+        Returns:
+            Candidates in the order of xml_files, or None if an expression can't be analysed
+        """
+        requirements = [xpath_required_names(xpath, namespaces) for xpath in xpath_expressions]
+        if any(names is None for names in requirements):
+            return None
+
+        name_cache: Dict[str, Set[str]] = {}
+        candidates: Set[str] = set()
+        for names in requirements:
+            if not names:
+                return list(xml_files)
+            matching = None
+            for name in names:
+                if name not in name_cache:
+                    name_cache[name] = self.files_with_name(name)
+                matching = name_cache[name] if matching is None else matching & name_cache[name]
+            candidates |= matching
+
+        candidates.update(self.stale_files(xml_files))
+        return [f for f in xml_files if f in candidates]
+
+
+class CorpusIndexSignals(QObject):
+    """Signals class for CorpusIndexThread operations."""
+    error_occurred = Signal(str, str)
+    program_output_progress_append = Signal(str)
+    progressbar_update = Signal(int)
+
+
+class CorpusIndexThread(QRunnable):
+    """Worker thread that builds or incrementally updates the corpus index of a folder."""
+
+    def __init__(self, folder_path: str, max_threads: int | str = "auto", index_text: bool = False):
+        super().__init__()
+        self.folder_path = folder_path
+        self.max_threads, _ = resolve_max_threads(max_threads)
+        self.index_text = index_text
+        self.signals = CorpusIndexSignals()
+        self._terminate_event = threading.Event()
+        self.setAutoDelete(True)
+
+    def stop(self):
+        self._terminate_event.set()
+
+    @Slot()
+    def run(self):
+        try:
+            self.signals.program_output_progress_append.emit(
+                f"Updating corpus index of {self.folder_path} with {self.max_threads} threads...")
+
+            def progress(done: int, total: int):
+                self.signals.progressbar_update.emit(int(done / total * 100) if total else 100)
+
+            with CorpusIndex(self.folder_path, index_text=self.index_text) as index:
+                stats = index.update(max_workers=self.max_threads,
+                                     terminate_event=self._terminate_event, progress=progress)
+                total = index.file_count()
+            self.signals.program_output_progress_append.emit(
+                f"Corpus index updated in {stats.seconds:.2f} seconds: {stats.added} added, "
+                f"{stats.updated} updated, {stats.removed} removed, {stats.unchanged} unchanged, "
+                f"{stats.failed} failed, {total} files indexed"
+            )
+        except Exception as e:
+            self.signals.error_occurred.emit("Corpus Index Error", str(e))
+
+
+def create_corpus_indexer(folder_path: str, max_threads: int | str = "auto", index_text: bool = False) -> CorpusIndexThread:
+    """
+    Factory function to create a corpus index builder thread.
+
+    Args:
+        folder_path: Folder with the XML files, the index is stored inside it
+        max_threads: Parser threads, "auto" uses the CPU budget
+        index_text: Also index element text values (larger index)
+
+    Returns:
+        Configured CorpusIndexThread instance
+    """
+    return CorpusIndexThread(folder_path=folder_path, max_threads=max_threads, index_text=index_text)
@@ -0,0 +1,161 @@
+# modules/error_journal.py
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+import json
+import logging
+import threading
+import time
+
+
+ERROR_JOURNAL_SUFFIX = ".errors.jsonl"
+
+# Stages a file can fail in
+STAGE_READ = "read"
+STAGE_PARSE = "parse"
+STAGE_XPATH = "xpath"
+STAGE_EVALUATE = "evaluate"
+STAGE_TASK = "task"
+# Failures that leave a file without rows, a retry run exports these files again.
+# XPath errors only empty one column of an otherwise exported file.
+RETRY_STAGES = (STAGE_READ, STAGE_PARSE, STAGE_EVALUATE, STAGE_TASK)
+
+# Errors of one class written to the log before the rest only goes to the journal
+MAX_LOGGED_PER_CLASS = 5
+# Distinct (stage, error class) counters kept in memory, further classes are counted together
+MAX_ERROR_CLASSES = 100
+OTHER_ERROR_CLASS = ("other", "Other")
+
+
+def error_journal_path(output_path: str | Path) -> Path:
+    """Journal of the failed files of an export, next to its output."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + ERROR_JOURNAL_SUFFIX)
+
+
+@dataclass
+class ErrorRecord:
+    """One failure of one file, a line of the journal."""
+    file: str
+    stage: str
+    error_class: str
+    message: str
+    line: Optional[int] = None
+    column: Optional[int] = None
+    time: float = 0.0
+
+
+@dataclass
+class ErrorClassSummary:
+    """Bounded in-memory state of one (stage, error class): a count and the first example."""
+    count: int = 0
+    example_file: str = ""
+    example_message: str = ""
+
+
+class ErrorJournal:
+    """Structured, disk-backed record of the files that failed during an export.
+
+    Every failure is appended as one JSON line (file, stage, exception class, message,
+    line and column) to ``<output>.errors.jsonl``. Memory only holds a counter and one
+    example per error class, and only the first few errors of a class are logged, so a
+    corpus with millions of broken files neither fills the memory nor floods the log.
+    The file is created on the first error; a clean run leaves no journal behind.
+    """
+
+    def __init__(self, path: str | Path, folder: Optional[str | Path] = None, append: bool = False):
+        """
+        Args:
+            path: Journal file
+            folder: Folder of the XML files, files are journaled relative to it
+            append: Keep the records of an earlier (resumed) run, otherwise they are removed
+        """
+        self.path = Path(path)
+        self.folder = Path(folder) if folder else None
+        self.total = 0
+        self.classes: Dict[Tuple[str, str], ErrorClassSummary] = {}
+        self._file = None
+        self._lock = threading.Lock()
+        if not append:
+            self.path.unlink(missing_ok=True)
+
+    def record(self, xml_file: str, stage: str, error: BaseException | str,
+               line: Optional[int] = None, column: Optional[int] = None, error_class: Optional[str] = None):
+        """Journal a failure of a file.
+
+        Args:
+            xml_file: File name relative to the folder, or path of the file
+            stage: STAGE_READ, STAGE_PARSE, STAGE_XPATH, STAGE_EVALUATE or STAGE_TASK
+            error: The exception, or a message
+            line: Line of the error in the file, taken from XMLSyntaxError if not given
+            column: Column of the error in the file
+            error_class: Class name for a message, defaults to the exception class
+        """
+        if self.folder and Path(xml_file).is_absolute():
+            try:
+                xml_file = Path(xml_file).relative_to(self.folder).as_posix()
+            except ValueError:
+                pass
+        if isinstance(error, BaseException):
+            error_class = error_class or type(error).__name__
+            position = getattr(error, "position", None)
+            if line is None and position:
+                line, column = position
+        record = ErrorRecord(xml_file, stage, error_class or "Error", str(error).strip(), line, column, time.time())
+
+        with self._lock:
+            if self._file is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(asdict(record), ensure_ascii=False) + "\n")
+            self.total += 1
+
+            key = (stage, record.error_class)
+            if key not in self.classes and len(self.classes) >= MAX_ERROR_CLASSES:
+                key = OTHER_ERROR_CLASS
+            summary = self.classes.setdefault(key, ErrorClassSummary(example_file=xml_file,
+                                                                     example_message=record.message))
+            summary.count += 1
+            count = summary.count
+
+        if count <= MAX_LOGGED_PER_CLASS:
+            logging.warning(f"{stage.capitalize()} error in {xml_file}: {record.error_class}: {record.message}")
+            if count == MAX_LOGGED_PER_CLASS:
+                logging.warning(f"Further {key[1]} errors ({stage}) are only written to {self.path}")
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def summary_lines(self, limit: int = 10) -> List[str]:
+        """Most frequent error classes, one line each."""
+        ranked = sorted(self.classes.items(), key=lambda item: item[1].count, reverse=True)
+        lines = [
+            f"{error_class} ({stage}): {summary.count} errors, e.g. {summary.example_file}: {summary.example_message}"
+            for (stage, error_class), summary in ranked[:limit]
+        ]
+        if len(ranked) > limit:
+            lines.append(f"... and {len(ranked) - limit} more error classes")
+        return lines
+
+
+def read_journal(path: str | Path) -> List[ErrorRecord]:
+    """Records of a journal, unreadable lines (e.g. of a killed run) are skipped."""
+    records = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(ErrorRecord(**json.loads(line)))
+                except (ValueError, TypeError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def read_failed_files(path: str | Path) -> List[str]:
+    """Files a journal lists as failed without rows, in journal order, see RETRY_STAGES."""
+    return list(dict.fromkeys(record.file for record in read_journal(path) if record.stage in RETRY_STAGES))
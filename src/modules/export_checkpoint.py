@@ -0,0 +1,210 @@
+# modules/export_checkpoint.py
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+import hashlib
+import json
+import logging
+import os
+import time
+
+
+CHECKPOINT_VERSION = 2
+CHECKPOINT_SUFFIX = ".checkpoint.json"
+# Completed files, one JSON line [name, size, mtime_ns] each, appended on every commit
+CHECKPOINT_LOG_SUFFIX = ".checkpoint.log"
+
+
+def compute_job_fingerprint(**job: Any) -> str:
+    """Stable hash of an export job configuration (folder, XPaths, headers, flags, ...)."""
+    payload = json.dumps(job, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _file_signature(path: Path) -> Optional[list]:
+    try:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+
+class ExportCheckpoint:
+    """Periodic checkpoint of an export: completed files plus the committed output offset.
+
+    The checkpoint lives next to the output file as ``<output>.checkpoint.json`` and is
+    only written after the output has been flushed and fsynced, so every file listed as
+    completed has all of its rows below ``output_offset``. A resumed run truncates the
+    output to that offset and skips the completed files.
+
+    Completed files are appended to ``<output>.checkpoint.log`` on each commit, the JSON
+    file holds the committed length of that log, so a commit writes only the files
+    completed since the last one. The JSON file also keeps the running totals of the
+    committed files (matches, files with matches, ...) so a resumed run reports the
+    totals of the whole output.
+    """
+
+    def __init__(self, output_path: Path, folder: Path, fingerprint: str,
+                 interval: float = 10.0, every_files: int = 1000):
+        self.output_path = Path(output_path)
+        self.folder = Path(folder)
+        self.path = self.output_path.with_name(self.output_path.name + CHECKPOINT_SUFFIX)
+        self.log_path = self.output_path.with_name(self.output_path.name + CHECKPOINT_LOG_SUFFIX)
+        self.fingerprint = fingerprint
+        self.interval = interval
+        self.every_files = every_files
+
+        self.completed: Dict[str, list] = {}
+        self.output_offset = 0
+        # Counts of the committed files, see mark_written
+        self.totals: Dict[str, int] = {}
+        self.commits = 0
+        self._log_offset = 0
+        self._uncommitted: Dict[str, Dict[str, int]] = {}
+        self._last_commit = time.monotonic()
+
+    def load(self) -> bool:
+        """Load a matching checkpoint for resuming.
+
+        The checkpoint is ignored if it belongs to another job, if the output file is
+        shorter than the committed offset, or if a completed input file changed since.
+
+        Returns:
+            True if a usable checkpoint was loaded
+        """
+        if not self.path.exists():
+            return False
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"Ignoring unreadable checkpoint {self.path}: {e}")
+            return False
+
+        if data.get("version") != CHECKPOINT_VERSION:
+            logging.info(f"Checkpoint {self.path} was written by another version, starting fresh")
+            return False
+        if data.get("fingerprint") != self.fingerprint:
+            logging.info(f"Checkpoint {self.path} belongs to a different job, starting fresh")
+            return False
+
+        offset = int(data.get("output_offset", 0))
+        try:
+            if offset <= 0 or self.output_path.stat().st_size < offset:
+                return False
+        except OSError:
+            return False
+
+        log_offset = int(data.get("log_offset", 0))
+        try:
+            with open(self.log_path, "rb") as f:
+                # Lines past the committed length belong to a commit that didn't finish
+                lines = f.read(log_offset).splitlines()
+        except OSError as e:
+            logging.warning(f"Ignoring checkpoint {self.path}, its file log can't be read: {e}")
+            return False
+        if sum(len(line) + 1 for line in lines) != log_offset:
+            logging.warning(f"Ignoring checkpoint {self.path}, its file log is shorter than committed")
+            return False
+
+        completed = {}
+        for line in lines:
+            name, *signature = json.loads(line)
+            signature = signature or None
+            if _file_signature(self.folder / name) != signature:
+                logging.info(f"Input file {name} changed since the checkpoint, starting fresh")
+                return False
+            completed[name] = signature
+
+        self.completed = completed
+        self.output_offset = offset
+        self.totals = {key: int(value) for key, value in data.get("totals", {}).items()}
+        self._log_offset = log_offset
+        return True
+
+    def prepare_output_for_append(self):
+        """Drop anything written after the committed offset (rows of unfinished files)."""
+        with open(self.output_path, "r+b") as f:
+            f.truncate(self.output_offset)
+
+    def is_completed(self, xml_file: str) -> bool:
+        return xml_file in self.completed
+
+    def mark_written(self, xml_file: str, **counts: int):
+        """Mark a file whose rows have all been handed to the output writer.
+
+        Args:
+            counts: Counts of the file added to ``totals`` once it is committed
+        """
+        self._uncommitted[xml_file] = counts
+
+    def maybe_commit(self, output_file, force: bool = False) -> bool:
+        """Flush the output and persist the checkpoint if the interval elapsed.
+
+        Args:
+            output_file: Open output file object (text or binary) that is being appended to
+            force: Commit regardless of the interval
+
+        Returns:
+            True if a checkpoint was written
+        """
+        due = (time.monotonic() - self._last_commit >= self.interval
+               or len(self._uncommitted) >= self.every_files)
+        if not (force or due) or (not self._uncommitted and self.commits):
+            return False
+
+        output_file.flush()
+        os.fsync(output_file.fileno())
+        self.output_offset = os.fstat(output_file.fileno()).st_size
+        lines = []
+        for name, counts in self._uncommitted.items():
+            signature = _file_signature(self.folder / name)
+            self.completed[name] = signature
+            lines.append(json.dumps([name, *(signature or [])], ensure_ascii=False) + "\n")
+            for key, value in counts.items():
+                self.totals[key] = self.totals.get(key, 0) + value
+        self._uncommitted.clear()
+        self._append_log("".join(lines).encode("utf-8"))
+        self._write()
+        self._last_commit = time.monotonic()
+        self.commits += 1
+        return True
+
+    def _append_log(self, data: bytes):
+        """Append completed files to the log, a fresh checkpoint starts a new log."""
+        with open(self.log_path, "r+b" if self._log_offset else "wb") as f:
+            # Drop the lines of a commit that didn't finish
+            f.truncate(self._log_offset)
+            f.seek(self._log_offset)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        self._log_offset += len(data)
+
+    def _write(self):
+        data = {
+            "version": CHECKPOINT_VERSION,
+            "fingerprint": self.fingerprint,
+            "output": str(self.output_path),
+            "output_offset": self.output_offset,
+            "log_offset": self._log_offset,
+            "totals": self.totals,
+            "updated": time.time(),
+        }
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    def discard(self):
+        """Remove the checkpoint once the export finished completely."""
+        for path in (self.path, self.path.with_name(self.path.name + ".tmp"), self.log_path):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def remaining(self, xml_files: Iterable[str]) -> list:
+        """Files of the job that still need processing."""
+        return [f for f in xml_files if f not in self.completed]
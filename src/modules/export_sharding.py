@@ -0,0 +1,240 @@
+# modules/export_sharding.py
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import csv
+import hashlib
+import heapq
+import json
+import logging
+import os
+import tempfile
+
+
+SHARD_STATS_SUFFIX = ".stats.json"
+# Rows sorted in memory at once when ordering a CSV by filename, larger outputs are merged from runs
+SORT_CHUNK_ROWS = 200_000
+
+# Statistics summed over the shards of a job
+SUMMED_STATS = ("total_files", "processed_files", "files_with_matches", "total_matches", "rows_written")
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parse a shard spec like "2/8" (shard 2 of 8, counted from 1).
+
+    Raises:
+        ValueError: If the spec isn't "i/N" with 1 <= i <= N
+    """
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise ValueError(f"Shard must look like 'i/N', got '{text}'")
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"Shard index must be between 1 and {count}, got {index}")
+    return index, count
+
+
+def shard_of(relative_path: str, count: int) -> int:
+    """Shard (counted from 1) of a file, a stable hash of its relative path.
+
+    The same path lands on the same shard on every host and Python version.
+    """
+    digest = hashlib.sha1(relative_path.replace("\\", "/").encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % count + 1
+
+
+def select_shard(xml_files: List[str], shard: Tuple[int, int]) -> List[str]:
+    """The files of a folder listing that belong to a shard."""
+    index, count = shard
+    return [xml_file for xml_file in xml_files if shard_of(xml_file, count) == index]
+
+
+def shard_stats_path(output_path: str | Path) -> Path:
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + SHARD_STATS_SUFFIX)
+
+
+def write_shard_stats(output_path: str | Path, stats: Dict[str, Any]) -> Path:
+    """Write the statistics of a shard (or merged) output next to it."""
+    path = shard_stats_path(output_path)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(tmp_path, path)
+    return path
+
+
+def read_shard_stats(output_path: str | Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(shard_stats_path(output_path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _read_rows(path: Path) -> Tuple[List[str], Iterator[List[str]]]:
+    """Header and a row iterator of a CSV file, the file is closed once the rows are consumed."""
+    f = open(path, "r", newline="", encoding="utf-8")
+    reader = csv.reader(f)
+    header = next(reader, [])
+
+    def rows():
+        try:
+            yield from reader
+        finally:
+            f.close()
+
+    return header, rows()
+
+
+def _write_rows(path: Path, header: List[str], rows) -> int:
+    written = 0
+    with open(path, "w", newline="", encoding="utf-8", buffering=1_048_576) as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for row in rows:
+            writer.writerow(row)
+            written += 1
+    return written
+
+
+def _filename_key(row: List[str]) -> str:
+    return row[0] if row else ""
+
+
+def iter_rows_by_filename(path: Path, work_dir: Path, chunk_rows: int = SORT_CHUNK_ROWS) -> Tuple[List[str], Iterator[List[str]]]:
+    """Rows of a CSV ordered by the Filename column, the rows of a file keep their order.
+
+    Chunks of ``chunk_rows`` rows are sorted in memory and k-way merged from temporary runs.
+    """
+    header, rows = _read_rows(path)
+    runs = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            runs.append(_write_run(sorted(chunk, key=_filename_key), header, work_dir))
+            chunk = []
+    if not runs:
+        return header, iter(sorted(chunk, key=_filename_key))
+    if chunk:
+        runs.append(_write_run(sorted(chunk, key=_filename_key), header, work_dir))
+    return header, heapq.merge(*(_read_rows(run)[1] for run in runs), key=_filename_key)
+
+
+def _write_run(rows: List[List[str]], header: List[str], work_dir: Path) -> Path:
+    fd, name = tempfile.mkstemp(prefix="run-", suffix=".csv", dir=work_dir)
+    os.close(fd)
+    _write_rows(Path(name), header, rows)
+    return Path(name)
+
+
+def sort_csv_by_filename(path: str | Path, chunk_rows: int = SORT_CHUNK_ROWS) -> int:
+    """Order the rows of an export CSV by filename in place.
+
+    Returns:
+        Number of rows
+    """
+    path = Path(path)
+    with tempfile.TemporaryDirectory(prefix=".sort-", dir=path.parent) as work_dir:
+        header, rows = iter_rows_by_filename(path, Path(work_dir), chunk_rows)
+        sorted_path = Path(work_dir) / "sorted.csv"
+        written = _write_rows(sorted_path, header, rows)
+        os.replace(sorted_path, path)
+    return written
+
+
+@dataclass
+class MergeResult:
+    """Outcome of merging shard outputs."""
+    output_path: Path
+    rows_written: int = 0
+    stats: Dict[str, Any] = field(default_factory=dict)
+    warnings: List[str] = field(default_factory=list)
+
+
+def merge_shard_outputs(inputs: List[str | Path], output_path: str | Path,
+                        order_by_filename: bool = False) -> MergeResult:
+    """Combine the CSV outputs (and statistics) of the shards of one export job.
+
+    Args:
+        inputs: Shard CSV files, all with the same header
+        output_path: Merged CSV file
+        order_by_filename: K-way merge the shards by the Filename column, shard outputs
+            are already ordered, others are ordered first
+
+    Raises:
+        ValueError: If the inputs are empty, aggregates or don't share one header
+    """
+    inputs = [Path(p) for p in inputs]
+    output_path = Path(output_path)
+    if not inputs:
+        raise ValueError("No shard outputs to merge")
+    result = MergeResult(output_path)
+
+    shard_stats = [read_shard_stats(path) for path in inputs]
+    if any((stats or {}).get("output_mode", "rows") != "rows" for stats in shard_stats):
+        raise ValueError("Only row outputs can be merged, aggregate shards need to be re-aggregated")
+    result.stats, result.warnings = _merge_stats(inputs, shard_stats)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix=".merge-", dir=output_path.parent) as work_dir:
+        headers = []
+        sources = []
+        for path, stats in zip(inputs, shard_stats):
+            if order_by_filename and not (stats or {}).get("ordered_by_filename"):
+                header, rows = iter_rows_by_filename(path, Path(work_dir))
+            else:
+                header, rows = _read_rows(path)
+            headers.append(header)
+            sources.append(rows)
+        if any(header != headers[0] for header in headers):
+            raise ValueError("Shard outputs have different CSV headers, they belong to different jobs")
+
+        merged = heapq.merge(*sources, key=_filename_key) if order_by_filename else (
+            row for rows in sources for row in rows)
+        merged_path = Path(work_dir) / "merged.csv"
+        result.rows_written = _write_rows(merged_path, headers[0], merged)
+        os.replace(merged_path, output_path)
+
+    result.stats["rows_written"] = result.rows_written
+    result.stats["ordered_by_filename"] = order_by_filename
+    write_shard_stats(output_path, result.stats)
+    return result
+
+
+def _merge_stats(inputs: List[Path], shard_stats: List[Optional[Dict[str, Any]]]) -> Tuple[Dict[str, Any], List[str]]:
+    """Sum the shard statistics and check the shards form one complete job."""
+    warnings = []
+    merged: Dict[str, Any] = {key: 0 for key in SUMMED_STATS}
+    merged["shards"] = []
+    jobs = set()
+    counts = set()
+    for path, stats in zip(inputs, shard_stats):
+        if stats is None:
+            warnings.append(f"{path.name}: no statistics found, totals are incomplete")
+            continue
+        for key in SUMMED_STATS:
+            merged[key] += stats.get(key, 0)
+        merged["shards"].append(stats.get("shard"))
+        jobs.add(stats.get("job"))
+        counts.add(stats.get("shard_count"))
+        if not stats.get("completed", False):
+            warnings.append(f"{path.name}: shard export did not complete")
+
+    if len(jobs) > 1:
+        warnings.append("Shard outputs come from different export jobs")
+    if len(counts) == 1 and None not in counts:
+        count = counts.pop()
+        merged["shard_count"] = count
+        missing = sorted(set(range(1, count + 1)) - set(merged["shards"]))
+        if missing:
+            warnings.append(f"Missing shards {', '.join(map(str, missing))} of {count}")
+        duplicates = len(merged["shards"]) - len(set(merged["shards"]))
+        if duplicates:
+            warnings.append(f"{duplicates} shards given more than once")
+    elif counts:
+        warnings.append("Shard outputs were split into different shard counts")
+    for warning in warnings:
+        logging.warning(warning)
+    return merged, warnings
@@ -0,0 +1,216 @@
+# modules/file_prefetch.py
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional
+import logging
+import os
+import threading
+import time
+
+from modules.stage_profiler import TRACE_PREFETCH, StageProfiler
+
+
+# Files are read in one call below this size, larger files in chunks of this size
+READ_CHUNK_BYTES = 8 * 1024 * 1024
+DEFAULT_PREFETCH_BUFFER_BYTES = 256 * 1024 * 1024
+
+# File states of the prefetcher
+_QUEUED = "queued"
+_READING = "reading"
+_READY = "ready"
+_CLAIMED = "claimed"
+_SKIPPED = "skipped"  # too large to buffer, the worker reads (or streams) it itself
+
+
+def read_file_bytes(path: str) -> bytes:
+    """Read a whole file with few large sequential reads.
+
+    The kernel is told the file is read sequentially and soon, so it can read ahead
+    in large blocks (a no-op where posix_fadvise isn't available).
+    """
+    fd = os.open(path, os.O_RDONLY | getattr(os, "O_BINARY", 0))
+    try:
+        size = os.fstat(fd).st_size
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+        if size <= READ_CHUNK_BYTES:
+            data = os.read(fd, size + 1)
+            # The file grew while reading, take the rest too
+            if len(data) <= size:
+                return data
+            chunks = [data]
+        else:
+            chunks = []
+        while True:
+            chunk = os.read(fd, READ_CHUNK_BYTES)
+            if not chunk:
+                return b"".join(chunks)
+            chunks.append(chunk)
+    finally:
+        os.close(fd)
+
+
+@dataclass
+class PrefetchStats:
+    """What the I/O stage did during a run."""
+    prefetched_files: int = 0
+    prefetched_bytes: int = 0
+    read_seconds: float = 0.0
+    # Files a worker found ready, had to wait for, or read itself
+    hits: int = 0
+    waits: int = 0
+    misses: int = 0
+    wait_seconds: float = 0.0
+    # Files left to the workers because they are too large to buffer
+    skipped: int = 0
+
+
+class FilePrefetcher:
+    """I/O stage that reads files ahead of the parser workers.
+
+    Files are read in the order they are expected to be parsed, by their own small
+    thread pool sized independently of the CPU workers, and held in memory up to
+    ``max_buffered_bytes``. A worker asking for a file that isn't being read yet
+    claims it and reads it itself, so a slow or out of order I/O stage never
+    blocks the workers. Files larger than the buffer, or for which ``skip_file``
+    returns True (e.g. files the memory budget streams), are never read ahead.
+    """
+
+    def __init__(self, io_threads: int = 2, max_buffered_bytes: int = DEFAULT_PREFETCH_BUFFER_BYTES,
+                 profiler: Optional[StageProfiler] = None, skip_file: Optional[Callable[[int], bool]] = None):
+        self.io_threads = max(1, io_threads)
+        self.max_buffered_bytes = max_buffered_bytes
+        # Called with the size of a file before it is read, True = leave it to the worker
+        self.skip_file = skip_file
+        # Records a span per read file, None = not traced
+        self.profiler = profiler
+        self.stats = PrefetchStats()
+        self._order: List[str] = []
+        self._next = 0
+        self._states: Dict[str, str] = {}
+        self._buffers: Dict[str, Optional[bytes]] = {}
+        self._buffered_bytes = 0
+        self._condition = threading.Condition()
+        self._stopped = False
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def start(self, paths: Iterable[str]) -> "FilePrefetcher":
+        """Start reading the files, in the order given."""
+        self._order = list(paths)
+        self._states = {path: _QUEUED for path in self._order}
+        self._executor = ThreadPoolExecutor(max_workers=self.io_threads, thread_name_prefix="XMLPrefetch")
+        for _ in range(self.io_threads):
+            self._executor.submit(self._read_loop)
+        return self
+
+    def stop(self):
+        """Stop reading ahead and drop the buffered files."""
+        with self._condition:
+            self._stopped = True
+            self._buffers.clear()
+            self._buffered_bytes = 0
+            self._condition.notify_all()
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def take(self, path: str) -> Optional[bytes]:
+        """Hand the bytes of a file to a worker, once.
+
+        Returns:
+            The file content, or None if the caller has to read the file itself
+            (not prefetched yet, unknown file or read error)
+        """
+        with self._condition:
+            state = self._states.get(path)
+            if state is None or state == _CLAIMED:
+                return None
+            if state == _SKIPPED:
+                self._states[path] = _CLAIMED
+                return None
+            if state == _QUEUED:
+                self._states[path] = _CLAIMED
+                self.stats.misses += 1
+                return None
+            if state == _READING:
+                self.stats.waits += 1
+                start = time.perf_counter()
+                while self._states[path] == _READING and not self._stopped:
+                    self._condition.wait()
+                self.stats.wait_seconds += time.perf_counter() - start
+            else:
+                self.stats.hits += 1
+            self._states[path] = _CLAIMED
+            data = self._buffers.pop(path, None)
+            if data is not None:
+                self._buffered_bytes -= len(data)
+                self._condition.notify_all()
+            return data
+
+    def release(self, path: str):
+        """Drop a file no worker will take, e.g. a duplicate or a streamed file, and free its buffer."""
+        with self._condition:
+            if path not in self._states:
+                return
+            # A read in progress finds the file claimed and discards its bytes
+            self._states[path] = _CLAIMED
+            data = self._buffers.pop(path, None)
+            if data is not None:
+                self._buffered_bytes -= len(data)
+                self._condition.notify_all()
+
+    def _claim_next(self) -> Optional[str]:
+        """Next queued file to read, waits while the buffer is full."""
+        with self._condition:
+            while not self._stopped:
+                while self._next < len(self._order) and self._states[self._order[self._next]] != _QUEUED:
+                    self._next += 1
+                if self._next >= len(self._order):
+                    return None
+                if self._buffered_bytes < self.max_buffered_bytes:
+                    path = self._order[self._next]
+                    self._states[path] = _READING
+                    return path
+                self._condition.wait(timeout=0.5)
+            return None
+
+    def _read_loop(self):
+        while True:
+            path = self._claim_next()
+            if path is None:
+                return
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                size = 0
+            if size > self.max_buffered_bytes or (self.skip_file is not None and self.skip_file(size)):
+                with self._condition:
+                    self.stats.skipped += 1
+                    if self._states[path] == _READING:
+                        self._states[path] = _SKIPPED
+                    self._condition.notify_all()
+                continue
+            start = time.perf_counter_ns()
+            try:
+                data = read_file_bytes(path)
+            except OSError as e:
+                # The worker reports the error when it opens the file itself
+                logging.debug(f"Prefetch of {path} failed: {e}")
+                data = None
+            end = time.perf_counter_ns()
+            seconds = (end - start) / 1e9
+            if self.profiler is not None:
+                self.profiler.add_span(TRACE_PREFETCH, start, end, {"file": os.path.basename(path)})
+
+            with self._condition:
+                self.stats.read_seconds += seconds
+                # Released while it was read, nobody takes the bytes
+                if self._states[path] == _READING:
+                    if data is not None and not self._stopped:
+                        self._buffers[path] = data
+                        self._buffered_bytes += len(data)
+                        self.stats.prefetched_files += 1
+                        self.stats.prefetched_bytes += len(data)
+                    self._states[path] = _READY
+                self._condition.notify_all()
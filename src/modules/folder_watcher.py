@@ -0,0 +1,416 @@
+# modules/folder_watcher.py
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import codecs
+import csv
+import ctypes
+import ctypes.util
+import json
+import logging
+import os
+import re
+import select
+import sys
+import threading
+import time
+
+from modules.export_checkpoint import compute_job_fingerprint
+from modules.run_metrics import metrics_path
+from modules.xlsx_export import is_xlsx_output
+from modules.xpath_search_and_csv_export import OUTPUT_ROWS, create_xpath_searcher_and_csv_exporter
+
+
+WATCH_STATE_VERSION = 1
+WATCH_STATE_SUFFIX = ".watch.json"
+WATCH_PART_SUFFIX = ".watch-part.csv"
+
+# Output policies
+OUTPUT_APPEND = "append"
+OUTPUT_REWRITE = "rewrite"
+OUTPUT_POLICIES = (OUTPUT_APPEND, OUTPUT_REWRITE)
+
+# inotify events that mean "the folder content changed"
+_IN_MODIFY = 0x002
+_IN_CLOSE_WRITE = 0x008
+_IN_MOVED_FROM = 0x040
+_IN_MOVED_TO = 0x080
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+
+# Bytes read from the start and the end of a file to find its root element's start and end tag
+TAG_CHECK_BYTES = 64 * 1024
+# Byte order marks of the encodings whose markup isn't ASCII compatible, UTF-32 before UTF-16
+_WIDE_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+_COMMENT = re.compile(r"<!--.*?-->", re.S)
+# First start tag after the prolog (declaration, processing instructions, doctype)
+_ROOT_START_TAG = re.compile(r"<(?![?!])([^\s/>]+)[^>]*?(/?)>")
+# Comments, processing instructions and whitespace may follow the root element
+_TRAILING_MISC = r"(?:\s|<!--.*?-->|<\?.*?\?>)*$"
+
+
+def _file_signature(path: Path) -> Optional[list]:
+    try:
+        st = os.stat(path)
+        return [st.st_size, st.st_mtime_ns]
+    except OSError:
+        return None
+
+
+def _markup_codec(head: bytes) -> str:
+    """Codec to read the tags of a file with, latin-1 reads them in every ASCII compatible encoding."""
+    for bom, codec in _WIDE_BOMS:
+        if head.startswith(bom):
+            return codec
+    if head[:4] == b"<\0?\0":
+        return "utf-16-le"
+    if head[:4] == b"\0<\0?":
+        return "utf-16-be"
+    return "latin-1"
+
+
+def is_complete_xml(xml_file_path: str | Path) -> bool:
+    """Check that a file ends with the end tag of its root element, half-written files don't.
+
+    Only the start and the end of the file are read; syntax errors inside a complete
+    file are left to the export's own parse, which journals them.
+    """
+    try:
+        with open(xml_file_path, "rb") as f:
+            head = f.read(TAG_CHECK_BYTES)
+            size = os.fstat(f.fileno()).st_size
+            # Aligned so a UTF-16 or UTF-32 tail starts on a character
+            f.seek(max(0, size - TAG_CHECK_BYTES) // 4 * 4)
+            tail = f.read()
+    except OSError:
+        return False
+    codec = _markup_codec(head)
+    head_text = _COMMENT.sub("", head.decode(codec, errors="ignore"))
+    root = _ROOT_START_TAG.search(head_text)
+    if root is None:
+        return False
+    tail_text = tail.decode(codec, errors="ignore")
+    if root.group(2):
+        # Empty root element, <root/>, complete if nothing but misc follows it
+        return re.search(r"/>" + _TRAILING_MISC, tail_text, re.S) is not None
+    return re.search(rf"</{re.escape(root.group(1))}\s*>" + _TRAILING_MISC, tail_text, re.S) is not None
+
+
+class InotifyWaker:
+    """Wakes the watcher early when the folder changes (Linux inotify through libc).
+
+    Only used as a wake-up signal, the folder is still scanned to find what changed.
+    """
+
+    def __init__(self, folder: Path):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+        if libc.inotify_add_watch(self._fd, os.fsencode(str(folder)), mask) < 0:
+            error = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(error, f"inotify_add_watch failed for {folder}")
+
+    @classmethod
+    def create(cls, folder: Path) -> Optional["InotifyWaker"]:
+        """inotify waker, or None where it isn't available (non-Linux, limits reached, ...)."""
+        if not sys.platform.startswith("linux"):
+            return None
+        try:
+            return cls(folder)
+        except (OSError, AttributeError) as e:
+            logging.info(f"inotify not available, polling only: {e}")
+            return None
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for a change, returns True if one happened."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self._fd, 65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self._fd)
+
+
+class FolderWatcher:
+    """Finds new or changed XML files once their size and mtime stopped changing.
+
+    A file is ready after its signature was seen unchanged for ``debounce`` seconds.
+    ``processed`` maps file names to the signature that was handled last (exported or
+    rejected), a file is only offered again when its signature changes.
+    """
+
+    def __init__(self, folder: Path, debounce: float = 5.0, processed: Optional[Dict[str, list]] = None):
+        self.folder = Path(folder)
+        self.debounce = debounce
+        self.processed: Dict[str, list] = dict(processed or {})
+        self._pending: Dict[str, Tuple[list, float]] = {}
+
+    def scan(self) -> Tuple[List[Tuple[str, list]], List[str]]:
+        """Scan the folder.
+
+        Returns:
+            Tuple of (ready (name, signature) pairs, names of handled files that were deleted)
+        """
+        now = time.monotonic()
+        current = {}
+        for path in self.folder.glob("*.xml"):
+            signature = _file_signature(path)
+            if signature is not None and path.is_file():
+                current[path.name] = signature
+
+        deleted = [name for name in self.processed if name not in current]
+        for name in deleted:
+            del self.processed[name]
+        for name in [name for name in self._pending if name not in current]:
+            del self._pending[name]
+
+        ready = []
+        for name, signature in current.items():
+            if self.processed.get(name) == signature:
+                self._pending.pop(name, None)
+                continue
+            seen = self._pending.get(name)
+            if seen is None or seen[0] != signature:
+                # New or still changing, restart the debounce window
+                self._pending[name] = (signature, now)
+            elif now - seen[1] >= self.debounce:
+                ready.append((name, signature))
+        return ready, deleted
+
+    def mark_handled(self, name: str, signature: list):
+        self.processed[name] = signature
+        self._pending.pop(name, None)
+
+    def mark_all_current(self):
+        """Treat the files currently in the folder as handled (skip existing files)."""
+        for path in self.folder.glob("*.xml"):
+            signature = _file_signature(path)
+            if signature is not None:
+                self.processed[path.name] = signature
+
+
+class WatchExport:
+    """Continuous incremental CSV export of a drop folder.
+
+    Each cycle exports the ready files to a part file with the regular export engine and
+    merges it into the output: ``append`` adds the rows, ``rewrite`` replaces the rows of
+    changed and deleted files. The merge streams the CSV, memory stays bounded by the
+    per-file state and one cycle of at most ``max_batch_files`` files. Handled files
+    are persisted in ``<output>.watch.json`` so a restarted watcher continues.
+    """
+
+    def __init__(self,
+                 folder: str | Path,
+                 output: str | Path,
+                 xpath_expressions: List[str],
+                 headers: List[str],
+                 group_matches_flag: bool = True,
+                 max_threads: int | str = "auto",
+                 poll_interval: float = 2.0,
+                 debounce: float = 5.0,
+                 output_policy: str = OUTPUT_APPEND,
+                 max_batch_files: int = 2000,
+                 process_existing: bool = True,
+                 export_options: Optional[Dict[str, Any]] = None,
+                 connect_signals: Optional[Callable[[Any], None]] = None):
+        if output_policy not in OUTPUT_POLICIES:
+            raise ValueError(f"Unknown output policy {output_policy!r}, use one of {OUTPUT_POLICIES}")
+        if is_xlsx_output(output):
+            raise ValueError("A watched folder is merged into a CSV output, a workbook can't be appended to")
+        self.folder = Path(folder)
+        self.output_path = Path(output)
+        self.xpath_expressions = xpath_expressions
+        self.headers = headers
+        self.group_matches_flag = group_matches_flag
+        self.max_threads = max_threads
+        self.poll_interval = poll_interval
+        self.output_policy = output_policy
+        self.max_batch_files = max_batch_files
+        self.export_options = dict(export_options or {})
+        self.connect_signals = connect_signals
+
+        self.state_path = self.output_path.with_name(self.output_path.name + WATCH_STATE_SUFFIX)
+        self.part_path = self.output_path.with_name(self.output_path.stem + WATCH_PART_SUFFIX)
+        self.fingerprint = compute_job_fingerprint(
+            folder=str(self.folder.resolve()),
+            output=str(self.output_path.resolve()),
+            xpath_expressions=xpath_expressions,
+            headers=headers,
+            group_matches=group_matches_flag,
+            export_options=self.export_options,
+        )
+
+        processed = self._load_state()
+        # Without a matching state the output belongs to another job and is replaced
+        self._fresh_output = processed is None
+        self.watcher = FolderWatcher(self.folder, debounce, processed)
+        if processed is None and not process_existing:
+            self.watcher.mark_all_current()
+        self.cycles = 0
+        self.exported_files = 0
+        self.rejected_files = 0
+
+    # ============= STATE =============
+
+    def _load_state(self) -> Optional[Dict[str, list]]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return None
+        if data.get("version") != WATCH_STATE_VERSION or data.get("fingerprint") != self.fingerprint:
+            logging.info(f"Watch state {self.state_path} belongs to a different job, starting fresh")
+            return None
+        if not self.output_path.exists():
+            return None
+        return data.get("processed", {})
+
+    def _save_state(self):
+        data = {
+            "version": WATCH_STATE_VERSION,
+            "fingerprint": self.fingerprint,
+            "processed": self.watcher.processed,
+            "updated": time.time(),
+        }
+        tmp_path = self.state_path.with_name(self.state_path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.state_path)
+
+    # ============= CYCLES =============
+
+    def run(self, stop_event: Optional[threading.Event] = None, max_cycles: Optional[int] = None):
+        """Watch until stop_event is set (or max_cycles cycles ran)."""
+        stop_event = stop_event or threading.Event()
+        waker = InotifyWaker.create(self.folder)
+        logging.info(f"Watching {self.folder} ({'inotify' if waker else 'polling'}, "
+                     f"{self.output_policy} to {self.output_path})")
+        try:
+            while not stop_event.is_set():
+                try:
+                    self.run_cycle()
+                except Exception as e:
+                    # A failing cycle must not end the watcher, the files are retried next cycle
+                    logging.error(f"Watch cycle failed: {e}")
+                self.cycles += 1
+                if max_cycles is not None and self.cycles >= max_cycles:
+                    break
+                if waker is not None:
+                    # Wake on changes (at the latest after a poll interval for the debounce
+                    # timers), then wait briefly so a burst of writes is one scan
+                    if waker.wait(self.poll_interval):
+                        stop_event.wait(min(0.5, self.poll_interval))
+                else:
+                    stop_event.wait(self.poll_interval)
+        finally:
+            if waker is not None:
+                waker.close()
+
+    def run_cycle(self) -> int:
+        """Export the ready files once.
+
+        Returns:
+            Number of files exported in this cycle
+        """
+        ready, deleted = self.watcher.scan()
+        ready = ready[:self.max_batch_files]
+
+        complete = []
+        for name, signature in ready:
+            if is_complete_xml(self.folder / name):
+                complete.append((name, signature))
+            else:
+                # Half-written, offered again once the file changes
+                logging.warning(f"Skipping incomplete {name}, retrying when it changes")
+                self.watcher.mark_handled(name, signature)
+                self.rejected_files += 1
+
+        removed_stems = {Path(name).stem for name in deleted} if self.output_policy == OUTPUT_REWRITE else set()
+        if not complete:
+            if removed_stems and self.output_path.exists():
+                self._merge_part(None, removed_stems)
+            if ready or deleted:
+                self._save_state()
+            return 0
+
+        names = [name for name, _ in complete]
+        self._export_part(names)
+        replaced_stems = {Path(name).stem for name in names} if self.output_policy == OUTPUT_REWRITE else set()
+        self._merge_part(self.part_path, replaced_stems | removed_stems)
+        for name, signature in complete:
+            self.watcher.mark_handled(name, signature)
+        self._save_state()
+
+        self.exported_files += len(complete)
+        logging.info(f"Exported {len(complete)} new or changed files to {self.output_path}")
+        return len(complete)
+
+    def _export_part(self, xml_files: List[str]):
+        options = dict(self.export_options)
+        # Every cycle is a short row export of its own files
+        options.update(resume_from_checkpoint=False, output_mode=OUTPUT_ROWS, xml_files=xml_files)
+        exporter = create_xpath_searcher_and_csv_exporter(
+            str(self.folder), self.xpath_expressions, str(self.part_path), self.headers,
+            self.group_matches_flag, self.max_threads, **options
+        )
+        if self.connect_signals is not None:
+            self.connect_signals(exporter)
+        exporter.run()
+        # The metrics of the last cycle describe the watched output
+        if metrics_path(self.part_path).exists():
+            os.replace(metrics_path(self.part_path), metrics_path(self.output_path))
+        if not self.part_path.exists():
+            raise IOError(f"Export of {len(xml_files)} files produced no output")
+
+    def _merge_part(self, part_path: Optional[Path], replaced_stems: set):
+        """Merge the cycle's rows into the output, dropping rows of replaced files first."""
+        if self._fresh_output or not self.output_path.exists():
+            if part_path is not None:
+                os.replace(part_path, self.output_path)
+                self._fresh_output = False
+            return
+
+        if not replaced_stems and part_path is not None:
+            # Append: copy the part rows without its header
+            with open(part_path, "r", newline="", encoding="utf-8") as src, \
+                    open(self.output_path, "a", newline="", encoding="utf-8", buffering=1_048_576) as dst:
+                src.readline()
+                for line in src:
+                    dst.write(line)
+            part_path.unlink()
+            return
+
+        tmp_path = self.output_path.with_name(self.output_path.name + ".tmp")
+        with open(self.output_path, "r", newline="", encoding="utf-8") as old, \
+                open(tmp_path, "w", newline="", encoding="utf-8", buffering=1_048_576) as dst:
+            reader = csv.reader(old)
+            writer = csv.writer(dst)
+            header = next(reader, None)
+            if header is not None:
+                writer.writerow(header)
+            for row in reader:
+                if row and row[0] not in replaced_stems:
+                    writer.writerow(row)
+            if part_path is not None:
+                with open(part_path, "r", newline="", encoding="utf-8") as src:
+                    part_reader = csv.reader(src)
+                    next(part_reader, None)
+                    writer.writerows(part_reader)
+        os.replace(tmp_path, self.output_path)
+        if part_path is not None:
+            part_path.unlink()
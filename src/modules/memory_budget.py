@@ -0,0 +1,214 @@
+# modules/memory_budget.py
+from dataclasses import dataclass
+from typing import Optional
+import logging
+import os
+import threading
+import time
+
+
+AUTO_MEMORY_BUDGET = "auto"
+
+# Parsed tree size relative to the file size before anything has been learned,
+# lxml trees of typical export files take 3-10 times the file size
+DEFAULT_EXPANSION_FACTOR = 8.0
+MIN_EXPANSION_FACTOR = 2.0
+MAX_EXPANSION_FACTOR = 64.0
+# Smaller files don't move the resident set size measurably
+LEARN_MIN_FILE_BYTES = 4 * 1024 * 1024
+# Share of the available memory used as budget when detected automatically
+AUTO_BUDGET_SHARE = 0.5
+MIN_AUTO_BUDGET_BYTES = 256 * 1024 * 1024
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read_int(path: str) -> Optional[int]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return int(f.readline().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _cgroup_memory_headroom() -> Optional[int]:
+    """Bytes the current cgroup may still allocate (v2 ``memory.max`` or v1 ``memory.limit_in_bytes``)."""
+    relative = ""
+    try:
+        with open("/proc/self/cgroup", "r", encoding="utf-8") as f:
+            for entry in f:
+                if entry.startswith("0::"):
+                    relative = entry.strip()[3:].lstrip("/")
+                    break
+    except OSError:
+        pass
+    # Walk up the hierarchy, the nearest limited ancestor applies
+    while True:
+        limit = _read_int(os.path.join(_CGROUP_ROOT, relative, "memory.max"))
+        if limit is not None:
+            current = _read_int(os.path.join(_CGROUP_ROOT, relative, "memory.current")) or 0
+            return max(0, limit - current)
+        if not relative:
+            break
+        relative = os.path.dirname(relative)
+
+    limit = _read_int(os.path.join(_CGROUP_ROOT, "memory", "memory.limit_in_bytes"))
+    # v1 reports a huge number when no limit is set
+    if limit is not None and limit < 1 << 60:
+        usage = _read_int(os.path.join(_CGROUP_ROOT, "memory", "memory.usage_in_bytes")) or 0
+        return max(0, limit - usage)
+    return None
+
+
+def _available_memory() -> Optional[int]:
+    """MemAvailable of /proc/meminfo in bytes."""
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+def detect_memory_budget() -> int:
+    """Memory budget for parsed trees, a share of what the cgroup and the system still allow.
+
+    Returns:
+        Budget in bytes, 0 if the available memory can't be determined (no admission control)
+    """
+    candidates = [value for value in (_cgroup_memory_headroom(), _available_memory()) if value is not None]
+    if not candidates:
+        return 0
+    return max(MIN_AUTO_BUDGET_BYTES, int(min(candidates) * AUTO_BUDGET_SHARE))
+
+
+def resident_set_size() -> Optional[int]:
+    """Resident set size of this process in bytes, None where /proc isn't available."""
+    try:
+        with open("/proc/self/statm", "r", encoding="utf-8") as f:
+            return int(f.readline().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def resolve_memory_budget(value) -> int:
+    """Budget in bytes from the memory_budget_bytes option, "auto" detects it, 0 disables admission control."""
+    if value == AUTO_MEMORY_BUDGET:
+        return detect_memory_budget()
+    return max(0, int(value or 0))
+
+
+@dataclass
+class MemoryBudgetStats:
+    """What admission control did during a run."""
+    budget_bytes: int = 0
+    expansion_factor: float = DEFAULT_EXPANSION_FACTOR
+    factor_samples: int = 0
+    peak_reserved_bytes: int = 0
+    # Files that had to wait for memory, and for how long in total
+    waits: int = 0
+    wait_seconds: float = 0.0
+    # Files larger than the whole budget, streamed or parsed alone
+    streamed_files: int = 0
+    exclusive_files: int = 0
+
+
+@dataclass
+class Reservation:
+    """Memory held for one file between parsing and the end of its evaluation."""
+    size: int
+    cost: int
+    ticket: int
+    alone: bool
+    rss_before: Optional[int]
+
+
+class MemoryBudget:
+    """Admission control for parsing, so concurrent large files can't add up to an OOM.
+
+    Before a file is parsed, ``file size × expansion factor`` is reserved from the
+    budget; a file waits while the reservations of the files in flight leave no
+    room for it. A file whose estimate exceeds the whole budget is admitted alone
+    once nothing else is reserved (or streamed by the caller, see should_stream).
+
+    The expansion factor is learned from the growth of the resident set size while
+    a large file was parsed without other files starting next to it. Larger
+    observations are taken at once, smaller ones only pull the factor down slowly,
+    as freed memory reused by the allocator makes the growth look smaller than the tree.
+    """
+
+    def __init__(self, budget_bytes: int, expansion_factor: float = DEFAULT_EXPANSION_FACTOR):
+        self.budget_bytes = budget_bytes
+        self.stats = MemoryBudgetStats(budget_bytes=budget_bytes, expansion_factor=expansion_factor)
+        self._reserved = 0
+        self._active = 0
+        self._admitted = 0
+        self._condition = threading.Condition()
+
+    @property
+    def expansion_factor(self) -> float:
+        return self.stats.expansion_factor
+
+    def estimate(self, size: int) -> int:
+        """Estimated memory of the parsed tree of a file of ``size`` bytes."""
+        return int(size * self.stats.expansion_factor)
+
+    def should_stream(self, size: int) -> bool:
+        """True if the file can't be parsed within the budget even alone."""
+        return self.estimate(size) > self.budget_bytes
+
+    def acquire(self, size: int, terminate_event: Optional[threading.Event] = None) -> Optional[Reservation]:
+        """Reserve memory for parsing a file, waits until the budget has room.
+
+        Returns:
+            The reservation to release after the file has been evaluated,
+            or None if the run was terminated while waiting
+        """
+        cost = min(self.estimate(size), self.budget_bytes)
+        with self._condition:
+            if self._reserved and self._reserved + cost > self.budget_bytes:
+                self.stats.waits += 1
+                start = time.perf_counter()
+                while self._reserved and self._reserved + cost > self.budget_bytes:
+                    if terminate_event is not None and terminate_event.is_set():
+                        self.stats.wait_seconds += time.perf_counter() - start
+                        return None
+                    self._condition.wait(timeout=0.2)
+                self.stats.wait_seconds += time.perf_counter() - start
+            if cost >= self.budget_bytes:
+                self.stats.exclusive_files += 1
+            alone = self._active == 0
+            self._reserved += cost
+            self._active += 1
+            self._admitted += 1
+            self.stats.peak_reserved_bytes = max(self.stats.peak_reserved_bytes, self._reserved)
+            ticket = self._admitted
+        rss_before = resident_set_size() if alone and size >= LEARN_MIN_FILE_BYTES else None
+        return Reservation(size, cost, ticket, alone, rss_before)
+
+    def release(self, reservation: Reservation, rss_peak: Optional[int] = None):
+        """Return the memory of a file, learning from ``rss_peak`` (measured while its tree was alive)."""
+        with self._condition:
+            # Only a file that had the process to itself tells what its tree cost
+            if (reservation.rss_before is not None and rss_peak is not None
+                    and self._active == 1 and self._admitted == reservation.ticket):
+                self._learn(reservation.size, rss_peak - reservation.rss_before)
+            self._reserved -= reservation.cost
+            self._active -= 1
+            self._condition.notify_all()
+
+    def _learn(self, size: int, growth: int):
+        if growth <= 0:
+            return
+        observed = min(MAX_EXPANSION_FACTOR, max(MIN_EXPANSION_FACTOR, growth / size))
+        factor = self.stats.expansion_factor
+        self.stats.expansion_factor = observed if observed > factor else factor * 0.9 + observed * 0.1
+        self.stats.factor_samples += 1
+        logging.debug(f"Memory budget: {size} byte file grew the RSS by {growth} bytes, "
+                      f"expansion factor {self.stats.expansion_factor:.1f}")
+
+    def record_streamed(self):
+        with self._condition:
+            self.stats.streamed_files += 1
@@ -0,0 +1,511 @@
+# modules/multi_job_export.py
+from PySide6.QtCore import QRunnable, Slot
+from concurrent.futures import wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from pathlib import Path
+from queue import Queue, Empty
+from threading import Thread
+from typing import Any, Dict, List, Optional, Tuple
+import csv
+import logging
+import re
+import threading
+import time
+import traceback
+
+from modules.error_journal import STAGE_TASK, ErrorJournal, error_journal_path
+from modules.export_checkpoint import compute_job_fingerprint
+from modules.memory_budget import AUTO_MEMORY_BUDGET, MemoryBudget, resolve_memory_budget
+from modules.run_metrics import (
+    METRICS_SCHEMA_VERSION,
+    STATUS_ABORTED,
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    RunPeakRss,
+    metrics_path,
+    process_peak_rss_bytes,
+    write_metrics_json,
+)
+from modules.task_scheduler import LARGE_LANE, FileTask, normalize_policy, plan_tasks
+from modules.worker_pool import PRIORITY_BULK, shared_worker_pool
+from modules.worker_tuning import AdaptiveConcurrencyController, detect_cpu_budget, resolve_max_threads
+from modules.xml_encoding import EncodingStats
+from modules.xml_namespaces import detect_folder_namespace_map
+from modules.xpath_analysis import COLUMN_SAMPLE_FILES
+from modules.xpath_search_and_csv_export import (
+    ADMIT_CANCELLED,
+    ADMIT_STREAM,
+    CSVExportSignals,
+    OptimizedXMLProcessor,
+    generate_csv_headers,
+    process_single_xml_optimized,
+)
+
+
+# Error journal and run metrics of a pass are "batch.errors.jsonl" and "batch.metrics.json"
+# next to the output of the first job
+BATCH_RUN_NAME = "batch"
+
+
+@dataclass
+class ExportJob:
+    """One export of a batch: its own XPaths, headers, grouping and output file."""
+    xpath_expressions: List[str]
+    headers: List[str]
+    output_path: Path
+    group_matches_flag: bool = True
+    name: str = ""
+    # Statistics
+    files_with_matches: int = 0
+    total_matches: int = 0
+    rows_written: int = 0
+    errors: List[str] = field(default_factory=list)
+
+    def __post_init__(self):
+        self.output_path = Path(self.output_path)
+        if not self.name:
+            self.name = self.output_path.stem
+
+
+def jobs_from_saved_configs(configs: Dict[str, Dict[str, List[str]]],
+                            names: List[str],
+                            output_folder: str | Path,
+                            group_matches_flag: bool = True) -> List[ExportJob]:
+    """Build jobs from pre-built XPath configs (``custom_xpaths_autofill`` of config.json).
+
+    Each job writes ``<output_folder>/<config name>.csv``.
+
+    Raises:
+        KeyError: If a name is not a saved config
+    """
+    jobs = []
+    for name in names:
+        config = configs[name]
+        file_name = re.sub(r'[<>:"/\\|?*]+', "_", name).strip() or "export"
+        jobs.append(ExportJob(
+            xpath_expressions=list(config.get("xpath_expression", [])),
+            headers=list(config.get("csv_header", [])),
+            output_path=Path(output_folder) / f"{file_name}.csv",
+            group_matches_flag=group_matches_flag,
+            name=name,
+        ))
+    return jobs
+
+
+def process_xml_batch_for_jobs(
+    xml_files: List[str],
+    folder: Path,
+    jobs: List[ExportJob],
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor
+) -> List[Optional[List[Tuple[List[Dict[str, str]], int, int]]]]:
+    """
+    Parse each file once and evaluate the XPaths of every job on the shared tree.
+
+    Returns:
+        Per file the (result_rows, total_matches, file_had_matches_flag) tuple of each job,
+        None for files that could not be parsed
+    """
+    results = []
+    for xml_file in xml_files:
+        if terminate_event.is_set():
+            break
+        xml_file_path = str(folder / xml_file)
+        xpaths = list(dict.fromkeys(xpath for job in jobs for xpath in job.xpath_expressions))
+        with processor.admit(xml_file_path, xpaths, terminate_event) as admission:
+            if admission == ADMIT_CANCELLED:
+                break
+            if admission == ADMIT_STREAM:
+                # Too large to hold as a tree, every job reads the results of one streaming pass
+                xpath_results = processor.stream_xml_file(xml_file_path, xpaths)
+            else:
+                root = processor.parse_xml_file(xml_file_path)
+                xpath_results = None if root is None else processor.execute_xpath_batch(root, xpaths)
+            if xpath_results is None:
+                results.append(None)
+                continue
+            results.append([
+                process_single_xml_optimized(
+                    xml_file, folder, job.xpath_expressions, job.headers, job.group_matches_flag,
+                    terminate_event, processor, xpath_results=xpath_results
+                )
+                for job in jobs
+            ])
+            # Drop the tree before the memory is released
+            root = xpath_results = None
+    return results
+
+
+class _JobWriter:
+    """Background CSV writer of one job, fed through a bounded queue."""
+
+    def __init__(self, job: ExportJob, fieldnames: List[str], signals: CSVExportSignals):
+        self.job = job
+        self.fieldnames = fieldnames
+        self.signals = signals
+        self.queue: Queue = Queue(maxsize=5000)
+        self._stop = threading.Event()
+        self._thread = Thread(target=self._run, daemon=True, name=f"CSVWriterThread-{job.name}")
+
+    def start(self):
+        self._thread.start()
+
+    def put_rows(self, rows: List[Dict[str, str]]):
+        for row in rows:
+            self.queue.put(row)
+
+    def close(self):
+        self.queue.join()
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+    def _run(self):
+        try:
+            self.job.output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.job.output_path, "w", newline="", encoding="utf-8", buffering=1_048_576) as csvfile:
+                writer = csv.DictWriter(csvfile, fieldnames=self.fieldnames, extrasaction="ignore",
+                                        delimiter=",", quotechar='"', quoting=csv.QUOTE_MINIMAL)
+                writer.writeheader()
+                while not (self._stop.is_set() and self.queue.empty()):
+                    try:
+                        row = self.queue.get(timeout=0.2)
+                    except Empty:
+                        continue
+                    try:
+                        writer.writerow(row)
+                    finally:
+                        self.queue.task_done()
+        except Exception as e:
+            self.signals.error_occurred.emit("CSV Write Error", f"{self.job.name}: {e}")
+            # Keep draining so the coordinator never blocks on a dead writer
+            while not (self._stop.is_set() and self.queue.empty()):
+                try:
+                    self.queue.get(timeout=0.2)
+                    self.queue.task_done()
+                except Empty:
+                    continue
+
+
+class MultiJobCSVExportThread(QRunnable):
+    """Runs several export jobs over one folder, parsing every file only once.
+
+    Each job gets the same rows it would get from a separate export and its own
+    writer thread; only the parsing (the dominant cost) is shared.
+    """
+
+    def __init__(self, folder_path: str, jobs: List[ExportJob], max_threads: int | str = "auto",
+                 scheduling_policy: Optional[str] = None, namespaces: Optional[Dict[str, str]] = None,
+                 memory_budget_bytes: int | str = AUTO_MEMORY_BUDGET, write_metrics: bool = True):
+        super().__init__()
+        self.signals = CSVExportSignals()
+        self.setAutoDelete(True)
+        self.folder_path = Path(folder_path)
+        self.jobs = jobs
+        self.max_threads, self.auto_threads = resolve_max_threads(max_threads)
+        self.scheduling_policy = normalize_policy(scheduling_policy)
+        # None = detect the prefix map from a sample of the folder
+        self.namespaces = namespaces
+        self.memory_budget_bytes = memory_budget_bytes
+        # Write batch.metrics.json after every pass
+        self.write_metrics = write_metrics
+        self._processor = OptimizedXMLProcessor()
+        self._error_journal: Optional[ErrorJournal] = None
+        self._run_peak_rss: Optional[RunPeakRss] = None
+        self._terminate_event = threading.Event()
+        self.total_files = 0
+        self.processed_files = 0
+        self.failed_files = 0
+
+    def stop(self):
+        self._terminate_event.set()
+
+    @Slot()
+    def run(self):
+        try:
+            self._export_jobs()
+        except Exception as e:
+            self.signals.error_occurred.emit("Operation Error", f"{e}\n\nDetails:\n{traceback.format_exc()}")
+        finally:
+            self.signals.finished.emit()
+
+    def _validate_jobs(self) -> bool:
+        if not self.folder_path.is_dir():
+            self.signals.warning_occurred.emit(
+                "XML Folder not found", "Please set the path to the folder that contains XML files to process.")
+            return False
+        if not self.jobs:
+            self.signals.warning_occurred.emit("No Export Jobs", "Please select at least one saved configuration.")
+            return False
+        outputs = set()
+        for job in self.jobs:
+            if not job.xpath_expressions or len(job.headers) != len(job.xpath_expressions):
+                self.signals.warning_occurred.emit(
+                    "Header/XPath Length Mismatch",
+                    f"Job '{job.name}' has {len(job.headers)} headers for {len(job.xpath_expressions)} XPath expressions"
+                )
+                return False
+            if job.output_path.suffix.lower() != ".csv" or job.output_path in outputs:
+                self.signals.warning_occurred.emit(
+                    "CSV Output Path is Invalid", f"Job '{job.name}' needs its own .csv output file")
+                return False
+            outputs.add(job.output_path)
+        return True
+
+    @property
+    def run_path(self) -> Path:
+        """Base path of the error journal and metrics of the pass."""
+        return self.jobs[0].output_path.parent / BATCH_RUN_NAME
+
+    def _export_jobs(self):
+        if not self._validate_jobs():
+            return
+        start_time = time.time()
+        xml_files = [f.name for f in self.folder_path.glob("*.xml") if f.is_file()]
+        self.total_files = len(xml_files)
+        if not xml_files:
+            self.signals.warning_occurred.emit("No XML Files Found", "No XML files found in selected folder.")
+            return
+
+        # One journal for the pass, a file that fails fails for every job
+        self._error_journal = ErrorJournal(error_journal_path(self.run_path), self.folder_path)
+        self._processor.error_journal = self._error_journal
+        self._run_peak_rss = RunPeakRss() if self.write_metrics else None
+        status = STATUS_FAILED
+        try:
+            status = self._export_files(xml_files, start_time)
+        finally:
+            self._processor.error_journal = None
+            self._processor.terminate_event = None
+            self._error_journal.close()
+            if self.write_metrics:
+                self._write_run_metrics(status, start_time)
+
+    def _export_files(self, xml_files: List[str], start_time: float) -> str:
+        """Run the pass over the files.
+
+        Returns:
+            STATUS_COMPLETED, or STATUS_ABORTED if the pass was stopped
+        """
+        if self.namespaces is None:
+            self.namespaces = detect_folder_namespace_map(self.folder_path)
+        self._processor.set_namespaces(self.namespaces)
+        # Columns are fixed before the job writers generate their headers
+        self._processor.classify_columns(
+            [xpath for job in self.jobs for xpath in job.xpath_expressions],
+            [self.folder_path / xml_file for xml_file in xml_files[:COLUMN_SAMPLE_FILES]])
+        budget_bytes = resolve_memory_budget(self.memory_budget_bytes)
+        self._processor.memory_budget = MemoryBudget(budget_bytes) if budget_bytes > 0 else None
+        self._processor.encoding_stats = EncodingStats()
+        self._processor.terminate_event = self._terminate_event
+
+        self.signals.program_output_progress_append.emit(
+            f"Starting {len(self.jobs)} export jobs in one pass over {len(xml_files)} files "
+            f"with {self.max_threads} threads{' (auto)' if self.auto_threads else ''}..."
+        )
+        self.signals.visible_state_widget.emit(True)
+
+        writers = [
+            _JobWriter(job, generate_csv_headers(job.xpath_expressions, job.headers, self._processor), self.signals)
+            for job in self.jobs
+        ]
+        for writer in writers:
+            writer.start()
+
+        controller = AdaptiveConcurrencyController(
+            initial_limit=self.max_threads, cpu_budget=detect_cpu_budget(), enabled=self.auto_threads)
+        plan = plan_tasks(self.folder_path, xml_files, self.scheduling_policy)
+        pending: Dict[Any, FileTask] = {}
+
+        with shared_worker_pool().job("multi-job export", controller.ceiling, PRIORITY_BULK) as executor:
+            while not self._terminate_event.is_set():
+                while len(pending) < controller.limit:
+                    task = self._next_task(plan, pending, controller.limit)
+                    if task is None:
+                        break
+                    future = executor.submit(controller.run_timed, process_xml_batch_for_jobs, task.files,
+                                             self.folder_path, self.jobs, self._terminate_event, self._processor)
+                    pending[future] = task
+                if not pending:
+                    break
+
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                completed_files = 0
+                for future in done:
+                    task = pending.pop(future)
+                    completed_files += len(task.files)
+                    try:
+                        for file_results in future.result():
+                            self._handle_file_results(file_results, writers)
+                    except Exception as e:
+                        for xml_file in task.files:
+                            self._processor.report_error(xml_file, STAGE_TASK, e)
+                    self.processed_files += len(task.files)
+
+                if done:
+                    controller.record_completed(completed_files)
+                    self.signals.progressbar_update.emit(int(self.processed_files / self.total_files * 100))
+                    self.signals.file_processing_progress.emit(
+                        f"Processed {self.processed_files}/{self.total_files}")
+                controller.maybe_adjust()
+                if self._run_peak_rss is not None:
+                    self._run_peak_rss.sample()
+
+        for writer in writers:
+            writer.close()
+
+        if self._terminate_event.is_set():
+            self.signals.program_output_progress_append.emit("Export aborted by user.")
+            return STATUS_ABORTED
+        self._emit_completion_message(time.time() - start_time)
+        return STATUS_COMPLETED
+
+    def _next_task(self, plan, pending: Dict[Any, FileTask], limit: int) -> Optional[FileTask]:
+        """Pick the next task to submit, large lane first while it has free slots."""
+        if plan.large_lane:
+            in_flight = sum(1 for task in pending.values() if task.lane == LARGE_LANE)
+            if in_flight < max(1, limit // 2):
+                return plan.large_lane.popleft()
+        if plan.default_lane:
+            return plan.default_lane.popleft()
+        return None
+
+    def _handle_file_results(self, file_results, writers: List[_JobWriter]):
+        if file_results is None:
+            self.failed_files += 1
+            return
+        for writer, (rows, matches, has_matches) in zip(writers, file_results):
+            job = writer.job
+            if rows and has_matches:
+                writer.put_rows(rows)
+                job.rows_written += len(rows)
+            job.total_matches += matches
+            job.files_with_matches += has_matches
+
+    def _emit_completion_message(self, elapsed: float):
+        message_parts = [
+            f"{len(self.jobs)} export jobs completed in one pass!",
+            f"Files parsed: {self.processed_files}/{self.total_files} ({self.failed_files} unreadable)",
+            f"Elapsed time: {elapsed:.2f} seconds",
+        ]
+        for job in self.jobs:
+            message_parts.append(
+                f"{job.name}: {job.files_with_matches} files with matches, {job.total_matches} matches, "
+                f"{job.rows_written} rows -> {job.output_path}"
+            )
+        if self._processor.memory_budget:
+            memory = self._processor.memory_budget.stats
+            message_parts.append(
+                f"Memory budget: {memory.budget_bytes / 1_048_576:.0f} MB, expansion factor "
+                f"{memory.expansion_factor:.1f}, {memory.waits} files waited, {memory.streamed_files} streamed")
+        encodings = self._processor.encoding_stats
+        message_parts.append(
+            "Encodings: " + ", ".join(f"{name} {count}" for name, count in sorted(encodings.files_by_encoding.items()))
+            + f"; {encodings.corrected_files} files not in their declared encoding")
+        if self._error_journal.total:
+            message_parts.append(
+                f"Errors encountered: {self._error_journal.total}, journaled to {self._error_journal.path.name}")
+            message_parts.extend(f"  {line}" for line in self._error_journal.summary_lines())
+        self.signals.program_output_progress_set_text.emit("\n".join(message_parts))
+
+    def _run_metrics(self, status: str, start_time: float) -> Dict[str, Any]:
+        """Metrics document of the pass, with the keys of an export's metrics that apply to a batch."""
+        end_time = time.time()
+        elapsed = max(end_time - start_time, 1e-9)
+        journal = self._error_journal
+        memory = self._processor.memory_budget.stats if self._processor.memory_budget else None
+        encodings = self._processor.encoding_stats
+        errors_by_stage: Dict[str, int] = {}
+        for (stage, _), summary in journal.classes.items():
+            errors_by_stage[stage] = errors_by_stage.get(stage, 0) + summary.count
+        return {
+            "schema_version": METRICS_SCHEMA_VERSION,
+            "status": status,
+            "success": status == STATUS_COMPLETED,
+            "job_fingerprint": compute_job_fingerprint(
+                jobs=[[job.xpath_expressions, job.headers, job.group_matches_flag] for job in self.jobs],
+                namespaces=self.namespaces,
+            ),
+            "folder": str(self.folder_path),
+            "output": str(self.run_path),
+            "started_at": round(start_time, 3),
+            "finished_at": round(end_time, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "files": {
+                "total": self.total_files,
+                "processed": self.processed_files,
+                "failed": journal.total,
+            },
+            "matches": sum(job.total_matches for job in self.jobs),
+            "throughput": {
+                "files_per_second": round(self.processed_files / elapsed, 3),
+            },
+            "memory": {
+                "peak_rss_bytes": self._run_peak_rss.peak if self._run_peak_rss else None,
+                "process_peak_rss_bytes": process_peak_rss_bytes(),
+                "budget_bytes": memory.budget_bytes if memory else None,
+                "peak_reserved_bytes": memory.peak_reserved_bytes if memory else None,
+                "expansion_factor": round(memory.expansion_factor, 3) if memory else None,
+                "admission_waits": memory.waits if memory else None,
+                "streamed_files": memory.streamed_files if memory else None,
+            },
+            "errors": {
+                "total": journal.total,
+                "by_stage": errors_by_stage,
+                "by_class": [
+                    {"stage": stage, "error_class": error_class, "count": summary.count}
+                    for (stage, error_class), summary in journal.classes.items()
+                ],
+            },
+            "encodings": {
+                "files_by_encoding": dict(encodings.files_by_encoding),
+                "corrected_files": encodings.corrected_files,
+                "recovered_files": encodings.recovered_files,
+            } if encodings else None,
+            "jobs": [
+                {
+                    "name": job.name,
+                    "output": str(job.output_path),
+                    "files_with_matches": job.files_with_matches,
+                    "matches": job.total_matches,
+                    "rows_written": job.rows_written,
+                }
+                for job in self.jobs
+            ],
+        }
+
+    def _write_run_metrics(self, status: str, start_time: float):
+        """Write the metrics of the pass next to the outputs."""
+        try:
+            path = write_metrics_json(metrics_path(self.run_path), self._run_metrics(status, start_time))
+        except OSError as e:
+            logging.warning(f"Run metrics could not be written: {e}")
+            return
+        self.signals.program_output_progress_append.emit(f"Run metrics written to {path.name}")
+
+
+def create_multi_job_exporter(
+    folder: str,
+    jobs: List[ExportJob],
+    max_threads: int | str = "auto",
+    scheduling_policy: str = "directory",
+    namespaces: Optional[Dict[str, str]] = None,
+    memory_budget_bytes: int | str = AUTO_MEMORY_BUDGET,
+    write_metrics: bool = True
+) -> MultiJobCSVExportThread:
+    """
+    Factory function to create a single-pass export of several jobs.
+
+    Args:
+        folder: Folder with the XML files
+        jobs: Export jobs, each with its own XPaths, headers, group flag and output file
+        max_threads: Worker threads, "auto" adapts to the CPU budget
+        scheduling_policy: "directory", "largest_first" or "size_aware"
+        namespaces: Prefix to namespace URI map shared by all jobs, None detects it
+        memory_budget_bytes: Memory the parsed trees in flight may take, "auto" or 0 for no limit
+        write_metrics: Write batch.metrics.json next to the outputs after the pass
+
+    Returns:
+        Configured MultiJobCSVExportThread instance
+    """
+    return MultiJobCSVExportThread(folder, jobs, max_threads, scheduling_policy, namespaces,
+                                   memory_budget_bytes, write_metrics)
@@ -0,0 +1,60 @@
+# modules/parse_cancellation.py
+from typing import Optional
+import os
+import threading
+
+from lxml import etree as ET
+
+
+# Files from this size on are fed to the parser in chunks, smaller files parse in one call
+CANCELLABLE_PARSE_MIN_BYTES = 16 * 1024 * 1024
+# Bytes fed to the parser between two checks of the terminate event, about 10 ms of parsing
+PARSE_CHUNK_BYTES = 1024 * 1024
+# Parse events of a streamed file between two checks of the terminate event
+STREAM_CHECK_EVENTS = 4096
+
+
+class ParseCancelled(Exception):
+    """Parsing of a file was stopped because the run is being aborted."""
+
+
+def is_cancellable_size(size: int) -> bool:
+    """True if a file of this size is parsed in chunks, so an abort doesn't wait for the whole file."""
+    return size >= CANCELLABLE_PARSE_MIN_BYTES
+
+
+def feed_parser(parser: ET.XMLParser,
+                source: bytes | str,
+                terminate_event: Optional[threading.Event] = None,
+                chunk_bytes: int = PARSE_CHUNK_BYTES) -> Optional[ET._Element]:
+    """Parse bytes or a file by feeding the parser in chunks, checking the terminate event in between.
+
+    The parse errors of a fed parser are in ``parser.feed_error_log``.
+
+    Args:
+        source: The bytes of the file, or its path to read it chunk by chunk
+        terminate_event: None = the parse can't be cancelled
+
+    Returns:
+        The root element, None if recover mode couldn't recover one
+
+    Raises:
+        ParseCancelled: If the terminate event is set before the file is parsed
+        XMLSyntaxError: If the file can't be parsed even in recover mode
+        OSError: If the file can't be read
+    """
+    if isinstance(source, bytes):
+        for start in range(0, len(source), chunk_bytes):
+            if terminate_event is not None and terminate_event.is_set():
+                raise ParseCancelled()
+            # The parser only takes bytes, each chunk is a copy
+            parser.feed(source[start:start + chunk_bytes])
+    else:
+        with open(source, "rb", buffering=0) as f:
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            while chunk := f.read(chunk_bytes):
+                if terminate_event is not None and terminate_event.is_set():
+                    raise ParseCancelled()
+                parser.feed(chunk)
+    return parser.close()
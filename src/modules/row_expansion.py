@@ -0,0 +1,116 @@
+# modules/row_expansion.py
+from dataclasses import dataclass, replace
+from itertools import islice
+from typing import Dict, Iterator, List, Tuple
+
+
+# Layouts of the rows of a row export
+ROW_LAYOUT_WIDE = "wide"  # one row per match index, a column per XPath, shorter columns padded with Null
+ROW_LAYOUT_LONG = "long"  # one row per value: Filename, Column, Index, Value
+ROW_LAYOUTS = (ROW_LAYOUT_WIDE, ROW_LAYOUT_LONG)
+LONG_HEADERS = ["Filename", "Column", "Index", "Value"]
+
+# Placeholder of a value column without a value in the row (wide layout)
+NULL_VALUE = "Null"
+
+
+@dataclass
+class ExpandedRows:
+    """Formatted values of one file, expanded into CSV rows only while they are written.
+
+    Holds one list of values per column instead of one padded dict per row, so a
+    file with 100k matches in one column and a single match in the others queues
+    a single object; the writer builds and writes the rows one at a time.
+    """
+    filename: str
+    # (column, is_count_column, values) in the order of the CSV headers
+    columns: List[Tuple[str, bool, List[str]]]
+    group_matches_flag: bool
+    layout: str = ROW_LAYOUT_WIDE
+    # Rows written of the file at most, 0 = all
+    max_rows: int = 0
+    # A column had more matches than the per-column cap
+    columns_capped: bool = False
+
+    @property
+    def row_count(self) -> int:
+        """Rows of the file without the per-file cap."""
+        if self.layout == ROW_LAYOUT_LONG:
+            if self.group_matches_flag:
+                return sum(1 for _, _, values in self.columns if values)
+            return sum(len(values) for _, _, values in self.columns)
+        if self.group_matches_flag:
+            return 1
+        return max((1 if is_count else len(values) for _, is_count, values in self.columns if values), default=0)
+
+    @property
+    def truncated(self) -> bool:
+        """Matches of the file were left out by one of the caps."""
+        return self.columns_capped or bool(self.max_rows and self.row_count > self.max_rows)
+
+    def with_filename(self, filename: str) -> "ExpandedRows":
+        """The same rows for an identical file."""
+        return replace(self, filename=filename)
+
+    def rows(self) -> Iterator[List[str]]:
+        """CSV rows of the file, built one at a time."""
+        rows = self._long_rows() if self.layout == ROW_LAYOUT_LONG else self._wide_rows()
+        return islice(rows, self.max_rows) if self.max_rows else rows
+
+    def write(self, writer) -> None:
+        """Write the rows with a csv.writer."""
+        writer.writerows(self.rows())
+
+    def _wide_rows(self) -> Iterator[List[str]]:
+        filename = self.filename
+        if self.group_matches_flag:
+            yield [filename] + [
+                (values[0] if values else "") if is_count else (";".join(values) if values else NULL_VALUE)
+                for _, is_count, values in self.columns
+            ]
+            return
+        for row_index in range(self.row_count):
+            row = [filename]
+            for _, is_count, values in self.columns:
+                if is_count:
+                    row.append(values[0] if values and row_index == 0 else "")
+                else:
+                    row.append(values[row_index] if row_index < len(values) else NULL_VALUE)
+            yield row
+
+    def _long_rows(self) -> Iterator[List[str]]:
+        filename = self.filename
+        for column, is_count, values in self.columns:
+            if self.group_matches_flag and values:
+                yield [filename, column, "1", values[0] if is_count else ";".join(values)]
+                continue
+            for index, value in enumerate(values, 1):
+                yield [filename, column, str(index), value]
+
+
+def expand_file_rows(filename: str,
+                     columns: Dict[str, Tuple[bool, List[str]]],
+                     group_matches_flag: bool,
+                     layout: str = ROW_LAYOUT_WIDE,
+                     max_column_matches: int = 0,
+                     max_file_rows: int = 0) -> ExpandedRows:
+    """Rows of one file from its formatted values.
+
+    Args:
+        columns: (is_count_column, values) of each CSV column in header order
+        max_column_matches: Values kept per column at most, 0 = all
+        max_file_rows: Rows written of the file at most, 0 = all
+
+    Raises:
+        ValueError: If the layout is unknown
+    """
+    if layout not in ROW_LAYOUTS:
+        raise ValueError(f"Unknown row layout {layout!r}, use one of {ROW_LAYOUTS}")
+    capped = False
+    expanded = []
+    for column, (is_count, values) in columns.items():
+        if max_column_matches and not is_count and len(values) > max_column_matches:
+            values = values[:max_column_matches]
+            capped = True
+        expanded.append((column, is_count, values))
+    return ExpandedRows(filename, expanded, group_matches_flag, layout, max_file_rows, capped)
@@ -0,0 +1,174 @@
+# modules/run_metrics.py
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import json
+import os
+import re
+import sys
+import time
+
+from modules.memory_budget import resident_set_size
+
+
+METRICS_SUFFIX = ".metrics.json"
+# Raised when a key is renamed or removed, new keys keep the version
+METRICS_SCHEMA_VERSION = 1
+
+# Run outcomes
+STATUS_COMPLETED = "completed"
+STATUS_ABORTED = "aborted"
+STATUS_FAILED = "failed"
+
+PROMETHEUS_PREFIX = "xmluvation_export"
+# Characters kept out of the file names in the textfile collector directory
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]+")
+
+# (metric, help, keys into the metrics document) of the Prometheus textfile, one gauge each
+_PROMETHEUS_GAUGES: List[Tuple[str, str, Tuple[str, ...]]] = [
+    ("success", "1 if the last run completed, 0 if it was aborted or failed", ("success",)),
+    ("last_run_timestamp_seconds", "Unix time the last run finished", ("finished_at",)),
+    ("elapsed_seconds", "Duration of the last run", ("elapsed_seconds",)),
+    ("abort_seconds", "Seconds from the stop request until the workers had stopped, aborted runs only",
+     ("abort_seconds",)),
+    ("files_total", "Files selected for the last run", ("files", "total")),
+    ("files_processed", "Files processed, including files skipped by a resumed checkpoint", ("files", "processed")),
+    ("files_with_matches", "Files with at least one match", ("files", "with_matches")),
+    ("files_failed", "Files journaled as failed", ("files", "failed")),
+    ("matches", "Matches found", ("matches",)),
+    ("bytes_parsed", "Bytes of the files parsed", ("bytes_parsed",)),
+    ("files_per_second", "Files processed per second", ("throughput", "files_per_second")),
+    ("bytes_per_second", "Bytes parsed per second", ("throughput", "bytes_per_second")),
+    ("peak_rss_bytes", "Peak resident set size of the process during the run", ("memory", "peak_rss_bytes")),
+    ("process_peak_rss_bytes", "Peak resident set size of the process since it started",
+     ("memory", "process_peak_rss_bytes")),
+    ("workers_final", "Worker threads at the end of the run", ("workers", "final")),
+    ("workers_peak", "Most worker threads used at once", ("workers", "peak")),
+    ("io_wait_fraction", "Share of worker time spent waiting for I/O", ("workers", "io_wait_fraction")),
+    ("prefetch_hit_rate", "Share of files the I/O stage had read ahead", ("cache", "prefetch_hit_rate")),
+    ("duplicate_rate", "Share of files collapsed as duplicates", ("cache", "duplicate_rate")),
+    ("index_skip_rate", "Share of files ruled out by the corpus index", ("cache", "index_skip_rate")),
+    ("store_hit_rate", "Share of files answered from the columnar store", ("cache", "store_hit_rate")),
+]
+
+
+def metrics_path(output_path: str | Path) -> Path:
+    """Metrics file of an export, next to its output."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + METRICS_SUFFIX)
+
+
+def prometheus_path(directory: str | Path, output_path: str | Path) -> Path:
+    """File of an export in a textfile collector directory, named after the output."""
+    return Path(directory) / f"{PROMETHEUS_PREFIX}_{_UNSAFE_NAME.sub('_', Path(output_path).stem)}.prom"
+
+
+def process_peak_rss_bytes() -> Optional[int]:
+    """Peak resident set size of the process since it started, None where it isn't available.
+
+    Covers every earlier run of a long-lived process (the GUI), see RunPeakRss for the peak of one run.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class RunPeakRss:
+    """Peak resident set size during one run, sampled at most every ``interval`` seconds.
+
+    Peaks shorter than the interval between two samples are missed.
+    """
+
+    def __init__(self, interval: float = 0.5):
+        self.interval = interval
+        # None where the resident set size can't be read
+        self.peak: Optional[int] = None
+        self._next_sample = 0.0
+        self.sample()
+
+    def sample(self) -> Optional[int]:
+        """Take a sample if the interval elapsed, returns the peak so far."""
+        now = time.monotonic()
+        if now >= self._next_sample:
+            self._next_sample = now + self.interval
+            rss = resident_set_size()
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+        return self.peak
+
+
+def rate(part: int, whole: int) -> Optional[float]:
+    """Share of ``part`` in ``whole``, None if there is nothing to divide."""
+    return part / whole if whole else None
+
+
+def _write_atomic(path: Path, text: str):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_metrics_json(path: str | Path, metrics: Dict[str, Any]) -> Path:
+    """Write the metrics document of a run, replacing the one of the last run."""
+    path = Path(path)
+    _write_atomic(path, json.dumps(metrics, indent=2) + "\n")
+    return path
+
+
+def _lookup(metrics: Dict[str, Any], keys: Tuple[str, ...]) -> Any:
+    value = metrics
+    for key in keys:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def _label(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_prometheus(metrics: Dict[str, Any]) -> str:
+    """Metrics document in the Prometheus text exposition format.
+
+    Every gauge is labelled with the output file and the job fingerprint; stage
+    timings are labelled by stage, errors by stage and error class. Values the run
+    doesn't have (e.g. the prefetch hit rate without prefetching) are left out.
+    """
+    labels = f'output="{_label(Path(metrics["output"]).name)}",job="{_label(metrics["job_fingerprint"][:16])}"'
+    lines = []
+
+    def gauge(name: str, help_text: str, samples: List[Tuple[str, Any]]):
+        samples = [(extra, value) for extra, value in samples if isinstance(value, (int, float))]
+        if not samples:
+            return
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+        for extra, value in samples:
+            lines.append(f"{PROMETHEUS_PREFIX}_{name}{{{labels}{extra}}} "
+                         f"{int(value) if isinstance(value, (bool, int)) else repr(float(value))}")
+
+    for name, help_text, keys in _PROMETHEUS_GAUGES:
+        gauge(name, help_text, [("", _lookup(metrics, keys))])
+    stages = metrics.get("stages") or {}
+    gauge("stage_seconds", "Time spent in a pipeline stage, summed over all threads",
+          [(f',stage="{_label(stage)}"', totals["seconds"]) for stage, totals in stages.items()])
+    gauge("stage_count", "Spans of a pipeline stage",
+          [(f',stage="{_label(stage)}"', totals["count"]) for stage, totals in stages.items()])
+    errors = (metrics.get("errors") or {}).get("by_class") or []
+    gauge("errors", "Failures journaled per stage and error class",
+          [(f',stage="{_label(error["stage"])}",error_class="{_label(error["error_class"])}"', error["count"])
+           for error in errors])
+    return "\n".join(lines) + "\n"
+
+
+def write_prometheus_textfile(path: str | Path, metrics: Dict[str, Any]) -> Path:
+    """Write the metrics for the node exporter textfile collector (atomically, it may read at any time)."""
+    path = Path(path)
+    _write_atomic(path, format_prometheus(metrics))
+    return path
@@ -0,0 +1,186 @@
+# modules/stage_profiler.py
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import itertools
+import json
+import os
+import threading
+import time
+
+
+TRACE_SUFFIX = ".trace.json"
+# Events kept in memory at most, later events are counted as dropped
+DEFAULT_MAX_EVENTS = 1_000_000
+
+# Pipeline stages traced by the export
+TRACE_ENUMERATE = "enumerate"
+TRACE_READ = "read"
+TRACE_PARSE = "parse"
+TRACE_STREAM = "stream parse"
+TRACE_XPATH = "xpath"
+TRACE_FORMAT = "format"
+TRACE_QUEUE_ROWS = "queue rows"
+TRACE_QUEUE_WAIT = "queue wait"
+TRACE_WRITE = "write"
+TRACE_PREFETCH = "prefetch read"
+# Waits of the writer for rows shorter than this aren't recorded
+MIN_QUEUE_WAIT_NS = 1_000_000
+
+# Bytes of the files parsed, a run total of StageProfiler.add
+BYTES_PARSED = "bytes parsed"
+
+# Span returned while no profiler is attached
+NULL_SPAN = nullcontext()
+
+
+def trace_path(output_path: str | Path) -> Path:
+    """Trace file of an export, next to its output."""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + TRACE_SUFFIX)
+
+
+class _Span:
+    """Times a block, adds it to the stage totals and records it as a complete ("X") trace event."""
+    __slots__ = ("_profiler", "_name", "_args", "_record", "_start")
+
+    def __init__(self, profiler: "StageProfiler", name: str, args: Optional[Dict[str, Any]], record: bool = True):
+        self._profiler = profiler
+        self._name = name
+        self._args = args
+        self._record = record
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._profiler.add_span(self._name, self._start, time.perf_counter_ns(), self._args, self._record)
+        return False
+
+
+class _FileSpan(_Span):
+    """Span of one file, decides whether the spans of the file's stages are recorded as events."""
+    __slots__ = ("_previous",)
+
+    def __enter__(self):
+        local = self._profiler._local
+        self._previous = getattr(local, "sampled", True)
+        local.sampled = self._record
+        return super().__enter__()
+
+    def __exit__(self, *exc_info):
+        self._profiler._local.sampled = self._previous
+        return super().__exit__(*exc_info)
+
+
+class StageProfiler:
+    """Records where the time of an export goes, per pipeline stage and thread.
+
+    Spans are timed with perf_counter_ns and added to a count and total time per
+    stage, which the run metrics report. With ``record_events`` every span is also
+    appended to a list, so a traced span costs about a microsecond. With
+    ``sample_every`` > 1 only every n-th file is traced (its read, parse, XPath and
+    format spans), the totals still cover all files; spans outside of files, like
+    enumeration, queue waits and writes, are always recorded. The events are written
+    as Chrome trace-event JSON, which chrome://tracing and the Perfetto UI open.
+    """
+
+    def __init__(self, sample_every: int = 1, max_events: int = DEFAULT_MAX_EVENTS, record_events: bool = True):
+        self.sample_every = max(1, sample_every)
+        self.max_events = max_events
+        self.record_events = record_events
+        self.dropped = 0
+        self._events: List[Dict[str, Any]] = []
+        # Count and nanoseconds of each stage, and amounts like bytes read
+        self._totals: Dict[str, List[int]] = {}
+        self._amounts: Dict[str, int] = {}
+        self._totals_lock = threading.Lock()
+        self._thread_names: Dict[int, str] = {}
+        self._files = itertools.count()
+        self._local = threading.local()
+        self._origin = time.perf_counter_ns()
+        self._pid = os.getpid()
+
+    @property
+    def event_count(self) -> int:
+        return len(self._events)
+
+    def file(self, xml_file: str):
+        """Span of one file; the stage spans inside it are only recorded as events if the file is sampled."""
+        sampled = self.record_events and next(self._files) % self.sample_every == 0
+        return _FileSpan(self, "file", {"file": xml_file}, sampled)
+
+    def span(self, name: str, **args):
+        """Span of a stage, only added to the totals inside a file that isn't sampled."""
+        return _Span(self, name, args or None, getattr(self._local, "sampled", True))
+
+    def add_span(self, name: str, start_ns: int, end_ns: int, args: Optional[Dict[str, Any]] = None,
+                 record: bool = True):
+        """Add a span timed by the caller (perf_counter_ns values), ``record`` = False only counts it."""
+        with self._totals_lock:
+            total = self._totals.get(name)
+            if total is None:
+                total = self._totals[name] = [0, 0]
+            total[0] += 1
+            total[1] += end_ns - start_ns
+        if not (record and self.record_events):
+            return
+        event = {
+            "name": name, "ph": "X",
+            "ts": (start_ns - self._origin) / 1000, "dur": (end_ns - start_ns) / 1000,
+        }
+        if args:
+            event["args"] = args
+        self._append(event)
+
+    def add(self, name: str, amount: int):
+        """Add to a run total that isn't a time, e.g. the bytes read."""
+        with self._totals_lock:
+            self._amounts[name] = self._amounts.get(name, 0) + amount
+
+    def stage_totals(self) -> Dict[str, Tuple[int, float]]:
+        """(count, seconds) of each stage."""
+        with self._totals_lock:
+            return {name: (count, ns / 1e9) for name, (count, ns) in self._totals.items()}
+
+    def amount(self, name: str) -> int:
+        with self._totals_lock:
+            return self._amounts.get(name, 0)
+
+    def counter(self, name: str, **values):
+        """Record counter values (e.g. a queue depth), drawn as a graph by the viewer."""
+        if not self.record_events:
+            return
+        self._append({"name": name, "ph": "C", "ts": (time.perf_counter_ns() - self._origin) / 1000,
+                      "args": values})
+
+    def _append(self, event: Dict[str, Any]):
+        if len(self._events) >= self.max_events:
+            self.dropped += 1
+            return
+        thread_id = threading.get_ident()
+        if thread_id not in self._thread_names:
+            self._thread_names[thread_id] = threading.current_thread().name
+        event["pid"] = self._pid
+        event["tid"] = thread_id
+        # list.append is atomic, the worker threads share the list without a lock
+        self._events.append(event)
+
+    def write(self, path: str | Path) -> Path:
+        """Write the trace as Chrome trace-event JSON."""
+        path = Path(path)
+        metadata = [
+            {"name": "thread_name", "ph": "M", "pid": self._pid, "tid": thread_id, "args": {"name": name}}
+            for thread_id, name in list(self._thread_names.items())
+        ]
+        metadata.append({"name": "process_name", "ph": "M", "pid": self._pid, "args": {"name": "XMLuvation export"}})
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "traceEvents": metadata + self._events,
+                "displayTimeUnit": "ms",
+                "otherData": {"sample_every": self.sample_every, "dropped_events": self.dropped},
+            }, f)
+        os.replace(tmp_path, path)
+        return path
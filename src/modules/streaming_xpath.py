@@ -0,0 +1,121 @@
+# modules/streaming_xpath.py
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+import threading
+
+from lxml import etree as ET
+
+from modules.columnar_store import ATTRIBUTE_NODE, ELEMENT_NODE, TEXT_NODE, SimpleXPath, parse_simple_xpath
+from modules.parse_cancellation import STREAM_CHECK_EVENTS, ParseCancelled
+
+
+def can_stream(xpath_expressions: List[str], namespaces: Optional[Dict[str, str]] = None) -> bool:
+    """True if every XPath is a simple path (see parse_simple_xpath) the streaming evaluator supports."""
+    return bool(xpath_expressions) and all(
+        parse_simple_xpath(xpath, namespaces) is not None for xpath in xpath_expressions)
+
+
+def _matches(simple: SimpleXPath, path: List[str]) -> bool:
+    if simple.descendant:
+        return len(path) >= len(simple.steps) and path[-len(simple.steps):] == simple.steps
+    return path == simple.steps
+
+
+def stream_xpath_results(source: str | BinaryIO,
+                         xpath_expressions: List[str],
+                         namespaces: Optional[Dict[str, str]] = None,
+                         encoding: Optional[str] = None,
+                         terminate_event: Optional[threading.Event] = None) -> Optional[Dict[str, List[Any]]]:
+    """Evaluate simple path XPaths while parsing, without building the whole tree.
+
+    Elements are removed as soon as their text and tail have been seen, so memory
+    stays bounded by the depth of the document instead of its size. Results equal
+    OptimizedXMLProcessor.execute_xpath_batch: values in document order for text
+    and attribute paths, one item per element for element paths.
+
+    Args:
+        source: File path or binary file object
+        encoding: Encoding overriding the declaration of the file, see detect_encoding
+        terminate_event: Checked every STREAM_CHECK_EVENTS parse events, None = the file is parsed to the end
+
+    Returns:
+        Results per XPath, or None if the file has no root element
+
+    Raises:
+        XMLSyntaxError: If the file can't be parsed even in recover mode
+        OSError: If the file can't be read
+        ParseCancelled: If the terminate event is set before the file is parsed
+    """
+    patterns = [(xpath, parse_simple_xpath(xpath, namespaces)) for xpath in xpath_expressions]
+    if any(simple is None for _, simple in patterns):
+        raise ValueError("Only simple path XPaths can be evaluated while streaming")
+    text_patterns = [(xpath, simple) for xpath, simple in patterns if simple.kind == TEXT_NODE]
+    # (document order slot, value) per XPath
+    found: Dict[str, List[Tuple[int, Any]]] = {xpath: [] for xpath in xpath_expressions}
+
+    path: List[str] = []
+    # (element, XPaths selecting its text nodes, slot of its first text) of the open elements
+    open_elements: List[Tuple[Any, List[str], int]] = []
+    # Document order slot of each pending tail, the text right after an element, comment or PI
+    tail_slots: Dict[Any, int] = {}
+    text_seen = set()
+    slot = 0
+
+    def add_text(text_xpaths: List[str], position: int, text: Optional[str]):
+        if text:
+            for xpath in text_xpaths:
+                found[xpath].append((position, text))
+
+    def flush_previous(node):
+        """The text before ``node`` in its parent is complete now, evaluate it and drop the sibling."""
+        parent, text_xpaths, text_slot = open_elements[-1]
+        previous = node.getprevious()
+        if previous is None:
+            if id(parent) not in text_seen:
+                text_seen.add(id(parent))
+                add_text(text_xpaths, text_slot, parent.text)
+        else:
+            add_text(text_xpaths, tail_slots.pop(previous), previous.tail)
+            parent.remove(previous)
+
+    events = ET.iterparse(source, events=("start", "end", "comment", "pi"),
+                          recover=True, huge_tree=True, encoding=encoding)
+    for count, (event, node) in enumerate(events):
+        if terminate_event is not None and count % STREAM_CHECK_EVENTS == 0 and terminate_event.is_set():
+            raise ParseCancelled()
+        if event == "start":
+            if open_elements:
+                flush_previous(node)
+            path.append(node.tag)
+            for xpath, simple in patterns:
+                if not _matches(simple, path):
+                    continue
+                if simple.kind == ELEMENT_NODE:
+                    found[xpath].append((slot, slot))
+                elif simple.kind == ATTRIBUTE_NODE and simple.attribute in node.attrib:
+                    found[xpath].append((slot, node.attrib[simple.attribute]))
+            open_elements.append(
+                (node, [xpath for xpath, simple in text_patterns if _matches(simple, path)], slot))
+            slot += 1
+        elif event == "end":
+            element, text_xpaths, text_slot = open_elements.pop()
+            last = element[-1] if len(element) else None
+            if last is None:
+                add_text(text_xpaths, text_slot, element.text)
+            else:
+                add_text(text_xpaths, tail_slots.pop(last), last.tail)
+                element.remove(last)
+            text_seen.discard(id(element))
+            path.pop()
+            if open_elements:
+                tail_slots[element] = slot
+                slot += 1
+        elif open_elements:
+            # Comments and processing instructions split the text of their parent
+            flush_previous(node)
+            tail_slots[node] = slot
+            slot += 1
+
+    if not slot:
+        # Not a single element could be recovered
+        return None
+    return {xpath: [value for _, value in sorted(items, key=lambda item: item[0])] for xpath, items in found.items()}
@@ -0,0 +1,127 @@
+# modules/task_scheduler.py
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Deque, List, Optional
+import logging
+import os
+
+
+# Scheduling policies
+DIRECTORY_ORDER = "directory"
+LARGEST_FIRST = "largest_first"
+SIZE_AWARE = "size_aware"
+SCHEDULING_POLICIES = (DIRECTORY_ORDER, LARGEST_FIRST, SIZE_AWARE)
+
+# Lanes
+DEFAULT_LANE = "default"
+LARGE_LANE = "large"
+
+# Size-aware defaults
+SMALL_FILE_BYTES = 64 * 1024
+BATCH_TARGET_BYTES = 1024 * 1024
+MAX_BATCH_FILES = 64
+LARGE_FILE_BYTES = 256 * 1024 * 1024
+
+
+@dataclass
+class FileTask:
+    """A unit of work submitted to the worker pool: one file, or a batch of tiny files."""
+    files: List[str]
+    total_bytes: int = 0
+    lane: str = DEFAULT_LANE
+
+
+@dataclass
+class SchedulePlan:
+    """Ordered tasks per lane, produced by plan_tasks."""
+    policy: str
+    default_lane: Deque[FileTask] = field(default_factory=deque)
+    large_lane: Deque[FileTask] = field(default_factory=deque)
+    batched_files: int = 0
+
+    @property
+    def task_count(self) -> int:
+        return len(self.default_lane) + len(self.large_lane)
+
+    @property
+    def large_files(self) -> int:
+        return sum(len(task.files) for task in self.large_lane)
+
+    def has_tasks(self) -> bool:
+        return bool(self.default_lane or self.large_lane)
+
+
+def normalize_policy(policy: Optional[str]) -> str:
+    """Return a valid policy name, falling back to directory order."""
+    if policy is None:
+        return DIRECTORY_ORDER
+    policy = policy.strip().lower()
+    if policy not in SCHEDULING_POLICIES:
+        logging.warning(f"Unknown scheduling policy {policy!r}, using '{DIRECTORY_ORDER}'")
+        return DIRECTORY_ORDER
+    return policy
+
+
+def _file_size(folder: Path, xml_file: str) -> int:
+    try:
+        return os.stat(folder / xml_file).st_size
+    except OSError:
+        return 0
+
+
+def plan_tasks(folder: Path,
+               xml_files: List[str],
+               policy: str = DIRECTORY_ORDER,
+               small_file_bytes: int = SMALL_FILE_BYTES,
+               batch_target_bytes: int = BATCH_TARGET_BYTES,
+               max_batch_files: int = MAX_BATCH_FILES,
+               large_file_bytes: int = LARGE_FILE_BYTES) -> SchedulePlan:
+    """Order and group files into tasks according to the scheduling policy.
+
+    - directory: one task per file in enumeration order
+    - largest_first: one task per file, longest-processing-time (largest size) first
+    - size_aware: largest first, files above ``large_file_bytes`` go to the large lane and
+      files below ``small_file_bytes`` are packed into batches of about ``batch_target_bytes``
+
+    Args:
+        folder: Folder containing the files
+        xml_files: File names relative to folder
+        policy: One of SCHEDULING_POLICIES
+
+    Returns:
+        SchedulePlan with the tasks of each lane in submission order
+    """
+    policy = normalize_policy(policy)
+    plan = SchedulePlan(policy=policy)
+
+    if policy == DIRECTORY_ORDER:
+        plan.default_lane.extend(FileTask([xml_file]) for xml_file in xml_files)
+        return plan
+
+    sized = sorted(((_file_size(folder, f), f) for f in xml_files), key=lambda item: item[0], reverse=True)
+
+    if policy == LARGEST_FIRST:
+        plan.default_lane.extend(FileTask([name], size) for size, name in sized)
+        return plan
+
+    batch: List[str] = []
+    batch_bytes = 0
+    for size, name in sized:
+        if size >= large_file_bytes:
+            plan.large_lane.append(FileTask([name], size, LARGE_LANE))
+        elif size >= small_file_bytes:
+            plan.default_lane.append(FileTask([name], size))
+        else:
+            batch.append(name)
+            batch_bytes += size
+            if len(batch) >= max_batch_files or batch_bytes >= batch_target_bytes:
+                plan.default_lane.append(FileTask(batch, batch_bytes))
+                plan.batched_files += len(batch)
+                batch, batch_bytes = [], 0
+    if batch:
+        if len(batch) > 1:
+            plan.batched_files += len(batch)
+        plan.default_lane.append(FileTask(batch, batch_bytes))
+
+    return plan
@@ -0,0 +1,239 @@
+# modules/worker_pool.py
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from typing import Any, Callable, Deque, List, Optional, Tuple
+import collections
+import itertools
+import logging
+import threading
+
+from modules.worker_tuning import IO_OVERCOMMIT_FACTOR, MAX_WORKER_CEILING, detect_cpu_budget
+
+
+# Job priorities, lower runs first
+PRIORITY_INTERACTIVE = 0  # XML parsing and validation the user waits for
+PRIORITY_NORMAL = 10      # conversions and other single task jobs
+PRIORITY_BULK = 20        # exports and index builds over whole folders
+
+# Threads only interactive jobs may use, so they never wait for a bulk job's tasks
+INTERACTIVE_RESERVE = 1
+
+
+@dataclass
+class PoolJobStats:
+    """Snapshot of a job of the pool."""
+    name: str
+    priority: int
+    max_workers: int
+    running: int
+    queued: int
+    completed: int
+
+
+# (future, function, args, kwargs) of a queued task
+_Task = Tuple[Future, Callable, tuple, dict]
+
+
+class PoolJob(Executor):
+    """A job's view of the shared WorkerPool, a drop-in for a ThreadPoolExecutor.
+
+    At most ``max_workers`` tasks of the job run at once; which queued task of all
+    jobs runs next is decided by the job priorities, then by the order in which
+    the jobs were started. Shutting the job down only waits for (or cancels) its
+    own tasks, the threads of the pool stay up for the next job.
+    """
+
+    def __init__(self, pool: "WorkerPool", name: str, max_workers: int, priority: int, sequence: int):
+        self.pool = pool
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.priority = priority
+        self.sequence = sequence
+        self.running = 0
+        self.completed = 0
+        self.closed = False
+        self.queue: Deque[_Task] = collections.deque()
+
+    def submit(self, fn: Callable, /, *args, **kwargs) -> Future:
+        future = Future()
+        self.pool._enqueue(self, (future, fn, args, kwargs))
+        return future
+
+    def shutdown(self, wait: bool = True, *, cancel_futures: bool = False):
+        """Stop accepting tasks; other jobs and the pool threads are not affected."""
+        self.pool._close(self, wait, cancel_futures)
+
+    def stats(self) -> PoolJobStats:
+        with self.pool._condition:
+            return PoolJobStats(self.name, self.priority, self.max_workers, self.running, len(self.queue),
+                                self.completed)
+
+
+class WorkerPool:
+    """Long-lived worker threads shared by all jobs of the application.
+
+    Exports, index builds, conversions and the parsing and validation the user
+    waits for all run their tasks here instead of creating and tearing down an
+    executor per run. Each job gets a PoolJob with its own concurrency limit and
+    priority: a bulk export keeps its window of tasks queued, but an interactive
+    task takes the next free thread, and ``reserved_workers`` threads are never
+    given to jobs below PRIORITY_INTERACTIVE. Threads are started on demand up to
+    ``max_workers`` and kept for later jobs.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, reserved_workers: int = INTERACTIVE_RESERVE,
+                 thread_name_prefix: str = "WorkerPool"):
+        if max_workers is None:
+            max_workers = max(detect_cpu_budget() * IO_OVERCOMMIT_FACTOR, MAX_WORKER_CEILING) + reserved_workers
+        self.max_workers = max(1, max_workers)
+        self.reserved_workers = min(max(0, reserved_workers), self.max_workers - 1)
+        self.thread_name_prefix = thread_name_prefix
+        self._condition = threading.Condition()
+        self._jobs: List[PoolJob] = []
+        self._threads: List[threading.Thread] = []
+        self._idle = 0
+        # Running tasks of jobs below PRIORITY_INTERACTIVE
+        self._background_running = 0
+        self._sequence = itertools.count()
+        self._shutdown = False
+
+    @property
+    def thread_count(self) -> int:
+        return len(self._threads)
+
+    def job(self, name: str, max_workers: Optional[int] = None, priority: int = PRIORITY_BULK) -> PoolJob:
+        """Register a job, its tasks are submitted to (and the job shut down on) the returned executor.
+
+        Args:
+            max_workers: Tasks of the job running at once at most, None = as many as the pool allows
+        """
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("Worker pool is shut down")
+            job = PoolJob(self, name, min(max_workers or self.max_workers, self.max_workers), priority,
+                          next(self._sequence))
+            self._jobs.append(job)
+            self._jobs.sort(key=lambda j: (j.priority, j.sequence))
+            return job
+
+    def run(self, fn: Callable, *args, name: Optional[str] = None, priority: int = PRIORITY_NORMAL,
+            **kwargs) -> Future:
+        """Run a single task as a job of its own."""
+        job = self.job(name or getattr(fn, "__qualname__", "task"), 1, priority)
+        future = job.submit(fn, *args, **kwargs)
+        job.shutdown(wait=False)
+        return future
+
+    def start(self, runnable: Any, priority: int = PRIORITY_INTERACTIVE) -> Future:
+        """Run a QRunnable (or any object with run()) on the pool instead of a QThreadPool."""
+        return self.run(runnable.run, name=type(runnable).__name__, priority=priority)
+
+    def stats(self) -> List[PoolJobStats]:
+        """Jobs of the pool in the order their tasks are picked."""
+        with self._condition:
+            jobs = list(self._jobs)
+        return [job.stats() for job in jobs]
+
+    def shutdown(self, wait: bool = True, cancel_futures: bool = False):
+        """Stop all jobs and the threads, e.g. when the application quits."""
+        with self._condition:
+            self._shutdown = True
+            jobs = list(self._jobs)
+        for job in jobs:
+            self._close(job, False, cancel_futures)
+        with self._condition:
+            self._condition.notify_all()
+        if wait:
+            for thread in list(self._threads):
+                thread.join()
+
+    def _enqueue(self, job: PoolJob, task: _Task):
+        with self._condition:
+            if job.closed:
+                raise RuntimeError(f"Cannot schedule new tasks after job '{job.name}' was shut down")
+            job.queue.append(task)
+            # Idle threads may already be woken for other tasks that may start now
+            startable = sum(max(0, min(len(queued_job.queue), queued_job.max_workers - queued_job.running))
+                            for queued_job in self._jobs)
+            if self._idle < startable and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, daemon=True,
+                                          name=f"{self.thread_name_prefix}_{len(self._threads)}")
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._condition.notify_all()
+
+    def _close(self, job: PoolJob, wait: bool, cancel_futures: bool):
+        with self._condition:
+            job.closed = True
+            if cancel_futures:
+                while job.queue:
+                    future = job.queue.popleft()[0]
+                    # Cancelled and notified, so wait() counts it as done
+                    if future.cancel():
+                        future.set_running_or_notify_cancel()
+            if wait:
+                self._condition.wait_for(lambda: not job.queue and not job.running)
+            self._remove_if_done(job)
+
+    def _remove_if_done(self, job: PoolJob):
+        if job.closed and not job.queue and not job.running and job in self._jobs:
+            self._jobs.remove(job)
+
+    def _next_task(self) -> Optional[Tuple[PoolJob, _Task]]:
+        """Highest priority queued task whose job is below its limit, None if none may run now."""
+        background_slots = self.max_workers - self.reserved_workers - self._background_running
+        for job in self._jobs:
+            if not job.queue or job.running >= job.max_workers:
+                continue
+            if job.priority > PRIORITY_INTERACTIVE and background_slots <= 0:
+                continue
+            return job, job.queue.popleft()
+        return None
+
+    def _work(self):
+        while True:
+            with self._condition:
+                picked = self._next_task()
+                while picked is None:
+                    if self._shutdown:
+                        return
+                    self._idle += 1
+                    self._condition.wait()
+                    self._idle -= 1
+                    picked = self._next_task()
+                job, (future, fn, args, kwargs) = picked
+                job.running += 1
+                if job.priority > PRIORITY_INTERACTIVE:
+                    self._background_running += 1
+
+            if future.set_running_or_notify_cancel():
+                try:
+                    result = fn(*args, **kwargs)
+                except BaseException as e:
+                    future.set_exception(e)
+                else:
+                    future.set_result(result)
+            del future, fn, args, kwargs
+
+            with self._condition:
+                job.running -= 1
+                job.completed += 1
+                if job.priority > PRIORITY_INTERACTIVE:
+                    self._background_running -= 1
+                self._remove_if_done(job)
+                self._condition.notify_all()
+
+
+_shared_pool: Optional[WorkerPool] = None
+_shared_pool_lock = threading.Lock()
+
+
+def shared_worker_pool() -> WorkerPool:
+    """The worker pool of the application, created on first use."""
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None:
+            _shared_pool = WorkerPool()
+            logging.debug(f"Worker pool started, up to {_shared_pool.max_workers} threads")
+        return _shared_pool
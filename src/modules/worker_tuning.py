@@ -0,0 +1,298 @@
+# modules/worker_tuning.py
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Tuple
+import logging
+import math
+import os
+import threading
+import time
+
+
+AUTO_WORKERS = "auto"
+
+# Threads may overlap I/O, so the adaptive ceiling is allowed to exceed the CPU budget
+IO_OVERCOMMIT_FACTOR = 2
+MAX_WORKER_CEILING = 32
+
+_CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+def _read_first_line(path: str) -> Optional[str]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.readline().strip()
+    except OSError:
+        return None
+
+
+def _cgroup_v2_paths() -> List[str]:
+    """Candidate cpu.max files for the current process (own cgroup first, then the root)."""
+    paths = []
+    line = None
+    try:
+        with open("/proc/self/cgroup", "r", encoding="utf-8") as f:
+            for entry in f:
+                if entry.startswith("0::"):
+                    line = entry.strip()[3:]
+                    break
+    except OSError:
+        pass
+
+    if line:
+        relative = line.lstrip("/")
+        # Walk up the hierarchy, the nearest limited ancestor applies
+        while True:
+            paths.append(os.path.join(_CGROUP_ROOT, relative, "cpu.max"))
+            if not relative:
+                break
+            relative = os.path.dirname(relative)
+    paths.append(os.path.join(_CGROUP_ROOT, "cpu.max"))
+    return paths
+
+
+def read_cgroup_cpu_limit() -> Optional[float]:
+    """Read the CPU quota of the current cgroup as a number of CPUs.
+
+    Supports cgroup v2 (``cpu.max``) and v1 (``cpu.cfs_quota_us``/``cpu.cfs_period_us``).
+
+    Returns:
+        Number of CPUs allowed by the quota, or None if no quota is set or readable
+    """
+    for path in _cgroup_v2_paths():
+        content = _read_first_line(path)
+        if not content:
+            continue
+        parts = content.split()
+        if len(parts) == 2 and parts[0] != "max":
+            try:
+                quota, period = int(parts[0]), int(parts[1])
+                if quota > 0 and period > 0:
+                    return quota / period
+            except ValueError:
+                pass
+        return None
+
+    quota = _read_first_line(os.path.join(_CGROUP_ROOT, "cpu", "cpu.cfs_quota_us"))
+    period = _read_first_line(os.path.join(_CGROUP_ROOT, "cpu", "cpu.cfs_period_us"))
+    try:
+        if quota and period and int(quota) > 0 and int(period) > 0:
+            return int(quota) / int(period)
+    except ValueError:
+        pass
+    return None
+
+
+def process_cpu_count() -> int:
+    """CPUs usable by this process (affinity aware), falls back to os.cpu_count()."""
+    if hasattr(os, "process_cpu_count"):
+        count = os.process_cpu_count()
+    elif hasattr(os, "sched_getaffinity"):
+        count = len(os.sched_getaffinity(0))
+    else:
+        count = os.cpu_count()
+    return count or 1
+
+
+def detect_cpu_budget() -> int:
+    """Number of CPUs the process may actually use, respecting the cgroup quota."""
+    budget = process_cpu_count()
+    quota = read_cgroup_cpu_limit()
+    if quota is not None:
+        budget = min(budget, max(1, math.ceil(quota)))
+    return budget
+
+
+def resolve_max_threads(max_threads) -> Tuple[int, bool]:
+    """Resolve a max_threads setting into (worker_count, is_auto).
+
+    Args:
+        max_threads: Positive int, numeric string, "auto" or None (auto)
+
+    Returns:
+        Tuple of (initial worker count, whether adaptive tuning is enabled)
+    """
+    if max_threads is None or (isinstance(max_threads, str) and max_threads.strip().lower() == AUTO_WORKERS):
+        return detect_cpu_budget(), True
+    try:
+        value = int(max_threads)
+    except (TypeError, ValueError):
+        logging.warning(f"Invalid max_threads value {max_threads!r}, falling back to auto mode")
+        return detect_cpu_budget(), True
+    return max(1, min(value, MAX_WORKER_CEILING)), False
+
+
+@dataclass
+class ConcurrencyChange:
+    """A single concurrency adjustment made by the controller."""
+    timestamp: float
+    old_limit: int
+    new_limit: int
+    throughput: float
+    io_wait: float
+    reason: str
+
+
+class AdaptiveConcurrencyController:
+    """Hill-climbing concurrency limit driven by measured throughput and I/O wait.
+
+    Workers report per-file wall and thread CPU time through ``run_timed``. Every
+    ``interval`` seconds the controller compares the files/s of the last window with
+    the previous one and moves the limit up or down. A high I/O wait fraction lets it
+    grow up to the CPU budget without a throughput gain. Thread CPU time also leaves
+    out the time a worker waits for the GIL, so the I/O wait of CPU bound parsing
+    rises with the limit as well. Past the budget high I/O wait therefore only
+    probes one more worker: the step is kept if the next window's throughput
+    improved, otherwise the limit goes back and the next probe waits
+    ``PROBE_COOLDOWN_WINDOWS`` windows. Flat throughput without high I/O wait pulls
+    the limit back towards the budget.
+    """
+
+    HIGH_IO_WAIT = 0.5
+    SIGNIFICANT_CHANGE = 0.05
+    # Windows after a probe above the CPU budget that gained nothing before the next one
+    PROBE_COOLDOWN_WINDOWS = 5
+
+    def __init__(self,
+                 initial_limit: int,
+                 cpu_budget: int,
+                 enabled: bool = True,
+                 ceiling: Optional[int] = None,
+                 interval: float = 2.0,
+                 on_change: Optional[Callable[[ConcurrencyChange], None]] = None):
+        self.cpu_budget = max(1, cpu_budget)
+        self.enabled = enabled
+        self.ceiling = ceiling or min(self.cpu_budget * IO_OVERCOMMIT_FACTOR, MAX_WORKER_CEILING)
+        self.ceiling = max(self.ceiling, initial_limit)
+        self.limit = max(1, min(initial_limit, self.ceiling))
+        self.initial_limit = self.limit
+        self.peak_limit = self.limit
+        self.interval = interval
+        self.on_change = on_change
+        self.changes: List[ConcurrencyChange] = []
+
+        self._lock = threading.Lock()
+        self._window_start = time.perf_counter()
+        self._window_files = 0
+        self._window_wall = 0.0
+        self._window_cpu = 0.0
+        self._total_wall = 0.0
+        self._total_cpu = 0.0
+        self._last_throughput: Optional[float] = None
+        self._direction = 1
+        self._best: Tuple[float, int] = (0.0, self.limit)
+        # Limit a running probe above the CPU budget started from
+        self._probe_base: Optional[int] = None
+        self._probe_cooldown = 0
+
+    def run_timed(self, func: Callable, *args, **kwargs):
+        """Run a task in the calling worker thread and record its wall/CPU time."""
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = time.thread_time() - cpu_start
+            with self._lock:
+                self._window_wall += wall
+                self._window_cpu += min(cpu, wall)
+
+    def record_completed(self, count: int = 1):
+        """Record finished files; called from the coordinating thread."""
+        with self._lock:
+            self._window_files += count
+
+    @property
+    def io_wait_fraction(self) -> float:
+        """Share of worker wall time not spent on CPU over the whole run."""
+        with self._lock:
+            wall = self._total_wall + self._window_wall
+            cpu = self._total_cpu + self._window_cpu
+        return 1.0 - (cpu / wall) if wall > 0 else 0.0
+
+    @property
+    def recommended_limit(self) -> int:
+        """Limit with the best observed throughput, a good value to pin for later runs."""
+        return self._best[1]
+
+    def maybe_adjust(self) -> int:
+        """Evaluate the current window and adjust the limit if it is due.
+
+        Returns:
+            The (possibly updated) concurrency limit
+        """
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        if elapsed < self.interval:
+            return self.limit
+
+        with self._lock:
+            files = self._window_files
+            wall, cpu = self._window_wall, self._window_cpu
+            self._total_wall += wall
+            self._total_cpu += cpu
+            self._window_files = 0
+            self._window_wall = self._window_cpu = 0.0
+        self._window_start = now
+
+        if files == 0:
+            return self.limit
+
+        throughput = files / elapsed
+        io_wait = 1.0 - (cpu / wall) if wall > 0 else 0.0
+        if throughput > self._best[0]:
+            self._best = (throughput, self.limit)
+
+        if not self.enabled:
+            self._last_throughput = throughput
+            return self.limit
+
+        new_limit = self.limit
+        reason = ""
+        last = self._last_throughput
+        probe_base, self._probe_base = self._probe_base, None
+        self._probe_cooldown = max(0, self._probe_cooldown - 1)
+        can_probe = io_wait >= self.HIGH_IO_WAIT and self._probe_cooldown == 0 and self.limit < self.ceiling
+        if probe_base is not None:
+            if last is not None and throughput > last * (1 + self.SIGNIFICANT_CHANGE):
+                self._direction = 1
+                reason = "probe above CPU budget improved throughput"
+            else:
+                self._direction = -1
+                self._probe_cooldown = self.PROBE_COOLDOWN_WINDOWS
+                new_limit, reason = probe_base, "probe above CPU budget gained nothing"
+        elif last is None:
+            if io_wait >= self.HIGH_IO_WAIT and self.limit < self.cpu_budget:
+                new_limit, reason = self.limit + 1, "high I/O wait"
+            elif can_probe:
+                self._probe_base = self.limit
+                new_limit, reason = self.limit + 1, "high I/O wait, probing above CPU budget"
+        elif throughput > last * (1 + self.SIGNIFICANT_CHANGE):
+            new_limit, reason = self.limit + self._direction, "throughput improved"
+        elif throughput < last * (1 - self.SIGNIFICANT_CHANGE):
+            self._direction = -self._direction
+            new_limit, reason = self.limit + self._direction, "throughput dropped"
+        elif io_wait >= self.HIGH_IO_WAIT and self.limit < self.cpu_budget:
+            self._direction = 1
+            new_limit, reason = self.limit + 1, "throughput flat, high I/O wait"
+        elif can_probe and self.limit >= self.cpu_budget:
+            self._probe_base = self.limit
+            new_limit, reason = self.limit + 1, "throughput flat, high I/O wait, probing above CPU budget"
+        elif self.limit > self.cpu_budget and io_wait < self.HIGH_IO_WAIT:
+            self._direction = -1
+            new_limit, reason = self.limit - 1, "throughput flat above CPU budget"
+
+        self._last_throughput = throughput
+        new_limit = max(1, min(new_limit, self.ceiling))
+        if new_limit != self.limit:
+            change = ConcurrencyChange(time.time(), self.limit, new_limit, throughput, io_wait, reason)
+            self.changes.append(change)
+            logging.info(
+                f"Worker concurrency {change.old_limit} -> {change.new_limit} "
+                f"({reason}; {throughput:.1f} files/s, I/O wait {io_wait:.0%})"
+            )
+            self.limit = new_limit
+            self.peak_limit = max(self.peak_limit, new_limit)
+            if self.on_change:
+                self.on_change(change)
+        return self.limit
@@ -0,0 +1,163 @@
+# modules/xlsx_export.py
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional
+
+import xlsxwriter
+
+
+XLSX_SUFFIX = ".xlsx"
+# Rows of an Excel worksheet including the header row, further rows go to the next sheet
+EXCEL_MAX_ROWS = 1_048_576
+# Characters Excel keeps of a cell, longer values are cut off
+EXCEL_MAX_CELL_CHARS = 32_767
+EXCEL_MAX_SHEET_NAME = 31
+
+# Column widths in characters, fitted to the longest value of the column
+MIN_COLUMN_WIDTH = 10
+MAX_COLUMN_WIDTH = 60
+
+# Look of "Table Style Medium 16", which xlsxwriter can't add to a sheet written in constant_memory mode
+HEADER_FORMAT = {"bold": True, "font_color": "#FFFFFF", "bg_color": "#4472C4", "border": 1, "border_color": "#4472C4"}
+BAND_FORMAT = {"bg_color": "#D9E1F2"}
+
+
+@dataclass
+class XlsxStats:
+    """Output of a streamed XLSX export."""
+    rows_written: int = 0
+    sheets: int = 0
+    # Values longer than Excel allows in a cell, written cut off
+    truncated_cells: int = 0
+
+
+def is_xlsx_output(path: str | Path) -> bool:
+    """True if the export writes a workbook instead of a CSV file."""
+    return Path(path).suffix.lower() == XLSX_SUFFIX
+
+
+def sheet_base_name(path: str | Path) -> str:
+    """Sheet name from the output file name, Excel sheet names must be <= 31 chars and avoid reserved characters."""
+    invalid_chars = set('[]:*?/\\')
+    sanitized_name = "".join("_" if char in invalid_chars else char for char in Path(path).stem).strip()
+    # Single quotes can't start or end a sheet name
+    return (sanitized_name.strip("'") or "Result")[:EXCEL_MAX_SHEET_NAME]
+
+
+class StreamingXlsxWriter:
+    """Row writer of an XLSX workbook that keeps only the current row in memory.
+
+    The workbook is written in xlsxwriter's constant_memory mode: every row goes
+    to the sheet's temporary file as soon as the next row starts. When a sheet
+    reaches Excel's row limit the writer continues on a new sheet ("Name (2)",
+    ...) with the headers repeated. Each sheet gets a formatted, frozen header
+    row, an autofilter, banded rows and column widths fitted to the values
+    written, none of which needs the rows once they are written.
+
+    Takes the place of a csv.writer, so ExpandedRows.write() works unchanged.
+    """
+
+    def __init__(self, path: str | Path, headers: List[str], max_rows_per_sheet: int = EXCEL_MAX_ROWS):
+        self.path = Path(path)
+        self.headers = list(headers)
+        self.max_rows_per_sheet = max(2, min(max_rows_per_sheet, EXCEL_MAX_ROWS))
+        self.stats = XlsxStats()
+        self._base_name = sheet_base_name(self.path)
+        self._workbook = xlsxwriter.Workbook(str(self.path), {
+            "constant_memory": True,
+            # Sheet XML of a million rows can pass the 4 GB of a plain zip entry
+            "use_zip64": True,
+            # Values are written as text, exactly as the CSV export writes them
+            "strings_to_numbers": False,
+            "strings_to_formulas": False,
+            "strings_to_urls": False,
+        })
+        self._header_format = self._workbook.add_format(HEADER_FORMAT)
+        self._band_format = self._workbook.add_format(BAND_FORMAT)
+        self._sheet = None
+        self._row = 0
+        self._widths: List[int] = []
+        self._closed = False
+
+    def __enter__(self) -> "StreamingXlsxWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def writerow(self, row: Iterable[Any]):
+        if self._sheet is None or self._row >= self.max_rows_per_sheet:
+            self._next_sheet()
+        sheet, row_index, widths = self._sheet, self._row, self._widths
+        for col, value in enumerate(row):
+            if not isinstance(value, str):
+                value = "" if value is None else str(value)
+            if not value:
+                continue
+            length = len(value)
+            if length > EXCEL_MAX_CELL_CHARS:
+                self.stats.truncated_cells += 1
+            sheet.write_string(row_index, col, value)
+            if col < len(widths) and length > widths[col]:
+                widths[col] = length
+        self._row += 1
+        self.stats.rows_written += 1
+
+    def writerows(self, rows: Iterable[Iterable[Any]]):
+        for row in rows:
+            self.writerow(row)
+
+    def close(self):
+        """Finish the last sheet and write the workbook, a workbook without rows gets its header sheet."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._sheet is None:
+            self._next_sheet()
+        self._finish_sheet()
+        self._workbook.close()
+
+    def _next_sheet(self):
+        if self._sheet is not None:
+            self._finish_sheet()
+        self.stats.sheets += 1
+        if self.stats.sheets == 1:
+            name = self._base_name
+        else:
+            suffix = f" ({self.stats.sheets})"
+            name = self._base_name[:EXCEL_MAX_SHEET_NAME - len(suffix)] + suffix
+        self._sheet = self._workbook.add_worksheet(name)
+        self._sheet.write_row(0, 0, self.headers, self._header_format)
+        self._sheet.freeze_panes(1, 0)
+        self._row = 1
+        self._widths = [len(header) for header in self.headers]
+
+    def _finish_sheet(self):
+        """Formatting of the current sheet, xlsxwriter stores it apart from the streamed rows."""
+        sheet, last_row, last_col = self._sheet, self._row - 1, len(self.headers) - 1
+        if last_col < 0:
+            return
+        for col, width in enumerate(self._widths):
+            sheet.set_column(col, col, min(max(width + 2, MIN_COLUMN_WIDTH), MAX_COLUMN_WIDTH))
+        sheet.autofilter(0, 0, last_row, last_col)
+        if last_row > 0:
+            sheet.conditional_format(1, 0, last_row, last_col, {
+                "type": "formula", "criteria": "=MOD(ROW(),2)=0", "format": self._band_format})
+
+
+class XlsxDictWriter:
+    """csv.DictWriter counterpart for a StreamingXlsxWriter, missing columns are left empty."""
+
+    def __init__(self, writer: StreamingXlsxWriter, fieldnames: Optional[List[str]] = None):
+        self.writer = writer
+        self.fieldnames = list(fieldnames) if fieldnames is not None else writer.headers
+
+    def writeheader(self):
+        """The workbook writes the headers at the top of every sheet itself."""
+
+    def writerow(self, row: Dict[str, Any]):
+        self.writer.writerow([row.get(field, "") for field in self.fieldnames])
+
+    def writerows(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.writerow(row)
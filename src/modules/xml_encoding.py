@@ -0,0 +1,147 @@
+# modules/xml_encoding.py
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+import codecs
+import re
+import threading
+
+
+# Bytes searched for the XML declaration
+DECLARATION_BYTES = 1024
+# Bytes decoded at once when checking a file is valid UTF-8
+VALIDATE_CHUNK_BYTES = 1024 * 1024
+
+# Where the encoding of a file came from
+SOURCE_BOM = "bom"
+SOURCE_DECLARATION = "declaration"
+SOURCE_HEURISTIC = "heuristic"
+SOURCE_ASCII = "ascii"
+
+UTF8 = "utf-8"
+WINDOWS_1252 = "windows-1252"
+ISO_8859_1 = "iso-8859-1"
+
+# libxml2 detects these itself from the byte order mark
+_BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, UTF8),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+# Encodings the heuristic can tell apart, all others are taken as declared
+_GUESSABLE = {"ascii", UTF8, WINDOWS_1252, ISO_8859_1}
+_DECLARATION = re.compile(rb"""^\s*<\?xml[^>]*?encoding\s*=\s*["']([A-Za-z0-9._:-]+)["']""")
+# C1 controls, text that has them is Windows-1252 (HTML5 treats ISO-8859-1 labels the same way)
+_C1_CONTROLS = re.compile(rb"[\x80-\x9f]")
+# Bytes Windows-1252 leaves undefined
+_CP1252_UNDEFINED = re.compile(rb"[\x81\x8d\x8f\x90\x9d]")
+
+
+def normalize_encoding(name: Optional[str]) -> Optional[str]:
+    """Canonical name of an encoding label, e.g. "latin1" -> "iso-8859-1", None if unknown."""
+    if not name:
+        return None
+    try:
+        python_name = codecs.lookup(name).name
+    except LookupError:
+        return None
+    return {"utf-8": UTF8, "cp1252": WINDOWS_1252, "latin-1": ISO_8859_1, "iso8859-1": ISO_8859_1}.get(
+        python_name, python_name)
+
+
+@dataclass
+class EncodingGuess:
+    """Detected encoding of a file."""
+    encoding: str
+    source: str
+    declared: Optional[str] = None
+
+    @property
+    def parser_encoding(self) -> Optional[str]:
+        """Encoding to force on the parser, None where the parser reads it correctly itself."""
+        return self.encoding if self.source == SOURCE_HEURISTIC else None
+
+    @property
+    def corrected(self) -> bool:
+        """True if the content contradicts the declaration (or the UTF-8 default)."""
+        return self.source == SOURCE_HEURISTIC
+
+
+def declared_encoding(head: bytes) -> Optional[str]:
+    """Normalized encoding of the XML declaration at the start of ``head``."""
+    match = _DECLARATION.match(head[:DECLARATION_BYTES])
+    return normalize_encoding(match.group(1).decode("ascii")) if match else None
+
+
+def is_utf8(data: bytes, complete: bool = True) -> bool:
+    """True if ``data`` is valid UTF-8, decoded in chunks to avoid a full size string.
+
+    Args:
+        complete: False if ``data`` is only the start of a file (may end inside a character)
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    view = memoryview(data)
+    try:
+        for start in range(0, len(view), VALIDATE_CHUNK_BYTES):
+            decoder.decode(view[start:start + VALIDATE_CHUNK_BYTES])
+        decoder.decode(b"", final=complete)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def detect_encoding(data: bytes, complete: bool = True) -> EncodingGuess:
+    """Encoding of an XML file from its bytes: byte order mark, declaration, then content.
+
+    Files without a BOM that declare (or default to) UTF-8, ISO-8859-1 or Windows-1252
+    are checked against their content: valid UTF-8 is UTF-8, text with C1 control bytes
+    is Windows-1252, anything else that isn't UTF-8 is Windows-1252 or ISO-8859-1.
+    ASCII-only files read the same in all of these and are never corrected.
+
+    Args:
+        data: Content of the file
+        complete: False if ``data`` is only the start of the file
+    """
+    for bom, encoding in _BOMS:
+        if data.startswith(bom):
+            return EncodingGuess(encoding, SOURCE_BOM)
+    if data[:4] in (b"<\0?\0", b"\0<\0?"):
+        # UTF-16 without a byte order mark, recognized by the parser from "<?"
+        return EncodingGuess("utf-16", SOURCE_DECLARATION)
+
+    declared = declared_encoding(data)
+    expected = declared or UTF8
+    if data.isascii():
+        return EncodingGuess(expected, SOURCE_ASCII, declared)
+    if expected not in _GUESSABLE:
+        return EncodingGuess(expected, SOURCE_DECLARATION, declared)
+
+    if is_utf8(data, complete):
+        encoding = UTF8
+    elif expected == ISO_8859_1 and not _C1_CONTROLS.search(data):
+        encoding = ISO_8859_1
+    else:
+        encoding = ISO_8859_1 if _CP1252_UNDEFINED.search(data) else WINDOWS_1252
+    return EncodingGuess(encoding, SOURCE_DECLARATION if encoding == expected else SOURCE_HEURISTIC, declared)
+
+
+@dataclass
+class EncodingStats:
+    """Encodings seen during a run and how much the parser had to recover."""
+    files_by_encoding: Dict[str, int] = field(default_factory=dict)
+    # Files whose content contradicted the declared (or default) encoding
+    corrected_files: int = 0
+    # Files the parser only read in recover mode, and their errors
+    recovered_files: int = 0
+    recovered_errors: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, guess: EncodingGuess, recovered_errors: int = 0):
+        with self._lock:
+            label = "ascii" if guess.source == SOURCE_ASCII else guess.encoding
+            self.files_by_encoding[label] = self.files_by_encoding.get(label, 0) + 1
+            self.corrected_files += guess.corrected
+            if recovered_errors:
+                self.recovered_files += 1
+                self.recovered_errors += recovered_errors
@@ -0,0 +1,131 @@
+# modules/xml_namespaces.py
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+import json
+import logging
+
+from lxml import etree as ET
+
+
+# Prefix used for default (unprefixed) namespaces, XPath 1.0 has no default namespace
+DEFAULT_NAMESPACE_PREFIX = "ns"
+NAMESPACE_SAMPLE_FILES = 20
+NAMESPACE_SAMPLE_ELEMENTS = 1000
+
+
+def add_namespace(namespace_map: Dict[str, str], prefix: Optional[str], uri: str) -> str:
+    """Add a URI to the map under a free prefix, reusing an existing prefix for the same URI.
+
+    Returns:
+        The prefix the URI is mapped to
+    """
+    for existing_prefix, existing_uri in namespace_map.items():
+        if existing_uri == uri:
+            return existing_prefix
+
+    base = prefix or DEFAULT_NAMESPACE_PREFIX
+    candidate = base
+    index = 1
+    while candidate in namespace_map:
+        candidate = f"{base}{index}"
+        index += 1
+    namespace_map[candidate] = uri
+    return candidate
+
+
+def detect_namespace_map(file_paths: Iterable[str | Path],
+                         base_map: Optional[Dict[str, str]] = None,
+                         max_elements: int = NAMESPACE_SAMPLE_ELEMENTS) -> Dict[str, str]:
+    """Build a prefix map from the namespace declarations of sample files.
+
+    Only the first ``max_elements`` elements of each file are scanned, namespace
+    declarations normally sit on the root element.
+
+    Args:
+        file_paths: Sample of XML files
+        base_map: Existing prefix map, its prefixes are kept
+        max_elements: Elements to scan per file
+
+    Returns:
+        Prefix to namespace URI map usable as ``namespaces=`` for XPath
+    """
+    namespace_map = dict(base_map or {})
+    for path in file_paths:
+        count = 0
+        try:
+            for event, item in ET.iterparse(str(path), events=("start-ns", "start"), recover=True, huge_tree=True):
+                if event == "start-ns":
+                    prefix, uri = item
+                    add_namespace(namespace_map, prefix, uri)
+                else:
+                    count += 1
+                    if count >= max_elements:
+                        break
+        except (ET.XMLSyntaxError, OSError) as e:
+            logging.warning(f"Namespace detection skipped {path}: {e}")
+    return namespace_map
+
+
+def detect_folder_namespace_map(folder: str | Path,
+                                base_map: Optional[Dict[str, str]] = None,
+                                sample_size: int = NAMESPACE_SAMPLE_FILES) -> Dict[str, str]:
+    """Detect the prefix map from the first ``sample_size`` XML files of a folder."""
+    sample = []
+    for path in Path(folder).glob("*.xml"):
+        if path.is_file():
+            sample.append(path)
+            if len(sample) >= sample_size:
+                break
+    return detect_namespace_map(sample, base_map)
+
+
+def qualified_name(name: str, namespace_map: Dict[str, str]) -> str:
+    """Convert a Clark name ``{uri}local`` to ``prefix:local`` using the prefix map.
+
+    Names without a namespace, or with a URI missing from the map, are returned unchanged.
+    """
+    if not name.startswith("{"):
+        return name
+    uri, _, local = name[1:].partition("}")
+    for prefix, mapped_uri in namespace_map.items():
+        if mapped_uri == uri:
+            return f"{prefix}:{local}"
+    return name
+
+
+def format_namespace_map(namespace_map: Dict[str, str]) -> str:
+    """Editable text form of a prefix map, one ``prefix=uri`` per line."""
+    return "\n".join(f"{prefix}={uri}" for prefix, uri in sorted(namespace_map.items()))
+
+
+def parse_namespace_map(text: str) -> Dict[str, str]:
+    """Parse the text form produced by format_namespace_map.
+
+    Raises:
+        ValueError: If a line is not ``prefix=uri`` or the prefix is not a valid NCName
+    """
+    namespace_map = {}
+    for line_number, line in enumerate(text.splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        prefix, separator, uri = line.partition("=")
+        prefix, uri = prefix.strip(), uri.strip()
+        if not separator or not prefix or not uri:
+            raise ValueError(f"Line {line_number}: expected 'prefix=uri', got '{line}'")
+        if ":" in prefix or not (prefix[0].isalpha() or prefix[0] == "_"):
+            raise ValueError(f"Line {line_number}: '{prefix}' is not a valid namespace prefix")
+        namespace_map[prefix] = uri
+    return namespace_map
+
+
+def dumps_namespace_map(namespace_map: Dict[str, str]) -> str:
+    return json.dumps(namespace_map, sort_keys=True)
+
+
+def loads_namespace_map(value: Optional[str]) -> Dict[str, str]:
+    try:
+        data = json.loads(value) if value else {}
+    except (TypeError, json.JSONDecodeError):
+        return {}
+    return {str(k): str(v) for k, v in data.items()} if isinstance(data, dict) else {}
@@ -6,6 +6,14 @@ from lxml import etree as ET
 from lxml.etree import _Comment, _ProcessingInstruction
 import re
 
+from modules.file_prefetch import read_file_bytes
+from modules.xml_encoding import detect_encoding
+from modules.xml_namespaces import add_namespace, qualified_name
+
+
+# Start of a file the encoding is detected from when only the encoding is needed
+ENCODING_DETECT_BYTES = 64 * 1024
+
 
 class XMLParserSignals(QObject):
     """Signals class for XMLParserThread operations."""
@@ -39,7 +47,7 @@ class XMLUtils:
 
     @staticmethod
     def get_xml_encoding(file_path: str) -> str:
-        """Extract encoding from XML file declaration.
+        """Detect the encoding of an XML file from its start (BOM, declaration and content).
 
         Args:
             file_path: Path to XML file
@@ -49,13 +57,7 @@ class XMLUtils:
         """
         try:
             with open(file_path, 'rb') as f:
-                first_line = f.readline().decode('utf-8', errors='ignore')
-                if 'encoding=' in first_line:
-                    start = first_line.find('encoding=') + 10
-                    end = first_line.find('"', start)
-                    if end == -1:
-                        end = first_line.find("'", start)
-                    return first_line[start:end] if end != -1 else 'utf-8'
+                return detect_encoding(f.read(ENCODING_DETECT_BYTES), complete=False).encoding
         except Exception:
             pass
         return 'utf-8'
@@ -341,11 +343,22 @@ class XMLParserThread(QRunnable):
     def _parse_xml(self):
         """Parse XML file and extract comprehensive information."""
         try:
-            tree = ET.parse(self.xml_file_path)
-            root = tree.getroot()
+            # One read: the encoding is detected from the same bytes the parser gets
+            data = read_file_bytes(self.xml_file_path)
+            guess = detect_encoding(data)
+            root = ET.fromstring(data, ET.XMLParser(encoding=guess.parser_encoding), base_url=self.xml_file_path)
 
             xml_string = ET.tostring(root, encoding="unicode", pretty_print=True)
 
+            # Job prefix map extended with this document's namespaces, tags and attributes
+            # are reported as prefix:local so built XPaths work with the prefix map
+            namespace_map = dict(self.namespace_map or {})
+            for elem in root.iter():
+                if isinstance(elem, (_Comment, _ProcessingInstruction)):
+                    continue
+                for prefix, uri in elem.nsmap.items():
+                    add_namespace(namespace_map, prefix, uri)
+
             # Structures for comprehensive and contextual XML info
             tags = set()
             tag_values = set()
@@ -361,12 +374,12 @@ class XMLParserThread(QRunnable):
                 if isinstance(elem, (_Comment, _ProcessingInstruction)): # Added safeguard for comments
                     continue # Skip comment line
                 else:
-                    tag = elem.tag
+                    tag = qualified_name(elem.tag, namespace_map)
                     tags.add(tag)
 
                 # Namespace extraction
-                if '}' in tag:
-                    namespace = tag.split('}')[0][1:]
+                if '}' in elem.tag:
+                    namespace = elem.tag.split('}')[0][1:]
                     namespaces.add(namespace)
 
                 # Text content mapping
@@ -377,6 +390,7 @@ class XMLParserThread(QRunnable):
 
                 # Attributes
                 for attr, val in elem.attrib.items():
+                    attr = qualified_name(attr, namespace_map)
                     attributes.add(attr)
                     attribute_values.add(val)
                     tag_to_attributes.setdefault(tag, set()).add(attr)
@@ -394,10 +408,11 @@ class XMLParserThread(QRunnable):
                 'attributes': sorted(attributes),
                 'attribute_values': sorted(attribute_values),
                 'namespaces': sorted(namespaces),
+                'namespace_map': namespace_map,
                 'file_path': self.xml_file_path,
-                'root_tag': root.tag,
+                'root_tag': qualified_name(root.tag, namespace_map),
                 'element_count': len(list(root.iter())),
-                'encoding': XMLUtils.get_xml_encoding(self.xml_file_path),
+                'encoding': guess.encoding,
                 'tag_to_values': tag_to_values,
                 'tag_to_attributes': tag_to_attributes,
                 'tag_attr_to_values': tag_attr_to_values,
@@ -489,9 +504,14 @@ class XMLParserThread(QRunnable):
 
 
 # Convenience functions for creating threaded operations
-def create_xml_parser(xml_file_path: str) -> XMLParserThread:
-    """Create a parser thread for basic XML parsing."""
-    return XMLParserThread(operation='parse', xml_file_path=xml_file_path)
+def create_xml_parser(xml_file_path: str, namespace_map: dict | None = None) -> XMLParserThread:
+    """Create a parser thread for basic XML parsing.
+
+    Args:
+        xml_file_path: XML file to parse
+        namespace_map: Job prefix map, namespaces of the file missing from it get new prefixes
+    """
+    return XMLParserThread(operation='parse', xml_file_path=xml_file_path, namespace_map=namespace_map)
 
 
 def create_structure_analyzer(xml_file_path: str) -> XMLParserThread:
@@ -0,0 +1,315 @@
+# modules/xpath_analysis.py
+from typing import Any, List, Optional, Tuple
+import re
+
+
+# What a column of an XPath holds
+COLUMN_STRINGS = "strings"  # string values of the selected text and attribute nodes, one per row
+COLUMN_COUNT = "count"      # number of selected elements (or other nodes), a "<header> Match Count" column
+COLUMN_SCALAR = "scalar"    # the single string, number or boolean of string(), count(), ... per file
+COLUMN_KINDS = (COLUMN_STRINGS, COLUMN_COUNT, COLUMN_SCALAR)
+
+# Sample files evaluated to confirm the analysis and settle XPaths it can't classify
+COLUMN_SAMPLE_FILES = 5
+COLUMN_SAMPLE_MAX_BYTES = 16 * 1024 * 1024
+
+# Node kinds of node-set results
+_STRING_NODES = "string nodes"  # text and attribute nodes, lxml returns their values as str
+_OTHER_NODES = "other nodes"    # elements, the root, comments and processing instructions
+_ANY_NODES = "any nodes"        # node(), self::node() and namespace nodes: known only at run time
+_MIXED_NODES = "mixed nodes"
+_SCALAR = "scalar"
+
+_STRING_FUNCTIONS = {
+    "string", "concat", "substring", "substring-before", "substring-after", "normalize-space",
+    "translate", "local-name", "name", "namespace-uri",
+}
+_NUMBER_FUNCTIONS = {
+    "count", "sum", "number", "string-length", "position", "last", "floor", "ceiling", "round",
+}
+_BOOLEAN_FUNCTIONS = {"boolean", "not", "true", "false", "contains", "starts-with", "lang"}
+_NODE_TYPES = {"comment", "text", "processing-instruction", "node"}
+_OPERATOR_NAMES = {"and", "or", "mod", "div"}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<literal>"[^"]*"|'[^']*')
+      | (?P<number>\d+(?:\.\d*)?|\.\d+)
+      | (?P<punct>\.\.|::|//|!=|<=|>=|[()\[\]@,/|+\-=<>*.])
+      | (?P<variable>\$[\w.\-]+(?::[\w.\-]+)?)
+      | (?P<name>[^\W\d][\w.\-]*(?::(?:[^\W\d][\w.\-]*|\*))?|[^\W\d][\w.\-]*:\*)
+    )""", re.VERBOSE)
+
+
+class _Unknown(Exception):
+    """The expression can't be classified statically."""
+
+
+def _tokenize(xpath: str) -> List[Tuple[str, str]]:
+    """(type, text) tokens, with the disambiguation rules of XPath 1.0 section 3.7."""
+    tokens: List[Tuple[str, str]] = []
+    position = 0
+    xpath = xpath.rstrip()
+    while position < len(xpath):
+        match = _TOKEN.match(xpath, position)
+        if match is None or match.end() == position:
+            raise _Unknown(f"Unexpected character at {position}")
+        position = match.end()
+        kind = match.lastgroup
+        text = match.group(kind)
+        # After a token that ends an operand, * and operator names are operators
+        previous = tokens[-1] if tokens else None
+        operand_ended = previous is not None and not (
+            previous[0] == "operator" or previous[1] in ("@", "::", "(", "[", ",", "/", "//", "|",
+                                                        "+", "-", "=", "!=", "<", "<=", ">", ">="))
+        if kind == "punct" and text == "*" and operand_ended:
+            kind = "operator"
+        elif kind == "name" and operand_ended and text in _OPERATOR_NAMES:
+            kind = "operator"
+        tokens.append((kind, text))
+    return tokens
+
+
+class _Analyser:
+    """Recursive descent over the XPath 1.0 grammar, computing only the type of each expression."""
+
+    def __init__(self, tokens: List[Tuple[str, str]]):
+        self.tokens = tokens
+        self.index = 0
+
+    def peek(self, offset: int = 0) -> Tuple[Optional[str], Optional[str]]:
+        index = self.index + offset
+        return self.tokens[index] if index < len(self.tokens) else (None, None)
+
+    def take(self, text: Optional[str] = None) -> Tuple[str, str]:
+        token = self.peek()
+        if token[0] is None or (text is not None and token[1] != text):
+            raise _Unknown(f"Expected {text!r}")
+        self.index += 1
+        return token
+
+    def at(self, *texts: str) -> bool:
+        kind, text = self.peek()
+        return kind in ("punct", "operator") and text in texts
+
+    def at_operator(self, *names: str) -> bool:
+        kind, text = self.peek()
+        return kind == "operator" and text in names
+
+    def analyse(self) -> str:
+        result = self.expr()
+        if self.index != len(self.tokens):
+            raise _Unknown("Trailing tokens")
+        return result
+
+    def expr(self) -> str:
+        return self._binary(self._and_expr, ("or",))
+
+    def _and_expr(self) -> str:
+        return self._binary(self._equality_expr, ("and",))
+
+    def _equality_expr(self) -> str:
+        return self._binary(self._relational_expr, ("=", "!="))
+
+    def _relational_expr(self) -> str:
+        return self._binary(self._additive_expr, ("<", "<=", ">", ">="))
+
+    def _additive_expr(self) -> str:
+        return self._binary(self._multiplicative_expr, ("+", "-"))
+
+    def _multiplicative_expr(self) -> str:
+        return self._binary(self._unary_expr, ("*", "div", "mod"))
+
+    def _binary(self, operand, operators: Tuple[str, ...]) -> str:
+        result = operand()
+        while self.at(*operators) or self.at_operator(*operators):
+            self.take()
+            operand()
+            result = _SCALAR
+        return result
+
+    def _unary_expr(self) -> str:
+        if self.at("-"):
+            self.take()
+            self._unary_expr()
+            return _SCALAR
+        return self._union_expr()
+
+    def _union_expr(self) -> str:
+        result = self._path_expr()
+        while self.at("|"):
+            self.take()
+            branch = self._path_expr()
+            if _SCALAR in (result, branch):
+                raise _Unknown("Union of a value")
+            result = result if result == branch else _MIXED_NODES
+        return result
+
+    def _path_expr(self) -> str:
+        kind, text = self.peek()
+        starts_filter = (
+            kind in ("literal", "number", "variable")
+            or (kind == "punct" and text == "(")
+            or (kind == "name" and self.peek(1)[1] == "(" and text not in _NODE_TYPES)
+        )
+        if not starts_filter:
+            return self._location_path()
+        result = self._primary_expr()
+        while self.at("["):
+            self._predicate()
+        if self.at("/", "//"):
+            if result == _SCALAR:
+                raise _Unknown("Path from a value")
+            return self._relative_location_path(result)
+        return result
+
+    def _primary_expr(self) -> str:
+        kind, text = self.take()
+        if kind in ("literal", "number"):
+            return _SCALAR
+        if kind == "variable":
+            raise _Unknown("Variable")
+        if text == "(":
+            result = self.expr()
+            self.take(")")
+            return result
+        # Function call
+        self.take("(")
+        if not self.at(")"):
+            self.expr()
+            while self.at(","):
+                self.take()
+                self.expr()
+        self.take(")")
+        if text in _STRING_FUNCTIONS or text in _NUMBER_FUNCTIONS or text in _BOOLEAN_FUNCTIONS:
+            return _SCALAR
+        if text == "id":
+            return _OTHER_NODES
+        raise _Unknown(f"Function {text}")
+
+    def _predicate(self):
+        self.take("[")
+        self.expr()
+        self.take("]")
+
+    def _location_path(self) -> str:
+        if self.at("/"):
+            self.take()
+            kind, text = self.peek()
+            if kind is None or not (kind == "name" or text in (".", "..", "@", "*")):
+                # The root node alone
+                return _OTHER_NODES
+            return self._relative_location_path(_OTHER_NODES, first_step=True)
+        if self.at("//"):
+            self.take()
+            return self._relative_location_path(_ANY_NODES, first_step=True)
+        # Relative paths start at the root element
+        return self._relative_location_path(_OTHER_NODES, first_step=True)
+
+    def _relative_location_path(self, context: str, first_step: bool = False) -> str:
+        if not first_step:
+            self.take()
+        result = self._step(context)
+        while self.at("/", "//"):
+            self.take()
+            result = self._step(result)
+        return result
+
+    def _step(self, context: str) -> str:
+        if self.at("."):
+            self.take()
+            return context
+        if self.at(".."):
+            self.take()
+            return _OTHER_NODES
+        axis = "child"
+        if self.at("@"):
+            self.take()
+            axis = "attribute"
+        elif self.peek()[0] == "name" and self.peek(1)[1] == "::":
+            axis = self.take()[1]
+            self.take("::")
+
+        kind, text = self.take()
+        node_type = None
+        if kind == "name" and text in _NODE_TYPES and self.at("("):
+            node_type = text
+            self.take("(")
+            if node_type == "processing-instruction" and self.peek()[0] == "literal":
+                self.take()
+            self.take(")")
+        elif not (kind == "name" or (kind == "punct" and text == "*")):
+            raise _Unknown(f"Unexpected {text!r} in a step")
+        while self.at("["):
+            self._predicate()
+
+        if axis == "namespace":
+            return _ANY_NODES
+        if axis == "attribute":
+            return _STRING_NODES
+        if axis in ("self", "ancestor-or-self", "descendant-or-self") and node_type == "node":
+            # Keeps the context node itself, e.g. text()/self::node()
+            return context if axis == "self" else _ANY_NODES
+        if node_type == "text":
+            return _STRING_NODES
+        if node_type == "node":
+            return _OTHER_NODES if axis in ("parent", "ancestor") else _ANY_NODES
+        return _OTHER_NODES
+
+
+def analyze_xpath(xpath: str) -> Optional[str]:
+    """Column kind of an XPath from its parsed expression, without evaluating it.
+
+    Location paths ending in text() or an attribute step are value columns, other
+    node-sets are counted, and expressions whose result is a string, number or
+    boolean (string(), count(), normalize-space(), comparisons, ...) fill a single
+    value per file. Unions of text and attribute paths are value columns as well.
+
+    Returns:
+        COLUMN_STRINGS, COLUMN_COUNT or COLUMN_SCALAR, None if only evaluating the XPath
+        can tell (node(), variables, extension functions, mixed unions, invalid syntax)
+    """
+    try:
+        result = _Analyser(_tokenize(xpath)).analyse()
+    except (_Unknown, IndexError):
+        return None
+    return {
+        _STRING_NODES: COLUMN_STRINGS,
+        _OTHER_NODES: COLUMN_COUNT,
+        _SCALAR: COLUMN_SCALAR,
+    }.get(result)
+
+
+def result_kind(result: Any) -> Optional[str]:
+    """Column kind of an evaluated XPath result, None for an empty node-set.
+
+    Results are expected from XPaths compiled with smart_strings=False.
+    """
+    if isinstance(result, list):
+        if not result:
+            return None
+        if all(isinstance(item, str) for item in result):
+            return COLUMN_STRINGS
+        if any(isinstance(item, str) for item in result):
+            # Text mixed with elements, their values are taken as text
+            return COLUMN_STRINGS
+        return COLUMN_COUNT
+    return COLUMN_SCALAR
+
+
+def column_name(header: str, kind: str) -> str:
+    """CSV column of an XPath: its header for values, "<header> Match Count" for counts."""
+    return f"{header} Match Count" if kind == COLUMN_COUNT else header
+
+
+def format_scalar(value: Any) -> str:
+    """A string, number or boolean XPath result the way XPath's string() converts it."""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if isinstance(value, float):
+        if value != value:
+            return "NaN"
+        if value in (float("inf"), float("-inf")):
+            return "Infinity" if value > 0 else "-Infinity"
+        return str(int(value)) if value.is_integer() else repr(value)
+    return str(value).strip()
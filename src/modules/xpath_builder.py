@@ -4,6 +4,8 @@ from PySide6.QtWidgets import QComboBox, QRadioButton  # Assuming these are the
 from lxml import etree as ET
 from typing import Optional, Dict, List, Tuple
 
+from modules.xml_namespaces import qualified_name
+
 
 class XPathBuilderSignals(QObject):
     """Signals class for XPathBuilder operations."""
@@ -15,10 +17,12 @@ class XPathBuilderSignals(QObject):
 class XPathValidator(QRunnable):
     """Thread worker for validating XPath expressions."""
 
-    def __init__(self, xpath_expression: Optional[str] = None, xml_file_path: Optional[str] = None):
+    def __init__(self, xpath_expression: Optional[str] = None, xml_file_path: Optional[str] = None,
+                 namespace_map: Optional[Dict[str, str]] = None):
         super().__init__()
         self.xpath_expression = xpath_expression
         self.xml_file_path = xml_file_path
+        self.namespace_map = namespace_map or {}
         self.signals = XPathBuilderSignals()
         self.setAutoDelete(True)
 
@@ -33,8 +37,8 @@ class XPathValidator(QRunnable):
         Returns: True if valid, False otherwise.
         """
         try:
-            # First, validate syntax
-            ET.XPath(self.xpath_expression)
+            # First, validate syntax, prefixed names need the job prefix map
+            ET.XPath(self.xpath_expression, namespaces=self.namespace_map)
 
             # If an XML file provided, test the expression
             if self.xml_file_path:
@@ -43,7 +47,7 @@ class XPathValidator(QRunnable):
                 root = tree.getroot()
 
                 # Execute XPath query
-                results = root.xpath(self.xpath_expression)
+                results = root.xpath(self.xpath_expression, namespaces=self.namespace_map)
                 result_count = len(results) if isinstance(results, list) else 1
 
                 self.signals.program_output_progress.emit(f"XPath is valid and returned {result_count} result(s)")
@@ -84,10 +88,13 @@ class XPathBuilder(QObject):
                 radio_contains: QRadioButton,
                 radio_starts_with: QRadioButton,
                 radio_greater: QRadioButton,
-                radio_smaller: QRadioButton):
+                radio_smaller: QRadioButton,
+                namespace_map: Optional[Dict[str, str]] = None):
         super().__init__()
         self.signals = XPathBuilderSignals()
         self._current_xpath = None
+        # Prefix map used to turn {uri}local names into prefix:local
+        self.namespace_map = namespace_map or {}
 
         # Store references to UI widgets
         self.tag_name_combo = tag_name_combo
@@ -167,6 +174,10 @@ class XPathBuilder(QObject):
         if not tag_name:
             return ""
 
+        # Namespaced names are written with the job prefixes
+        tag_name = qualified_name(tag_name, self.namespace_map)
+        attr_name = qualified_name(attr_name, self.namespace_map) if attr_name else attr_name
+
         # Start with basic element selection
         xpath = f"//{tag_name}"
 
@@ -257,7 +268,7 @@ class XPathBuilder(QObject):
     def validate_xpath_async(self, xpath_expression: str = None, xml_file_path: str = None) -> XPathValidator:
         """Create validator worker for async XPath validation."""
         expression = xpath_expression or self._current_xpath or self._get_input_xpath()
-        validator = XPathValidator(expression, xml_file_path)
+        validator = XPathValidator(expression, xml_file_path, self.namespace_map)
         return validator
 
     def validate_xpath_sync(self, xpath_expression: str = None) -> Tuple[bool, str]:
@@ -268,7 +279,7 @@ class XPathBuilder(QObject):
             return False, "No XPath expression to validate"
 
         try:
-            ET.XPath(expression)
+            ET.XPath(expression, namespaces=self.namespace_map)
             return True, "XPath syntax is valid"
         except ET.XPathSyntaxError as e:
             return False, f"XPath syntax error: {str(e)}"
@@ -285,14 +296,16 @@ def create_xpath_builder(tag_name_combo: QComboBox,
                          radio_contains: QRadioButton,
                          radio_starts_with: QRadioButton,
                          radio_greater: QRadioButton,
-                         radio_smaller: QRadioButton) -> XPathBuilder:
+                         radio_smaller: QRadioButton,
+                         namespace_map: Optional[Dict[str, str]] = None) -> XPathBuilder:
     """Create a new XPathBuilder instance."""
     return XPathBuilder(tag_name_combo, tag_value_combo, attribute_name_combo,
                         attribute_value_combo, radio_equals, radio_contains,
-                        radio_starts_with, radio_greater, radio_smaller)
+                        radio_starts_with, radio_greater, radio_smaller, namespace_map)
 
 
 def create_xpath_validator(xpath_expression: Optional[str] = None,
-                           xml_file_path: Optional[str] = None) -> XPathValidator:
+                           xml_file_path: Optional[str] = None,
+                           namespace_map: Optional[Dict[str, str]] = None) -> XPathValidator:
     """Create a new XPathValidator worker."""
-    return XPathValidator(xpath_expression, xml_file_path)
+    return XPathValidator(xpath_expression, xml_file_path, namespace_map)
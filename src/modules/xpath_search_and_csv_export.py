@@ -1,21 +1,126 @@
 from PySide6.QtCore import QObject, QRunnable, Signal, Slot
 from lxml import etree as ET
-from typing import List, Tuple, Dict, Any, Optional
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from functools import lru_cache
+from typing import Callable, List, Tuple, Dict, Any, Optional
+from concurrent.futures import wait, FIRST_COMPLETED
+from functools import partial
+from itertools import zip_longest
 from pathlib import Path
-from dataclasses import dataclass, field
+from dataclasses import dataclass, replace
 from contextlib import contextmanager
 import csv
 import os
 import traceback
-import re
 import threading
 import logging
 import time
-from queue import Queue
+from queue import Queue, Empty
 from threading import Thread
 
+from modules.corpus_aggregation import CorpusAggregate
+from modules.corpus_index import CorpusIndex
+from modules.columnar_store import ColumnarStore
+from modules.content_dedup import ContentHasher, DuplicateTracker
+from modules.export_checkpoint import ExportCheckpoint, compute_job_fingerprint
+from modules.export_sharding import read_shard_stats, select_shard, sort_csv_by_filename, write_shard_stats
+from modules.error_journal import (
+    STAGE_EVALUATE,
+    STAGE_PARSE,
+    STAGE_READ,
+    STAGE_TASK,
+    STAGE_XPATH,
+    ErrorJournal,
+    error_journal_path,
+    read_failed_files,
+)
+from modules.file_prefetch import DEFAULT_PREFETCH_BUFFER_BYTES, FilePrefetcher, PrefetchStats, read_file_bytes
+from modules.memory_budget import (
+    AUTO_MEMORY_BUDGET,
+    MemoryBudget,
+    MemoryBudgetStats,
+    resident_set_size,
+    resolve_memory_budget,
+)
+from modules.stage_profiler import (
+    BYTES_PARSED,
+    NULL_SPAN,
+    TRACE_ENUMERATE,
+    TRACE_FORMAT,
+    TRACE_PARSE,
+    TRACE_QUEUE_ROWS,
+    TRACE_QUEUE_WAIT,
+    TRACE_READ,
+    TRACE_STREAM,
+    TRACE_WRITE,
+    TRACE_XPATH,
+    MIN_QUEUE_WAIT_NS,
+    StageProfiler,
+    trace_path,
+)
+from modules.row_expansion import (
+    LONG_HEADERS,
+    ROW_LAYOUT_LONG,
+    ROW_LAYOUT_WIDE,
+    ROW_LAYOUTS,
+    ExpandedRows,
+    expand_file_rows,
+)
+from modules.run_metrics import (
+    STATUS_ABORTED,
+    STATUS_COMPLETED,
+    STATUS_FAILED,
+    METRICS_SCHEMA_VERSION,
+    RunPeakRss,
+    metrics_path,
+    process_peak_rss_bytes,
+    prometheus_path,
+    rate,
+    write_metrics_json,
+    write_prometheus_textfile,
+)
+from modules.parse_cancellation import ParseCancelled, feed_parser, is_cancellable_size
+from modules.streaming_xpath import can_stream, stream_xpath_results
+from modules.task_scheduler import (
+    LARGE_LANE,
+    FileTask,
+    SchedulePlan,
+    normalize_policy,
+    plan_tasks,
+)
+from modules.xml_encoding import EncodingStats, detect_encoding
+from modules.xml_namespaces import detect_folder_namespace_map
+from modules.xpath_analysis import (
+    COLUMN_COUNT,
+    COLUMN_SAMPLE_FILES,
+    COLUMN_SAMPLE_MAX_BYTES,
+    COLUMN_SCALAR,
+    analyze_xpath,
+    column_name,
+    format_scalar,
+    result_kind,
+)
+from modules.xlsx_export import StreamingXlsxWriter, XlsxDictWriter, XlsxStats, is_xlsx_output
+from modules.worker_pool import PRIORITY_BULK, shared_worker_pool
+from modules.worker_tuning import (
+    AdaptiveConcurrencyController,
+    ConcurrencyChange,
+    detect_cpu_budget,
+    resolve_max_threads,
+)
+
+
+# Output modes
+OUTPUT_ROWS = "rows"
+OUTPUT_AGGREGATE = "aggregate"
+OUTPUT_MODES = (OUTPUT_ROWS, OUTPUT_AGGREGATE)
+
+# Start of a streamed file the encoding is detected from
+STREAM_DETECT_BYTES = 64 * 1024
+
+# Admission of a file by the memory budget, see OptimizedXMLProcessor.admit
+ADMIT_PARSE = "parse"
+ADMIT_STREAM = "stream"
+ADMIT_CANCELLED = "cancelled"
+
 
 @dataclass
 class ProcessingStats:
@@ -27,54 +132,337 @@ class ProcessingStats:
     files_written: int = 0
     start_time: float = 0.0
     end_time: float = 0.0
-    errors: List[str] = field(default_factory=list)
+    # Failed files, the details are in the error journal
+    errors: int = 0
+    # Worker concurrency
+    worker_mode: str = "fixed"
+    cpu_budget: int = 0
+    initial_workers: int = 0
+    final_workers: int = 0
+    peak_workers: int = 0
+    recommended_workers: int = 0
+    worker_adjustments: int = 0
+    io_wait_fraction: float = 0.0
+    # Scheduling
+    scheduling_policy: str = "directory"
+    tasks_submitted: int = 0
+    batched_files: int = 0
+    large_lane_files: int = 0
+    # Checkpointing
+    resumed_files: int = 0
+    checkpoints_written: int = 0
+    # Content deduplication
+    duplicate_files: int = 0
+    hash_seconds: float = 0.0
+    # Output
+    output_mode: str = OUTPUT_ROWS
+    distinct_values: int = 0
+    # Corpus index and columnar store
+    index_skipped_files: int = 0
+    store_answered_files: int = 0
+    # Row layout, and files truncated by the match caps (per column or per file), metrics key files.capped
+    row_layout: str = ROW_LAYOUT_WIDE
+    capped_files: int = 0
+    # I/O stage, None without prefetching
+    io_threads: int = 0
+    prefetch: Optional[PrefetchStats] = None
+    # Admission control, None without a memory budget
+    memory: Optional[MemoryBudgetStats] = None
+    # Encoding detection, None if the parser trusted the declarations
+    encodings: Optional[EncodingStats] = None
+    # Streamed workbook, None for CSV output
+    xlsx: Optional[XlsxStats] = None
+    # Throughput and memory, measured while run metrics are written
+    bytes_parsed: int = 0
+    # Sampled during the run, None where the resident set size can't be read
+    peak_rss_bytes: Optional[int] = None
+    # Seconds from the stop request until every worker had stopped, None if the run wasn't aborted
+    abort_seconds: Optional[float] = None
 
 
 class OptimizedXMLProcessor:
     """Optimized XML processor with caching and better memory management."""
 
-    def __init__(self):
+    def __init__(self, namespaces: Optional[Dict[str, str]] = None):
         # Remove the shared parser — not thread-safe
-        self._compiled_regexes = {
-            'text_xpath': re.compile(r'/text\(\)\s*$'),
-            'attr_xpath': re.compile(r'/@\w+\s*$')
-        }
 
-        # Cache for compiled XPath expressions
-        self._compiled_xpaths: Dict[str, ET.XPath] = {}
+        # Column kind of each XPath (value list, match count or single value), classified once per job
+        self.column_kinds: Dict[str, str] = {}
 
-    @lru_cache(maxsize=256)
-    def _is_string_value_xpath(self, xpath: str) -> bool:
-        """Cached check if XPath targets string values."""
-        xpath = xpath.strip()
-        return (
-            self._compiled_regexes['text_xpath'].search(xpath) is not None or
-            self._compiled_regexes['attr_xpath'].search(xpath) is not None
-        )
+        # Prefix map passed to every compiled XPath
+        self.namespaces: Dict[str, str] = dict(namespaces or {})
+
+        # Cache for compiled XPath expressions, text and attribute results are plain str
+        # (no smart strings, which cost an object per match and keep the tree alive)
+        self._compiled_xpaths: Dict[str, ET.XPath] = {}
+        # count() of each count column XPath, None = its result isn't a node-set
+        self._count_xpaths: Dict[str, Optional[ET.XPath]] = {}
+
+        # I/O stage reading files ahead of the workers, None = workers read the files
+        self.prefetcher: Optional[FilePrefetcher] = None
+
+        # Admission control for parsed trees, None = files are parsed without limit
+        self.memory_budget: Optional[MemoryBudget] = None
+
+        # Journal of failed files, None = failures are logged
+        self.error_journal: Optional[ErrorJournal] = None
+
+        # Encodings detected from the file bytes before parsing, None = the parser trusts the declaration
+        self.encoding_stats: Optional[EncodingStats] = None
+
+        # Stage timings of the export (metrics and trace), None = not measured
+        self.profiler: Optional[StageProfiler] = None
+
+        # Checked between the chunks of large files while parsing, None = every parse runs to the end
+        self.terminate_event: Optional[threading.Event] = None
+
+    def trace(self, stage: str, **args):
+        """Span of a pipeline stage for the profiler, a no-op without one."""
+        return self.profiler.span(stage, **args) if self.profiler is not None else NULL_SPAN
+
+    def trace_file(self, xml_file: str):
+        """Span of one file for the profiler, a no-op without one."""
+        return self.profiler.file(xml_file) if self.profiler is not None else NULL_SPAN
+
+    def set_namespaces(self, namespaces: Optional[Dict[str, str]]):
+        """Replace the prefix map, compiled XPaths are recompiled on next use."""
+        self.namespaces = dict(namespaces or {})
+        self._compiled_xpaths.clear()
+        self._count_xpaths.clear()
+
+    def column_kind(self, xpath: str) -> str:
+        """COLUMN_STRINGS, COLUMN_COUNT or COLUMN_SCALAR, see classify_columns.
+
+        XPaths that weren't classified for the job are analysed statically on first use.
+        """
+        kind = self.column_kinds.get(xpath)
+        if kind is None:
+            kind = self.column_kinds[xpath] = analyze_xpath(xpath) or COLUMN_COUNT
+        return kind
+
+    def classify_columns(self, xpaths: List[str], sample_files: List[str | Path] = ()) -> Dict[str, str]:
+        """Decide once per job what the column of each XPath holds.
+
+        The kind comes from the parsed expression (see analyze_xpath) and is confirmed
+        by evaluating the XPaths on the first of ``sample_files``; XPaths the analysis
+        can't classify are evaluated on further samples until one of them has a match.
+        XPaths that stay undecided are counted.
+
+        Returns:
+            The kind of each XPath, also stored for column_kind
+        """
+        kinds = {xpath: analyze_xpath(xpath) for xpath in dict.fromkeys(xpaths)}
+        undecided = [xpath for xpath, kind in kinds.items() if kind is None]
+        checked = False
+        for path in sample_files:
+            if checked and not undecided:
+                break
+            try:
+                if os.path.getsize(path) > COLUMN_SAMPLE_MAX_BYTES:
+                    continue
+                root = ET.parse(str(path), ET.XMLParser(recover=True, huge_tree=True)).getroot()
+            except (OSError, ET.XMLSyntaxError):
+                continue
+            if root is None:
+                continue
+            for xpath in list(kinds) if not checked else list(undecided):
+                try:
+                    observed = result_kind(self._compiled_xpath(xpath)(root))
+                except ET.XPathError:
+                    # Reported for every file by execute_xpath_batch
+                    observed = None
+                if observed is None:
+                    continue
+                if kinds[xpath] is not None and kinds[xpath] != observed:
+                    logging.warning(f"XPath '{xpath}' returned {observed} values, not {kinds[xpath]} as expected")
+                kinds[xpath] = observed
+                if xpath in undecided:
+                    undecided.remove(xpath)
+            checked = True
+        kinds = {xpath: kind or COLUMN_COUNT for xpath, kind in kinds.items()}
+        self.column_kinds.update(kinds)
+        return kinds
 
     def parse_xml_file(self, xml_file_path: str) -> Optional[ET._Element]:
         """Thread-safe XML parsing with per-thread parser."""
+        guess = None
         try:
-            # Create a new parser for each thread (safe for multithreading)
-            parser = ET.XMLParser(recover=True, huge_tree=True)
-            tree = ET.parse(xml_file_path, parser)
-            return tree.getroot()
-        except (ET.XMLSyntaxError, FileNotFoundError, PermissionError) as e:
-            logging.warning(f"Error parsing {xml_file_path}: {e}")
+            with self.trace(TRACE_READ):
+                # Read ahead by the I/O stage, the worker only parses
+                data = self.prefetcher.take(xml_file_path) if self.prefetcher else None
+                size = len(data) if data is not None else os.path.getsize(xml_file_path)
+                # Large files are fed to the parser in chunks: an abort doesn't wait for the
+                # whole file, and its bytes aren't held next to the tree
+                chunked = is_cancellable_size(size)
+                if self.encoding_stats is not None:
+                    if data is None and not chunked:
+                        # The detection needs the bytes, the parser gets the same bytes
+                        data = read_file_bytes(xml_file_path)
+                    if data is not None:
+                        guess = detect_encoding(data)
+                    else:
+                        with open(xml_file_path, "rb") as f:
+                            guess = detect_encoding(f.read(STREAM_DETECT_BYTES), complete=False)
+            with self.trace(TRACE_PARSE):
+                # Create a new parser for each thread (safe for multithreading)
+                parser = ET.XMLParser(recover=True, huge_tree=True,
+                                      encoding=guess.parser_encoding if guess else None)
+                error_log = parser.error_log
+                if chunked:
+                    root = feed_parser(parser, data if data is not None else xml_file_path, self.terminate_event)
+                    error_log = parser.feed_error_log
+                    if root is not None:
+                        root.getroottree().docinfo.URL = xml_file_path
+                elif data is not None:
+                    root = ET.fromstring(data, parser, base_url=xml_file_path)
+                else:
+                    root = ET.parse(xml_file_path, parser).getroot()
+            if self.profiler is not None:
+                self.profiler.add(BYTES_PARSED, size)
+        except ParseCancelled:
+            # The run is being aborted, the file isn't a failure
+            return None
+        except ET.XMLSyntaxError as e:
+            self.report_error(xml_file_path, STAGE_PARSE, e)
+            return None
+        except OSError as e:
+            self.report_error(xml_file_path, STAGE_READ, e)
             return None
+        if guess:
+            self.encoding_stats.record(
+                guess, sum(1 for error in error_log if error.level >= ET.ErrorLevels.ERROR))
+        if root is None:
+            # Nothing left to recover, e.g. no element at all
+            error = error_log.last_error
+            self.report_error(xml_file_path, STAGE_PARSE, error.message if error else "No root element",
+                              line=error.line if error else None, column=error.column if error else None,
+                              error_class="XMLSyntaxError")
+        return root
+
+    def report_error(self, xml_file_path: str, stage: str, error: BaseException | str, **details):
+        """Journal the failure of a file, or log it when no error journal is attached.
+
+        Args:
+            stage: Stage the file failed in, see modules.error_journal
+            details: line, column or error_class, see ErrorJournal.record
+        """
+        if self.error_journal is not None:
+            self.error_journal.record(xml_file_path, stage, error, **details)
+        else:
+            logging.warning(f"Error ({stage}) in {xml_file_path}: {error}")
 
-    def execute_xpath_batch(self, root: ET._Element, xpaths: List[str]) -> Dict[str, List[Any]]:
-        """Execute multiple XPath expressions efficiently using compiled XPaths."""
-        results = {}
-        for xpath in xpaths:
+    def stream_xml_file(self, xml_file_path: str, xpaths: List[str]) -> Optional[Dict[str, List[Any]]]:
+        """Evaluate simple path XPaths while parsing, for files too large to hold as a tree.
+
+        Returns:
+            Results like execute_xpath_batch, or None if the file can't be parsed
+        """
+        # Streamed files are too large to hold, they are read from disk even if they were prefetched
+        if self.prefetcher:
+            self.prefetcher.release(xml_file_path)
+        try:
+            encoding = None
+            if self.encoding_stats is not None:
+                with open(xml_file_path, "rb") as f:
+                    guess = detect_encoding(f.read(STREAM_DETECT_BYTES), complete=False)
+                self.encoding_stats.record(guess)
+                encoding = guess.parser_encoding
+            with self.trace(TRACE_STREAM):
+                results = stream_xpath_results(xml_file_path, xpaths, self.namespaces, encoding, self.terminate_event)
+            if self.profiler is not None:
+                self.profiler.add(BYTES_PARSED, os.path.getsize(xml_file_path))
+        except ParseCancelled:
+            return None
+        except ET.XMLSyntaxError as e:
+            self.report_error(xml_file_path, STAGE_PARSE, e)
+            return None
+        except OSError as e:
+            self.report_error(xml_file_path, STAGE_READ, e)
+            return None
+        if results is None:
+            self.report_error(xml_file_path, STAGE_PARSE, "No root element", error_class="XMLSyntaxError")
+        return results
+
+    @contextmanager
+    def admit(self, xml_file_path: str, xpaths: List[str], terminate_event: threading.Event):
+        """Hold memory of the budget for the parsed tree of a file while the block runs.
+
+        The block has to keep the tree (and results referencing it) no longer than itself.
+
+        Yields:
+            ADMIT_PARSE, ADMIT_STREAM if the file is too large for the budget and the XPaths
+            can be evaluated with stream_xml_file, or ADMIT_CANCELLED if the run was
+            terminated while waiting for memory
+        """
+        budget = self.memory_budget
+        if budget is None:
+            yield ADMIT_PARSE
+            return
+        try:
+            size = os.path.getsize(xml_file_path)
+        except OSError:
+            size = 0
+        if budget.should_stream(size) and can_stream(xpaths, self.namespaces):
+            budget.record_streamed()
+            yield ADMIT_STREAM
+            return
+        reservation = budget.acquire(size, terminate_event)
+        if reservation is None:
+            yield ADMIT_CANCELLED
+            return
+        try:
+            yield ADMIT_PARSE
+        finally:
+            budget.release(reservation, resident_set_size() if reservation.rss_before is not None else None)
+
+    def _compiled_xpath(self, xpath: str) -> ET.XPath:
+        compiled = self._compiled_xpaths.get(xpath)
+        if compiled is None:
+            # compile once and reuse
+            compiled = self._compiled_xpaths[xpath] = ET.XPath(
+                xpath, namespaces=self.namespaces, smart_strings=False)
+        return compiled
+
+    def _count_matches(self, root: ET._Element, xpath: str) -> int | List[Any]:
+        """Matches of a count column XPath, counted by libxml2 without a Python object per node.
+
+        Returns:
+            The number of matches, or the plain result if the XPath doesn't select a node-set
+        """
+        if xpath not in self._count_xpaths:
+            try:
+                self._count_xpaths[xpath] = ET.XPath(f"count({xpath})", namespaces=self.namespaces)
+            except ET.XPathSyntaxError:
+                # Reported by the plain compile below
+                self._count_xpaths[xpath] = None
+        counter = self._count_xpaths[xpath]
+        if counter is not None:
             try:
-                if xpath not in self._compiled_xpaths:
-                    # compile once and reuse
-                    self._compiled_xpaths[xpath] = ET.XPath(xpath)
-                results[xpath] = self._compiled_xpaths[xpath](root)
-            except ET.XPathEvalError as e:
-                logging.warning(f"XPath '{xpath}' failed: {e}")
-                results[xpath] = []
+                return int(counter(root))
+            except ET.XPathEvalError:
+                # e.g. count(...) or string(...), their result isn't a node-set
+                self._count_xpaths[xpath] = None
+        return self._compiled_xpath(xpath)(root)
+
+    def execute_xpath_batch(self, root: ET._Element, xpaths: List[str]) -> Dict[str, List[Any] | int]:
+        """Execute multiple XPath expressions efficiently using compiled XPaths.
+
+        Returns:
+            Per XPath the plain string values (value columns), the number of matches
+            (count columns) or the string, number or boolean result (single value columns)
+        """
+        results = {}
+        with self.trace(TRACE_XPATH):
+            for xpath in xpaths:
+                try:
+                    if self.column_kind(xpath) == COLUMN_COUNT:
+                        results[xpath] = self._count_matches(root, xpath)
+                    else:
+                        results[xpath] = self._compiled_xpath(xpath)(root)
+                except ET.XPathError as e:
+                    self.report_error(root.getroottree().docinfo.URL or "", STAGE_XPATH, f"'{xpath}': {e}",
+                                      error_class=type(e).__name__)
+                    results[xpath] = []
         return results
 
     def format_match_value(self, match: Any) -> str:
@@ -89,39 +477,77 @@ class OptimizedXMLProcessor:
             return f"<{match.tag}>"
         return str(match) if match is not None else ""
 
+    def format_match_values(self, matches: List[Any]) -> List[str]:
+        """Non-empty formatted values of a result list, flattened to one line each.
 
-def process_single_xml_optimized(
-    xml_file: str,
-    folder: Path,
+        Text and attribute results are plain strings and are stripped in one pass,
+        other results go through format_match_value one by one.
+        """
+        try:
+            values = [match.strip() for match in matches]
+        except AttributeError:
+            values = [self.format_match_value(match) for match in matches]
+        # Flatten multiline values, so the csv row isn't "broken" for an excel conversion
+        return [
+            value.replace("\n", " ").replace("\r", " ") if "\n" in value or "\r" in value else value
+            for value in filter(None, values)
+        ]
+
+
+def evaluate_xml_file(
+    xml_file_path: Path,
     xpath_expressions: List[str],
     headers: List[str],
-    group_matches_flag: bool,
     terminate_event: threading.Event,
-    processor: OptimizedXMLProcessor
-) -> Tuple[List[Dict[str, str]], int, int]:
+    processor: OptimizedXMLProcessor,
+    xpath_results: Optional[Dict[str, List[Any]]] = None
+) -> Optional[Tuple[Dict[str, List[str]], int, bool, int]]:
     """
-    Optimized single XML file processing.
+    Parse one XML file and evaluate all XPath expressions on it.
+
+    Args:
+        xpath_results: Results already evaluated elsewhere (columnar store), skips parsing
 
     Returns:
-        Tuple of (result_rows, total_matches, file_had_matches_flag)
+        Tuple of (values per output column, total_matches, has_matches, max_matches),
+        or None if the file could not be parsed or the run was terminated
     """
-    if terminate_event.is_set():
-        return [], 0, 0
+    if xpath_results is not None:
+        with processor.trace(TRACE_FORMAT):
+            return _collect_match_values(xpath_expressions, headers, terminate_event, processor, xpath_results)
 
-    xml_file_path = folder / xml_file
-    xml_file_name = xml_file_path.stem
+    with processor.admit(str(xml_file_path), xpath_expressions, terminate_event) as admission:
+        if admission == ADMIT_CANCELLED:
+            return None
+        try:
+            if admission == ADMIT_STREAM:
+                xpath_results = processor.stream_xml_file(str(xml_file_path), xpath_expressions)
+                if xpath_results is None:
+                    return None
+            else:
+                root = processor.parse_xml_file(str(xml_file_path))
+                if root is None:
+                    return None
+        except Exception as e:
+            processor.report_error(str(xml_file_path), STAGE_EVALUATE, e)
+            return None
 
-    try:
-        root = processor.parse_xml_file(str(xml_file_path))
-        if root is None:
-            return [], 0, 0
-    except Exception as e:
-        logging.error(f"Error processing {xml_file_path}: {e}")
-        return [], 0, 0
+        if xpath_results is None:
+            # Batch execute all XPath expressions
+            xpath_results = processor.execute_xpath_batch(root, xpath_expressions)
+        # Collected while the memory is held, lxml results keep the tree alive
+        with processor.trace(TRACE_FORMAT):
+            return _collect_match_values(xpath_expressions, headers, terminate_event, processor, xpath_results)
 
-    # Batch execute all XPath expressions
-    xpath_results = processor.execute_xpath_batch(root, xpath_expressions)
 
+def _collect_match_values(
+    xpath_expressions: List[str],
+    headers: List[str],
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor,
+    xpath_results: Dict[str, List[Any]]
+) -> Optional[Tuple[Dict[str, List[str]], int, bool, int]]:
+    """Output column values of evaluated XPath results, see evaluate_xml_file."""
     # Process results efficiently
     all_results = {}
     max_matches = 0
@@ -130,32 +556,36 @@ def process_single_xml_optimized(
 
     for xpath, header in zip(xpath_expressions, headers):
         if terminate_event.is_set():
-            return [], 0, 0
+            return None
 
+        kind = processor.column_kind(xpath)
         matches = xpath_results.get(xpath, [])
+        if kind == COLUMN_SCALAR and not isinstance(matches, list):
+            # string(), count(), ...: one value per file, 0 and false included
+            value = format_scalar(matches).replace("\n", " ").replace("\r", " ")
+            all_results[header] = [value] if value else []
+            if value:
+                has_matches = True
+                total_matches += 1
+                max_matches = max(max_matches, 1)
+            continue
+
         if not matches:
             all_results[header] = []
             continue
 
-        if processor._is_string_value_xpath(xpath):
+        if kind != COLUMN_COUNT:
             # Process string values
-            values = []
-            for match in matches:
-                formatted_value = processor.format_match_value(match)
-                if formatted_value:  # Only non-empty values
-                    # Flatten string if's multiline, so the csv row isn't "broken" for an excel conversion
-                    if "\n" in formatted_value or "\r" in formatted_value: # Handle multiline
-                        formatted_value = formatted_value.replace("\n", " ").replace("\r", " ")
-                    values.append(formatted_value)
-
+            values = processor.format_match_values(matches)
             all_results[header] = values
             if values:
                 has_matches = True
                 total_matches += len(values)
                 max_matches = max(max_matches, len(values))
         else:
-            # Count-based expressions
-            match_count = len(matches)
+            # Count-based expressions, counted by execute_xpath_batch or a list from elsewhere
+            match_count = (matches if isinstance(matches, int)
+                           else len(matches) if isinstance(matches, list) else 1)
             count_header = f"{header} Match Count"
 
             if match_count > 0:
@@ -166,35 +596,214 @@ def process_single_xml_optimized(
             else:
                 all_results[count_header] = []
 
+    return all_results, total_matches, has_matches, max_matches
+
+
+def process_single_xml_optimized(
+    xml_file: str,
+    folder: Path,
+    xpath_expressions: List[str],
+    headers: List[str],
+    group_matches_flag: bool,
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor,
+    xpath_results: Optional[Dict[str, List[Any]]] = None
+) -> Tuple[List[Dict[str, str]], int, int]:
+    """
+    Optimized single XML file processing.
+
+    Args:
+        xpath_results: Results already evaluated elsewhere (columnar store), skips parsing
+
+    Returns:
+        Tuple of (result_rows, total_matches, file_had_matches_flag)
+    """
+    if terminate_event.is_set():
+        return [], 0, 0
+
+    xml_file_path = folder / xml_file
+    xml_file_name = xml_file_path.stem
+
+    evaluated = evaluate_xml_file(xml_file_path, xpath_expressions, headers, terminate_event, processor, xpath_results)
+    if evaluated is None:
+        return [], 0, 0
+    all_results, total_matches, has_matches, max_matches = evaluated
+
     # Generate result rows only if there are matches
     result_rows = []
     if has_matches:
         num_rows = 1 if group_matches_flag else max_matches
 
-        for row_index in range(num_rows):
-            row = {"Filename": xml_file_name}
-
-            for xpath, header in zip(xpath_expressions, headers):
-                if processor._is_string_value_xpath(xpath):
-                    values = all_results.get(header, [])
-                    if group_matches_flag and values:
-                        # Group all values with semicolon separator
-                        row[header] = ";".join(values)
-                    elif row_index < len(values):
-                        row[header] = values[row_index]
+        with processor.trace(TRACE_FORMAT, rows=num_rows):
+            for row_index in range(num_rows):
+                row = {"Filename": xml_file_name}
+
+                for xpath, header in zip(xpath_expressions, headers):
+                    if processor.column_kind(xpath) != COLUMN_COUNT:
+                        values = all_results.get(header, [])
+                        if group_matches_flag and values:
+                            # Group all values with semicolon separator
+                            row[header] = ";".join(values)
+                        elif row_index < len(values):
+                            row[header] = values[row_index]
+                        else:
+                            row[header] = "Null"
                     else:
-                        row[header] = "Null"
-                else:
-                    # Count headers
-                    count_header = f"{header} Match Count"
-                    values = all_results.get(count_header, [])
-                    row[count_header] = values[0] if values and row_index == 0 else ""
+                        # Count headers
+                        count_header = f"{header} Match Count"
+                        values = all_results.get(count_header, [])
+                        row[count_header] = values[0] if values and row_index == 0 else ""
 
-            result_rows.append(row)
+                result_rows.append(row)
 
     return result_rows, total_matches, 1 if has_matches else 0
 
 
+def process_single_xml_expanded(
+    xml_file: str,
+    folder: Path,
+    xpath_expressions: List[str],
+    headers: List[str],
+    group_matches_flag: bool,
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor,
+    xpath_results: Optional[Dict[str, List[Any]]] = None,
+    layout: str = ROW_LAYOUT_WIDE,
+    max_column_matches: int = 0,
+    max_file_rows: int = 0
+) -> Tuple[List[ExpandedRows], int, int]:
+    """
+    Single XML file processing that leaves building the rows to the writer, see ExpandedRows.
+
+    The wide layout writes the same rows as process_single_xml_optimized without
+    holding a padded dict per row; the long layout writes one row per value.
+
+    Args:
+        xpath_results: Results already evaluated elsewhere (columnar store), skips parsing
+        layout: ROW_LAYOUT_WIDE or ROW_LAYOUT_LONG
+        max_column_matches: Values written per column at most, 0 = all
+        max_file_rows: Rows written per file at most, 0 = all
+
+    Returns:
+        Tuple of ([ExpandedRows] or [], total_matches, file_had_matches_flag)
+    """
+    if terminate_event.is_set():
+        return [], 0, 0
+
+    xml_file_path = folder / xml_file
+    evaluated = evaluate_xml_file(xml_file_path, xpath_expressions, headers, terminate_event, processor, xpath_results)
+    if evaluated is None:
+        return [], 0, 0
+    all_results, total_matches, has_matches, _ = evaluated
+    if not has_matches:
+        return [], total_matches, 0
+
+    # Columns in header order, a later XPath with the same column wins like in a row dict
+    columns: Dict[str, Tuple[bool, List[str]]] = {}
+    for xpath, header in zip(xpath_expressions, headers):
+        kind = processor.column_kind(xpath)
+        column = column_name(header, kind)
+        columns[column] = (kind == COLUMN_COUNT, all_results.get(column, []))
+    expanded = expand_file_rows(xml_file_path.stem, columns, group_matches_flag, layout,
+                                max_column_matches, max_file_rows)
+    return [expanded], total_matches, 1
+
+
+def aggregate_single_xml(
+    xml_file: str,
+    folder: Path,
+    xpath_expressions: List[str],
+    headers: List[str],
+    group_matches_flag: bool,
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor,
+    xpath_results: Optional[Dict[str, List[Any]]] = None,
+    columns: Optional[List[str]] = None
+) -> Tuple[CorpusAggregate, int, int]:
+    """
+    Evaluate a single XML file into a partial aggregate instead of rows.
+
+    Args:
+        xpath_results: Results already evaluated elsewhere (columnar store), skips parsing
+        columns: Output columns to aggregate, None aggregates all columns
+
+    Returns:
+        Tuple of (partial aggregate of this file, total_matches, file_had_matches_flag)
+    """
+    file_aggregate = CorpusAggregate()
+    if terminate_event.is_set():
+        return file_aggregate, 0, 0
+
+    evaluated = evaluate_xml_file(folder / xml_file, xpath_expressions, headers, terminate_event, processor,
+                                  xpath_results)
+    if evaluated is None:
+        return file_aggregate, 0, 0
+    all_results, total_matches, has_matches, _ = evaluated
+
+    file_aggregate.add_file({
+        column: values for column, values in all_results.items()
+        if values and (columns is None or column in columns)
+    })
+    return file_aggregate, total_matches, 1 if has_matches else 0
+
+
+def generate_csv_headers(xpath_expressions: List[str], headers: List[str], processor: OptimizedXMLProcessor) -> List[str]:
+    """CSV columns of a job: Filename, then a value or match count column per XPath."""
+    columns = ["Filename"]
+
+    for xpath, header in zip(xpath_expressions, headers):
+        column = column_name(header, processor.column_kind(xpath))
+        if column not in columns:
+            columns.append(column)
+
+    return columns
+
+
+# Statistics kept by the checkpoint for the committed files, a resumed run starts from them
+CHECKPOINT_TOTALS = ("files_with_matches", "total_matches", "files_written", "capped_files")
+
+
+@dataclass
+class FileWritten:
+    """Queue marker sent to the writer after all rows of a file have been queued."""
+    xml_file: str
+    # Statistics of the file, see CHECKPOINT_TOTALS
+    files_with_matches: int = 0
+    total_matches: int = 0
+    files_written: int = 0
+    capped_files: int = 0
+
+
+def process_xml_batch(
+    xml_files: List[str],
+    folder: Path,
+    xpath_expressions: List[str],
+    headers: List[str],
+    group_matches_flag: bool,
+    terminate_event: threading.Event,
+    processor: OptimizedXMLProcessor,
+    process_file: Callable = process_single_xml_optimized
+) -> List[Tuple[Any, int, int]]:
+    """Process a batch of files in one task, see process_single_xml_optimized.
+
+    Args:
+        process_file: Per-file function, process_single_xml_optimized or aggregate_single_xml
+
+    Returns:
+        One (result_rows or partial aggregate, total_matches, file_had_matches_flag) tuple per processed file
+    """
+    results = []
+    for xml_file in xml_files:
+        if terminate_event.is_set():
+            break
+        with processor.trace_file(xml_file):
+            results.append(process_file(
+                xml_file, folder, xpath_expressions, headers,
+                group_matches_flag, terminate_event, processor
+            ))
+    return results
+
+
 class CSVExportSignals(QObject):
     """Signals for CSV export operations."""
     finished = Signal()
@@ -220,6 +829,8 @@ class OptimizedCSVExportThread(QRunnable):
 
         # Threading controls
         self._terminate_event = threading.Event()
+        # perf_counter() of the first stop request, for the time-to-abort
+        self._stop_requested_at: Optional[float] = None
         self._executor = None
 
         # Configuration
@@ -228,10 +839,54 @@ class OptimizedCSVExportThread(QRunnable):
         self.xpath_expressions = kwargs.get("xpath_expressions_list", [])
         self.output_path = Path(kwargs.get(
             "output_save_path_for_csv_export", ""))
+        # An .xlsx output is written as a workbook while the rows arrive, split into sheets at Excel's row limit
+        self.xlsx_output = is_xlsx_output(self.output_path)
         self.headers = kwargs.get("csv_headers_list", [])
         self.group_matches_flag = kwargs.get("group_matches_flag", True)
-        self.max_threads = min(kwargs.get(
-            "max_threads", os.cpu_count() or 4), 32)  # Cap at 32
+        # "auto" (or None) starts from the cgroup aware CPU budget and adapts during the run
+        self.max_threads, self.auto_threads = resolve_max_threads(
+            kwargs.get("max_threads"))
+        self.scheduling_policy = normalize_policy(kwargs.get("scheduling_policy"))
+        self.large_lane_workers = kwargs.get("large_lane_workers")
+        self.resume_from_checkpoint = kwargs.get("resume_from_checkpoint", True)
+        self.checkpoint_interval = kwargs.get("checkpoint_interval", 10.0)
+        self.deduplicate_files = kwargs.get("deduplicate_files", False)
+        # None = detect the prefix map from a sample of the folder
+        self.namespaces = kwargs.get("namespaces")
+        self.output_mode = kwargs.get("output_mode", OUTPUT_ROWS)
+        self.aggregate_columns = kwargs.get("aggregate_columns")
+        # Rows of a row export: "wide" (a column per XPath) or "long" (Filename, Column, Index, Value)
+        self.row_layout = kwargs.get("row_layout", ROW_LAYOUT_WIDE)
+        # Values written per column and rows written per file at most, 0 = all
+        self.max_column_matches = int(kwargs.get("max_column_matches") or 0)
+        self.max_file_rows = int(kwargs.get("max_file_rows") or 0)
+        self._aggregate = CorpusAggregate()
+        # Skip files the corpus index proves can't match, None = index next to the XML files
+        self.use_corpus_index = kwargs.get("use_corpus_index", False)
+        self.corpus_index_path = kwargs.get("corpus_index_path")
+        # Answer simple path XPaths from the shredded Parquet store instead of parsing
+        self.use_columnar_store = kwargs.get("use_columnar_store", False)
+        self.columnar_store_path = kwargs.get("columnar_store_path")
+        # Restrict the export to these file names of the folder (watch mode), None = all
+        self.xml_files = kwargs.get("xml_files")
+        # Threads reading files ahead of the parser workers, 0 = workers read the files themselves
+        self.io_threads = int(kwargs.get("io_threads") or 0)
+        self.prefetch_buffer_bytes = kwargs.get("prefetch_buffer_bytes", DEFAULT_PREFETCH_BUFFER_BYTES)
+        # (index, count) to export only the files of one shard (counted from 1), None = all files
+        self.shard = tuple(kwargs["shard"]) if kwargs.get("shard") else None
+        # Memory for parsed trees shared by the workers, "auto" = half of what is available, 0 = no limit
+        self.memory_budget_bytes = kwargs.get("memory_budget_bytes", AUTO_MEMORY_BUDGET)
+        # Only export the files the error journal of the last run lists as failed, appending their rows
+        self.retry_failed_files = kwargs.get("retry_failed_files", False)
+        # Detect the encoding of every file from its bytes instead of trusting its declaration
+        self.detect_encodings = kwargs.get("detect_encodings", True)
+        self._error_journal: Optional[ErrorJournal] = None
+        # Record the time of every pipeline stage to <output>.trace.json, every n-th file traced
+        self.trace_stages = kwargs.get("trace_stages", False)
+        self.trace_sample_every = int(kwargs.get("trace_sample_every") or 1)
+        # Write <output>.metrics.json after every run, and a .prom file to a textfile collector directory
+        self.write_metrics = kwargs.get("write_metrics", True)
+        self.prometheus_textfile_dir = kwargs.get("prometheus_textfile_dir")
 
         # Initialize processor
         self._processor = OptimizedXMLProcessor()
@@ -241,8 +896,11 @@ class OptimizedCSVExportThread(QRunnable):
 
     def stop(self):
         """Signal termination and cleanup resources."""
+        if self._stop_requested_at is None:
+            self._stop_requested_at = time.perf_counter()
         self.signals.program_output_progress_append.emit(
             "Aborting CSV export...")
+        # Workers parsing large files stop at the next chunk, see parse_cancellation
         self._terminate_event.set()
 
         if self._executor:
@@ -275,10 +933,17 @@ class OptimizedCSVExportThread(QRunnable):
             )
             return False
         
-        if len(self.output_path.__str__().strip()) <= 1 or self.output_path.suffix.lower() != ".csv":
+        if len(self.output_path.__str__().strip()) <= 1 or self.output_path.suffix.lower() not in (".csv", ".xlsx"):
             self.signals.warning_occurred.emit(
                 "CSV Output Path is Invalid",
-                "Please set a valid output folder path for the csv file."
+                "Please set a valid output folder path for the csv or xlsx file."
+            )
+            return False
+
+        if self.xlsx_output and (self.output_mode == OUTPUT_AGGREGATE or self.shard or self.retry_failed_files):
+            self.signals.warning_occurred.emit(
+                "XLSX Output Not Supported",
+                "Aggregates, shards and retries of failed files are written as CSV, please choose a .csv output file."
             )
             return False
 
@@ -296,26 +961,58 @@ class OptimizedCSVExportThread(QRunnable):
             )
             return False
 
+        if self.row_layout not in ROW_LAYOUTS:
+            self.signals.warning_occurred.emit(
+                "Unknown Row Layout",
+                f"Row layout '{self.row_layout}' is unknown, use one of: {', '.join(ROW_LAYOUTS)}"
+            )
+            return False
+
         return True
 
     def _get_xml_files(self) -> List[str]:
         """Get list of XML files efficiently."""
-        return [f.name for f in self.folder_path.glob("*.xml") if f.is_file()]
+        if self.xml_files is not None:
+            xml_files = [f for f in self.xml_files if (self.folder_path / f).is_file()]
+        else:
+            xml_files = [f.name for f in self.folder_path.glob("*.xml") if f.is_file()]
+        if self.shard:
+            xml_files = select_shard(xml_files, self.shard)
+        return xml_files
 
     def _generate_csv_headers(self) -> List[str]:
         """Generate appropriate CSV headers."""
-        headers = ["Filename"]
+        if self.row_layout == ROW_LAYOUT_LONG:
+            return list(LONG_HEADERS)
+        return generate_csv_headers(self.xpath_expressions, self.headers, self._processor)
 
-        for xpath, header in zip(self.xpath_expressions, self.headers):
-            if self._processor._is_string_value_xpath(xpath):
-                if header not in headers:
-                    headers.append(header)
-            else:
-                count_header = f"{header} Match Count"
-                if count_header not in headers:
-                    headers.append(count_header)
+    @contextmanager
+    def _output_writers(self, appending: bool):
+        """Dict row and list row writers of the output, and the CSV file to checkpoint (None for a workbook)."""
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        headers = self._generate_csv_headers()
+        if self.xlsx_output:
+            with StreamingXlsxWriter(self.output_path, headers) as workbook:
+                self._stats.xlsx = workbook.stats
+                yield XlsxDictWriter(workbook, headers), workbook, None
+            return
 
-        return headers
+        # Large buffer = fewer disk flushes, faster sequential writes
+        # A resumed export appends to the output truncated at the last checkpoint
+        mode = 'a' if appending else 'w'
+        with open(self.output_path, mode, newline='', encoding='utf-8', buffering=1_048_576) as csvfile:
+            writer = csv.DictWriter(
+                                    csvfile,
+                                    fieldnames=headers,
+                                    extrasaction='ignore',
+                                    delimiter=',',
+                                    quotechar='"',
+                                    quoting=csv.QUOTE_MINIMAL)
+            # Rows expanded by the writer, written without a dict per row
+            row_writer = csv.writer(csvfile, delimiter=',', quotechar='"', quoting=csv.QUOTE_MINIMAL)
+            if not appending:
+                writer.writeheader()
+            yield writer, row_writer, csvfile
 
     @contextmanager
     def _csv_writer_context(self):
@@ -341,9 +1038,27 @@ class OptimizedCSVExportThread(QRunnable):
 
         # Start time tracking
         self._stats.start_time = time.time()
+        profiler = (StageProfiler(self.trace_sample_every, record_events=self.trace_stages)
+                    if self.trace_stages or self.write_metrics else None)
 
         # Get XML files
-        xml_files = self._get_xml_files()
+        with profiler.span(TRACE_ENUMERATE) if profiler else NULL_SPAN:
+            xml_files = self._get_xml_files()
+        journal_path = error_journal_path(self.output_path)
+        if self.retry_failed_files:
+            if self.output_mode == OUTPUT_AGGREGATE:
+                self.signals.warning_occurred.emit(
+                    "Retry Not Supported",
+                    "Failed files can only be retried for row exports, run the aggregate again.")
+                return
+            failed_files = set(read_failed_files(journal_path))
+            xml_files = [xml_file for xml_file in xml_files if xml_file in failed_files]
+            if not xml_files:
+                self.signals.info_occurred.emit(
+                    "No Failed Files", f"{journal_path.name} lists no failed files to retry.")
+                return
+            self.signals.program_output_progress_append.emit(
+                f"Retrying {len(xml_files)} files that failed in the last run ({journal_path.name})...")
         self._stats.total_files = len(xml_files)
 
         if not xml_files:
@@ -353,89 +1068,243 @@ class OptimizedCSVExportThread(QRunnable):
             )
             return
 
+        # Prefix map for every compiled XPath, explicit map wins over detection
+        if self.namespaces is None:
+            self.namespaces = detect_folder_namespace_map(self.folder_path)
+        self._processor.set_namespaces(self.namespaces)
+        if self.namespaces:
+            self.signals.program_output_progress_append.emit(
+                "Namespace prefixes: " + ", ".join(f"{p}={uri}" for p, uri in sorted(self.namespaces.items()))
+            )
+        # Columns are fixed before the writer generates the headers
+        self._processor.classify_columns(
+            self.xpath_expressions, [self.folder_path / xml_file for xml_file in xml_files[:COLUMN_SAMPLE_FILES]])
+
+        if self.use_corpus_index:
+            xml_files = self._limit_to_index_candidates(xml_files)
+
+        checkpoint = ExportCheckpoint(
+            self.output_path, self.folder_path, self._job_fingerprint(),
+            interval=self.checkpoint_interval
+        )
+        # Aggregates only exist in memory, so only row exports can be resumed
+        aggregating = self.output_mode == OUTPUT_AGGREGATE
+        self._stats.output_mode = self.output_mode
+        self._stats.row_layout = self.row_layout
+        # A workbook can't be appended to, XLSX exports always start over
+        resuming = not aggregating and not self.xlsx_output and self.resume_from_checkpoint and checkpoint.load()
+        if resuming:
+            checkpoint.prepare_output_for_append()
+            remaining = checkpoint.remaining(xml_files)
+            self._stats.resumed_files = len(xml_files) - len(remaining)
+            self._stats.processed_files += self._stats.resumed_files
+            # Statistics cover the whole output, not only the files of this run
+            for key in CHECKPOINT_TOTALS:
+                setattr(self._stats, key, getattr(self._stats, key) + checkpoint.totals.get(key, 0))
+            xml_files = remaining
+            self.signals.program_output_progress_append.emit(
+                f"Resuming export from checkpoint, skipping {self._stats.resumed_files} completed files..."
+            )
+        # Rows of retried files are added to the output of the earlier run
+        appending = resuming or (self.retry_failed_files and not aggregating and self.output_path.exists())
+        # A resumed run keeps the failures journaled before the interruption
+        self._error_journal = ErrorJournal(journal_path, self.folder_path, append=resuming)
+        self._processor.error_journal = self._error_journal
+
         self.signals.program_output_progress_append.emit(
-            f"Starting search and CSV export of {len(xml_files)} files with {self.max_threads} threads..."
+            f"Starting search and CSV export of {len(xml_files)} files with {self.max_threads} threads"
+            f"{' (auto)' if self.auto_threads else ''}..."
         )
         # Hide the widget during processing
         self.signals.visible_state_widget.emit(True)
 
         result_queue = Queue(maxsize=5000)
         writer_thread_stop = threading.Event()
+        self._processor.profiler = profiler
+        self._processor.terminate_event = self._terminate_event
 
         def writer_worker():
             """Runs in background thread; consumes rows from queue and writes to CSV."""
             try:
-                # Large buffer = fewer disk flushes, faster sequential writes
-                with open(self.output_path, 'w', newline='', encoding='utf-8', buffering=1_048_576) as csvfile:
-                    headers = self._generate_csv_headers()
-                    writer = csv.DictWriter(
-                                            csvfile,
-                                            fieldnames=headers,
-                                            extrasaction='ignore',
-                                            delimiter=',',
-                                            quotechar='"',
-                                            quoting=csv.QUOTE_MINIMAL)
-                    writer.writeheader()
+                with self._output_writers(appending) as (writer, row_writer, csvfile):
+                    # Traced: start of the current wait for rows and of the rows of the current file
+                    wait_start = file_start = None
                     while not (writer_thread_stop.is_set() and result_queue.empty()):
+                        if profiler and wait_start is None:
+                            wait_start = time.perf_counter_ns()
                         try:
                             row = result_queue.get(timeout=0.2)
-                            if row is None:
-                                continue
-                            writer.writerow(row)
-                            result_queue.task_done()
-                        except Exception:
+                        except Empty:
                             # small timeout or queue empty; loop continues
+                            if csvfile:
+                                checkpoint.maybe_commit(csvfile)
                             continue
+                        if profiler:
+                            now = time.perf_counter_ns()
+                            if now - wait_start >= MIN_QUEUE_WAIT_NS:
+                                profiler.add_span(TRACE_QUEUE_WAIT, wait_start, now)
+                            wait_start = None
+                            if file_start is None and not isinstance(row, FileWritten):
+                                file_start = now
+                        try:
+                            if isinstance(row, FileWritten):
+                                if file_start is not None:
+                                    profiler.add_span(TRACE_WRITE, file_start, time.perf_counter_ns(),
+                                                      {"file": row.xml_file})
+                                    file_start = None
+                                if csvfile:
+                                    checkpoint.mark_written(
+                                        row.xml_file, **{key: getattr(row, key) for key in CHECKPOINT_TOTALS})
+                                    checkpoint.maybe_commit(csvfile)
+                            elif isinstance(row, ExpandedRows):
+                                row.write(row_writer)
+                            elif row is not None:
+                                writer.writerow(row)
+                        finally:
+                            result_queue.task_done()
+                    # Commit what has been written, an aborted run can be resumed from here
+                    if csvfile:
+                        checkpoint.maybe_commit(csvfile, force=True)
             except Exception as e:
                 self.signals.error_occurred.emit("CSV Write Error", str(e))
 
         writer_thread = Thread(target=writer_worker, daemon=True, name="CSVWriterThread")
-        writer_thread.start()
+        if not aggregating:
+            writer_thread.start()
+        process_file = (partial(aggregate_single_xml, columns=self.aggregate_columns) if aggregating else
+                        partial(process_single_xml_expanded, layout=self.row_layout,
+                                max_column_matches=self.max_column_matches, max_file_rows=self.max_file_rows))
+
+        # Concurrency controller, in fixed mode it only measures
+        cpu_budget = detect_cpu_budget()
+        controller = AdaptiveConcurrencyController(
+            initial_limit=self.max_threads,
+            cpu_budget=cpu_budget,
+            enabled=self.auto_threads,
+            on_change=self._on_concurrency_change
+        )
+        self._stats.worker_mode = "auto" if self.auto_threads else "fixed"
+        self._stats.cpu_budget = cpu_budget
+        self._stats.initial_workers = controller.limit
+        tracker: Optional[DuplicateTracker] = None
+        prefetcher: Optional[FilePrefetcher] = None
+        status = STATUS_FAILED
+        run_peak_rss = RunPeakRss() if self.write_metrics else None
 
         try:
-            # Create thread pool for XML processing
-            self._executor = ThreadPoolExecutor(
-                max_workers=self.max_threads,
-                thread_name_prefix="XMLProcessor"
-            )
-
-            # Submit all tasks
-            futures = []
-            for xml_file in xml_files:
-                future = self._executor.submit(
-                    process_single_xml_optimized,
-                    xml_file,
-                    self.folder_path,
-                    self.xpath_expressions,
-                    self.headers,
-                    self.group_matches_flag,
-                    self._terminate_event,
-                    self._processor
-                )
-                futures.append(future)
-
-            # Process completed futures as they finish
-            for future in as_completed(futures):
+            # Files with a current copy in the columnar store are evaluated without parsing
+            if self.use_columnar_store:
+                xml_files = self._answer_from_columnar_store(xml_files, process_file, result_queue)
+
+            # Job on the shared worker pool, limited to the largest limit the controller may pick
+            self._executor = shared_worker_pool().job(
+                f"export {self.output_path.name}", controller.ceiling, PRIORITY_BULK)
+
+            # Order and group the files into tasks
+            plan = plan_tasks(self.folder_path, xml_files, self.scheduling_policy)
+            self._stats.scheduling_policy = plan.policy
+            self._stats.tasks_submitted = plan.task_count
+            self._stats.batched_files = plan.batched_files
+            self._stats.large_lane_files = plan.large_files
+
+            budget_bytes = resolve_memory_budget(self.memory_budget_bytes)
+            if budget_bytes > 0:
+                self._processor.memory_budget = MemoryBudget(budget_bytes)
+                self._stats.memory = self._processor.memory_budget.stats
+
+            if self.io_threads > 0:
+                # Files the budget streams aren't read ahead, their bytes would defeat streaming
+                budget = self._processor.memory_budget
+                prefetcher = FilePrefetcher(self.io_threads, self.prefetch_buffer_bytes, profiler,
+                                            skip_file=budget.should_stream if budget else None).start(
+                    str(self.folder_path / xml_file) for xml_file in self._prefetch_order(plan))
+                self._processor.prefetcher = prefetcher
+                self._stats.io_threads = self.io_threads
+                self._stats.prefetch = prefetcher.stats
+
+            if self.detect_encodings:
+                self._stats.encodings = self._processor.encoding_stats = EncodingStats()
+
+            # Hash contents ahead of the workers so identical files are evaluated once
+            if self.deduplicate_files:
+                hasher = ContentHasher(self.folder_path, [
+                    xml_file for lane in (plan.large_lane, plan.default_lane)
+                    for task in lane for xml_file in task.files
+                ]).start()
+                tracker = DuplicateTracker(hasher)
+
+            # Submit tasks in a window bounded by the current concurrency limit
+            pending: Dict[Any, FileTask] = {}
+
+            while True:
                 if self._terminate_event.is_set():
                     self.signals.program_output_progress_append.emit(
                         "Export aborted by user.")
                     break
 
-                try:
-                    result_rows, file_matches, has_matches = future.result(
-                        timeout=30)
-
-                    # Enqueue rows instead of writing directly
-                    if result_rows and has_matches:
-                        for row in result_rows:
-                            result_queue.put(row)
-                        self._stats.files_written += 1
+                while len(pending) < controller.limit:
+                    task = self._next_task(plan, pending, controller.limit)
+                    if task is None:
+                        break
+                    if tracker:
+                        task = self._claim_distinct_files(task, tracker, result_queue)
+                        if not task.files:
+                            continue
+                    future = self._executor.submit(
+                        controller.run_timed,
+                        process_xml_batch,
+                        task.files,
+                        self.folder_path,
+                        self.xpath_expressions,
+                        self.headers,
+                        self.group_matches_flag,
+                        self._terminate_event,
+                        self._processor,
+                        process_file
+                    )
+                    pending[future] = task
 
-                    # Update statistics
-                    self._stats.total_matches += file_matches
-                    self._stats.files_with_matches += has_matches
-                    self._stats.processed_files += 1
+                if not pending:
+                    break
 
+                done, _ = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+
+                # Process completed futures as they finish
+                completed_files = 0
+                for future in done:
+                    task = pending.pop(future)
+                    completed_files += len(task.files)
+                    try:
+                        results = future.result()
+                        # Results of a terminated run may be incomplete, they must not be checkpointed
+                        if self._terminate_event.is_set():
+                            continue
+                        for xml_file, result in zip(task.files, results):
+                            self._handle_file_result(xml_file, result, result_queue)
+                            if tracker:
+                                for duplicate, cached in tracker.complete(xml_file, result):
+                                    self._handle_duplicate_result(duplicate, cached, result_queue)
+
+                    except Exception as e:
+                        for xml_file in task.files:
+                            self._processor.report_error(xml_file, STAGE_TASK, e)
+                        self._stats.processed_files += len(task.files)
+                        if tracker:
+                            # Duplicates waiting for a failed file's result failed with it
+                            for xml_file in task.files:
+                                for duplicate in tracker.fail(xml_file):
+                                    self._processor.report_error(duplicate, STAGE_TASK, e)
+                                    self._stats.processed_files += 1
+
+                if tracker:
+                    tracker.release_finished()
+
+                if profiler:
+                    profiler.counter("pipeline", in_flight=len(pending), queued_rows=result_queue.qsize(),
+                                     worker_limit=controller.limit)
+
+                if done:
+                    controller.record_completed(completed_files)
                     # Update UI
                     progress = int(
                         (self._stats.processed_files / self._stats.total_files) * 100)
@@ -444,21 +1313,48 @@ class OptimizedCSVExportThread(QRunnable):
                         f"Processed {self._stats.processed_files}/{self._stats.total_files}"
                     )
 
-                except Exception as e:
-                    error_msg = f"Error processing file: {str(e)}"
-                    self._stats.errors.append(error_msg)
-                    self._stats.processed_files += 1
-                    logging.error(error_msg)
+                controller.maybe_adjust()
+
+                if run_peak_rss is not None:
+                    self._stats.peak_rss_bytes = run_peak_rss.sample()
 
-            # Ensure all queued rows are written before finishing
-            result_queue.join()
-            writer_thread_stop.set()
-            writer_thread.join(timeout=5)
+            self._record_concurrency_stats(controller)
+            if tracker:
+                self._stats.duplicate_files = tracker.duplicates
+                self._stats.hash_seconds = tracker.hasher.seconds
+
+            if aggregating:
+                if not self._terminate_event.is_set():
+                    self._write_aggregate()
+            else:
+                # Ensure all queued rows are written before finishing
+                result_queue.join()
+                writer_thread_stop.set()
+                # Closing a workbook compresses all of its sheets, that may take longer than flushing a CSV
+                writer_thread.join(timeout=None if self.xlsx_output else 5)
+
+            self._stats.checkpoints_written = checkpoint.commits
+            self._stats.errors = self._error_journal.total
+            if profiler:
+                self._stats.bytes_parsed = profiler.amount(BYTES_PARSED)
 
             # Final status
             if not self._terminate_event.is_set():
+                checkpoint.discard()
+                if self.shard:
+                    self._finish_shard()
                 self._stats.end_time = time.time()
                 self._emit_completion_message()
+                status = STATUS_COMPLETED
+            else:
+                status = STATUS_ABORTED
+                if self.xlsx_output:
+                    self.signals.program_output_progress_append.emit(
+                        f"Rows written before the abort are in {self.output_path.name}, "
+                        f"an XLSX export can't be resumed.")
+                elif not aggregating:
+                    self.signals.program_output_progress_append.emit(
+                        f"Progress saved to {checkpoint.path.name}, start the export again to resume.")
 
         except Exception as e:
             error_details = traceback.format_exc()
@@ -467,8 +1363,374 @@ class OptimizedCSVExportThread(QRunnable):
                 f"Export failed: {str(e)}\n\nDetails:\n{error_details}"
             )
         finally:
+            if tracker:
+                tracker.hasher.stop()
             if self._executor:
                 self._executor.shutdown(wait=True)
+            if prefetcher:
+                self._processor.prefetcher = None
+                prefetcher.stop()
+            if self._stop_requested_at is not None:
+                self._stats.abort_seconds = time.perf_counter() - self._stop_requested_at
+                self.signals.program_output_progress_append.emit(
+                    f"Export stopped {self._stats.abort_seconds:.2f} seconds after the abort request.")
+            self._processor.memory_budget = None
+            self._processor.error_journal = None
+            self._processor.encoding_stats = None
+            self._processor.terminate_event = None
+            if self._error_journal:
+                self._error_journal.close()
+            if profiler:
+                self._processor.profiler = None
+                if self.trace_stages:
+                    self._write_trace(profiler)
+            if self.write_metrics:
+                self._write_run_metrics(status, profiler)
+
+    def _write_trace(self, profiler: StageProfiler):
+        """Write the stage trace of the run next to the output."""
+        path = trace_path(self.output_path)
+        try:
+            profiler.write(path)
+        except OSError as e:
+            logging.warning(f"Stage trace could not be written to {path}: {e}")
+            return
+        dropped = f" ({profiler.dropped} dropped)" if profiler.dropped else ""
+        self.signals.program_output_progress_append.emit(
+            f"Stage trace: {profiler.event_count} events{dropped} written to {path.name}, "
+            f"open it in chrome://tracing or ui.perfetto.dev")
+
+    def _run_metrics(self, status: str, profiler: Optional[StageProfiler]) -> Dict[str, Any]:
+        """Metrics document of the run, every key is present in every run (None where not applicable)."""
+        stats = self._stats
+        end_time = stats.end_time or time.time()
+        elapsed = max(end_time - stats.start_time, 1e-9)
+        # Files skipped by a resumed checkpoint weren't processed by this run
+        run_files = stats.processed_files - stats.resumed_files
+        prefetch = stats.prefetch
+        memory = stats.memory
+        journal = self._error_journal
+        errors_by_class = [
+            {"stage": stage, "error_class": error_class, "count": summary.count}
+            for (stage, error_class), summary in (journal.classes.items() if journal else ())
+        ]
+        errors_by_stage: Dict[str, int] = {}
+        for error in errors_by_class:
+            errors_by_stage[error["stage"]] = errors_by_stage.get(error["stage"], 0) + error["count"]
+        return {
+            "schema_version": METRICS_SCHEMA_VERSION,
+            "status": status,
+            "success": status == STATUS_COMPLETED,
+            "job_fingerprint": self._job_fingerprint(),
+            "folder": str(self.folder_path),
+            "output": str(self.output_path),
+            "output_mode": stats.output_mode,
+            "row_layout": stats.row_layout,
+            "output_format": "xlsx" if self.xlsx_output else "csv",
+            "started_at": round(stats.start_time, 3),
+            "finished_at": round(end_time, 3),
+            "elapsed_seconds": round(elapsed, 3),
+            "abort_seconds": round(stats.abort_seconds, 3) if stats.abort_seconds is not None else None,
+            "files": {
+                "total": stats.total_files,
+                "processed": stats.processed_files,
+                "with_matches": stats.files_with_matches,
+                "written": stats.files_written,
+                "failed": stats.errors,
+                "resumed": stats.resumed_files,
+                "duplicates": stats.duplicate_files,
+                "index_skipped": stats.index_skipped_files,
+                "store_answered": stats.store_answered_files,
+                "capped": stats.capped_files,
+            },
+            "matches": stats.total_matches,
+            "bytes_parsed": stats.bytes_parsed,
+            "throughput": {
+                "files_per_second": round(run_files / elapsed, 3),
+                "bytes_per_second": round(stats.bytes_parsed / elapsed, 1),
+            },
+            "stages": {
+                stage: {"count": count, "seconds": round(seconds, 6)}
+                for stage, (count, seconds) in (profiler.stage_totals().items() if profiler else ())
+            },
+            "memory": {
+                "peak_rss_bytes": stats.peak_rss_bytes,
+                "process_peak_rss_bytes": process_peak_rss_bytes(),
+                "budget_bytes": memory.budget_bytes if memory else None,
+                "peak_reserved_bytes": memory.peak_reserved_bytes if memory else None,
+                "expansion_factor": round(memory.expansion_factor, 3) if memory else None,
+                "admission_waits": memory.waits if memory else None,
+                "streamed_files": memory.streamed_files if memory else None,
+            },
+            "workers": {
+                "mode": stats.worker_mode,
+                "cpu_budget": stats.cpu_budget,
+                "initial": stats.initial_workers,
+                "final": stats.final_workers,
+                "peak": stats.peak_workers,
+                "recommended": stats.recommended_workers,
+                "adjustments": stats.worker_adjustments,
+                "io_wait_fraction": round(stats.io_wait_fraction, 4),
+                "io_threads": stats.io_threads,
+            },
+            "cache": {
+                "prefetch_hit_rate": rate(prefetch.hits, prefetch.hits + prefetch.waits + prefetch.misses)
+                if prefetch else None,
+                "duplicate_rate": rate(stats.duplicate_files, run_files) if self.deduplicate_files else None,
+                "index_skip_rate": rate(stats.index_skipped_files, stats.total_files)
+                if self.use_corpus_index else None,
+                "store_hit_rate": rate(stats.store_answered_files, stats.total_files)
+                if self.use_columnar_store else None,
+            },
+            "errors": {
+                "total": stats.errors,
+                "by_stage": errors_by_stage,
+                "by_class": errors_by_class,
+            },
+            "encodings": {
+                "files_by_encoding": dict(stats.encodings.files_by_encoding),
+                "corrected_files": stats.encodings.corrected_files,
+                "recovered_files": stats.encodings.recovered_files,
+            } if stats.encodings else None,
+            "xlsx": {
+                "rows_written": stats.xlsx.rows_written,
+                "sheets": stats.xlsx.sheets,
+                "truncated_cells": stats.xlsx.truncated_cells,
+            } if stats.xlsx else None,
+        }
+
+    def _write_run_metrics(self, status: str, profiler: Optional[StageProfiler]):
+        """Write the metrics of the run next to the output, and to the textfile collector directory if set."""
+        metrics = self._run_metrics(status, profiler)
+        try:
+            path = write_metrics_json(metrics_path(self.output_path), metrics)
+            if self.prometheus_textfile_dir:
+                write_prometheus_textfile(prometheus_path(self.prometheus_textfile_dir, self.output_path), metrics)
+        except OSError as e:
+            logging.warning(f"Run metrics could not be written: {e}")
+            return
+        self.signals.program_output_progress_append.emit(f"Run metrics written to {path.name}")
+
+    def _handle_file_result(self, xml_file: str, result: Tuple[Any, int, int], result_queue: Queue):
+        """Queue the rows (or merge the partial aggregate) of a processed file and update the statistics."""
+        file_output, file_matches, has_matches = result
+        if self.output_mode == OUTPUT_AGGREGATE:
+            self._aggregate.merge(file_output)
+        else:
+            # Enqueue rows instead of writing directly, a full queue blocks here
+            with self._processor.trace(TRACE_QUEUE_ROWS):
+                written = capped = 0
+                if file_output and has_matches:
+                    for row in file_output:
+                        result_queue.put(row)
+                        if isinstance(row, ExpandedRows) and row.truncated:
+                            capped += 1
+                    written = 1
+                self._stats.files_written += written
+                self._stats.capped_files += capped
+                result_queue.put(FileWritten(xml_file, has_matches, file_matches, written, capped))
+
+        # Update statistics
+        self._stats.total_matches += file_matches
+        self._stats.files_with_matches += has_matches
+        self._stats.processed_files += 1
+
+    def _handle_duplicate_result(self, xml_file: str, result: Tuple[List[Dict[str, str]], int, int], result_queue: Queue):
+        """Reuse the result of an identical file, only the filename differs."""
+        if self.output_mode == OUTPUT_AGGREGATE:
+            self._handle_file_result(xml_file, result, result_queue)
+            return
+        result_rows, file_matches, has_matches = result
+        filename = Path(xml_file).stem
+        rows = [row.with_filename(filename) if isinstance(row, ExpandedRows) else {**row, "Filename": filename}
+                for row in result_rows]
+        self._handle_file_result(xml_file, (rows, file_matches, has_matches), result_queue)
+
+    def _claim_distinct_files(self, task: FileTask, tracker: DuplicateTracker, result_queue: Queue) -> FileTask:
+        """Drop files whose content is already being processed from a task."""
+        files = []
+        for xml_file in task.files:
+            must_process, ready = tracker.claim(xml_file)
+            if must_process:
+                files.append(xml_file)
+            elif self._processor.prefetcher:
+                # No worker takes a duplicate, its read ahead bytes would fill the buffer for the rest of the run
+                self._processor.prefetcher.release(str(self.folder_path / xml_file))
+            for duplicate, cached in ready:
+                self._handle_duplicate_result(duplicate, cached, result_queue)
+        return replace(task, files=files)
+
+    def _limit_to_index_candidates(self, xml_files: List[str]) -> List[str]:
+        """Drop files the corpus index proves can't match any XPath expression."""
+        index = CorpusIndex(self.folder_path, self.corpus_index_path)
+        if not index.exists():
+            self.signals.program_output_progress_append.emit(
+                "No corpus index found for this folder, build it to skip non-matching files.")
+            return xml_files
+        try:
+            with index:
+                candidates = index.candidate_files(self.xpath_expressions, xml_files, self.namespaces)
+        except Exception as e:
+            logging.warning(f"Corpus index not used: {e}")
+            return xml_files
+        if candidates is None:
+            self.signals.program_output_progress_append.emit(
+                "Corpus index not used, an XPath expression is too complex to analyse.")
+            return xml_files
+
+        self._stats.index_skipped_files = len(xml_files) - len(candidates)
+        self._stats.processed_files += self._stats.index_skipped_files
+        self.signals.program_output_progress_append.emit(
+            f"Corpus index: {len(candidates)} candidate files, skipping {self._stats.index_skipped_files}"
+        )
+        return candidates
+
+    def _answer_from_columnar_store(self, xml_files: List[str], process_file: Callable, result_queue: Queue) -> List[str]:
+        """Evaluate the files the columnar store holds a current copy of.
+
+        Returns:
+            The files that still have to be parsed
+        """
+        store = ColumnarStore(self.folder_path, self.columnar_store_path)
+        if not store.exists():
+            self.signals.program_output_progress_append.emit(
+                "No columnar store found for this folder, build it to answer simple XPaths without parsing.")
+            return xml_files
+        # Values of files not in their declared encoding would differ from a parse of the file
+        if not store.detects_encodings():
+            self.signals.program_output_progress_append.emit(
+                "Columnar store not used, it was built before encoding detection; rebuild it to use it again.")
+            return xml_files
+        if not self.detect_encodings:
+            self.signals.program_output_progress_append.emit(
+                "Columnar store not used, it holds files in their detected encoding and detection is off.")
+            return xml_files
+        if not store.can_answer(self.xpath_expressions, self.namespaces):
+            self.signals.program_output_progress_append.emit(
+                "Columnar store not used, it only answers simple paths like //a/b/text(), /a/b/@c or //a/b.")
+            return xml_files
+
+        start = time.perf_counter()
+        fresh = store.fresh_files(xml_files)
+        results = store.execute_xpaths(self.xpath_expressions, fresh, self.namespaces)
+        for xml_file in fresh:
+            if self._terminate_event.is_set():
+                break
+            result = process_file(xml_file, self.folder_path, self.xpath_expressions, self.headers,
+                                  self.group_matches_flag, self._terminate_event, self._processor,
+                                  xpath_results=results[xml_file])
+            self._handle_file_result(xml_file, result, result_queue)
+        self._stats.store_answered_files = len(fresh)
+        self.signals.program_output_progress_append.emit(
+            f"Columnar store answered {len(fresh)} files in {time.perf_counter() - start:.2f} seconds, "
+            f"parsing {len(xml_files) - len(fresh)} new or changed files"
+        )
+        return [xml_file for xml_file in xml_files if xml_file not in fresh]
+
+    def _aggregate_column_order(self) -> List[str]:
+        """Output columns in header order, restricted to the chosen aggregate columns."""
+        columns = generate_csv_headers(self.xpath_expressions, self.headers, self._processor)[1:]
+        if self.aggregate_columns is not None:
+            columns = [c for c in columns if c in self.aggregate_columns]
+        return columns
+
+    def _write_aggregate(self):
+        """Write the merged corpus aggregate to the output and summary CSV files."""
+        self.output_path.parent.mkdir(parents=True, exist_ok=True)
+        summary_path = self._aggregate.write_csv(self.output_path, self._aggregate_column_order())
+        self._stats.distinct_values = self._aggregate.distinct_values
+        self.signals.program_output_progress_append.emit(f"Aggregate summary saved: {summary_path}")
+
+    def _finish_shard(self):
+        """Order the rows of a shard by filename and write its statistics for the merge."""
+        index, count = self.shard
+        rows_written = 0
+        if self.output_mode == OUTPUT_ROWS:
+            rows_written = sort_csv_by_filename(self.output_path)
+        stats = {
+            "job": compute_job_fingerprint(
+                xpath_expressions=self.xpath_expressions,
+                headers=self.headers,
+                group_matches=self.group_matches_flag,
+                namespaces=self.namespaces,
+                output_mode=self.output_mode,
+            ),
+            "shard": index,
+            "shard_count": count,
+            "output_mode": self.output_mode,
+            "ordered_by_filename": self.output_mode == OUTPUT_ROWS,
+            "completed": True,
+            "total_files": self._stats.total_files,
+            "processed_files": self._stats.processed_files,
+            "files_with_matches": self._stats.files_with_matches,
+            "total_matches": self._stats.total_matches,
+            "rows_written": rows_written,
+            "elapsed_seconds": round(time.time() - self._stats.start_time, 3),
+        }
+        previous = read_shard_stats(self.output_path) if self.retry_failed_files else None
+        if previous:
+            # The retried files were already counted as processed by the earlier run
+            for key in ("total_files", "processed_files"):
+                stats[key] = previous.get(key, stats[key])
+            for key in ("files_with_matches", "total_matches"):
+                stats[key] += previous.get(key, 0)
+        stats_path = write_shard_stats(self.output_path, stats)
+        self.signals.program_output_progress_append.emit(
+            f"Shard {index}/{count}: {self._stats.total_files} files, statistics saved to {stats_path.name}")
+
+    def _job_fingerprint(self) -> str:
+        """Fingerprint of everything that affects the output, used to match checkpoints."""
+        return compute_job_fingerprint(
+            folder=str(self.folder_path.resolve()),
+            output=str(self.output_path.resolve()),
+            xpath_expressions=self.xpath_expressions,
+            headers=self.headers,
+            group_matches=self.group_matches_flag,
+            namespaces=self.namespaces,
+            output_mode=self.output_mode,
+            aggregate_columns=self.aggregate_columns,
+            row_layout=self.row_layout,
+            max_column_matches=self.max_column_matches,
+            max_file_rows=self.max_file_rows,
+            xml_files=self.xml_files,
+            shard=self.shard,
+            retry_failed_files=self.retry_failed_files,
+        )
+
+    def _next_task(self, plan: SchedulePlan, pending: Dict[Any, FileTask], limit: int) -> Optional[FileTask]:
+        """Pick the next task to submit, large lane first while it has free slots."""
+        if plan.large_lane:
+            lane_limit = self.large_lane_workers or max(1, limit // 2)
+            in_flight = sum(1 for task in pending.values() if task.lane == LARGE_LANE)
+            if in_flight < lane_limit:
+                return plan.large_lane.popleft()
+        if plan.default_lane:
+            return plan.default_lane.popleft()
+        return None
+
+    def _prefetch_order(self, plan: SchedulePlan) -> List[str]:
+        """Files in about the order the workers take them, large and default lane tasks alternating."""
+        order = []
+        for tasks in zip_longest(plan.large_lane, plan.default_lane):
+            for task in tasks:
+                if task is not None:
+                    order.extend(task.files)
+        return order
+
+    def _on_concurrency_change(self, change: ConcurrencyChange):
+        """Report a worker concurrency adjustment made by the controller."""
+        self.signals.program_output_progress_append.emit(
+            f"Worker threads {change.old_limit} -> {change.new_limit}: {change.reason} "
+            f"({change.throughput:.1f} files/s, I/O wait {change.io_wait:.0%})"
+        )
+
+    def _record_concurrency_stats(self, controller: AdaptiveConcurrencyController):
+        """Copy the final concurrency figures of the run into the statistics."""
+        self._stats.final_workers = controller.limit
+        self._stats.peak_workers = controller.peak_limit
+        self._stats.recommended_workers = controller.recommended_limit
+        self._stats.worker_adjustments = len(controller.changes)
+        self._stats.io_wait_fraction = controller.io_wait_fraction
 
     def _emit_completion_message(self):
         """Emit completion status message."""
@@ -479,12 +1741,82 @@ class OptimizedCSVExportThread(QRunnable):
             f"Total matches found: {self._stats.total_matches}",
             f"Rows written to CSV: {self._stats.files_written}",
             f"Output saved: {self.output_path}",
-            f"Elapsed time: {self._stats.end_time - self._stats.start_time:.2f} seconds"
+            f"Elapsed time: {self._stats.end_time - self._stats.start_time:.2f} seconds",
+            f"Worker threads ({self._stats.worker_mode}): {self._stats.initial_workers} -> "
+            f"{self._stats.final_workers}, peak {self._stats.peak_workers}, CPU budget {self._stats.cpu_budget}",
+            f"Recommended worker threads: {self._stats.recommended_workers} "
+            f"(I/O wait {self._stats.io_wait_fraction:.0%}, {self._stats.worker_adjustments} adjustments)",
+            f"Scheduling ({self._stats.scheduling_policy}): {self._stats.tasks_submitted} tasks, "
+            f"{self._stats.batched_files} files batched, {self._stats.large_lane_files} in large file lane"
         ]
 
+        if self._stats.bytes_parsed:
+            elapsed = max(self._stats.end_time - self._stats.start_time, 1e-9)
+            message_parts.append(
+                f"Throughput: {(self._stats.processed_files - self._stats.resumed_files) / elapsed:.1f} files/s, "
+                f"{self._stats.bytes_parsed / 1_048_576 / elapsed:.1f} MB/s parsed")
+
+        if self.deduplicate_files:
+            message_parts.append(
+                f"Duplicate files collapsed: {self._stats.duplicate_files} "
+                f"(hashing took {self._stats.hash_seconds:.2f} seconds)")
+
+        if self._stats.output_mode == OUTPUT_AGGREGATE:
+            message_parts.append(
+                f"Aggregated {self._stats.distinct_values} distinct values over "
+                f"{len(self._aggregate.columns)} columns")
+
+        if self._stats.index_skipped_files:
+            message_parts.append(f"Files skipped by corpus index: {self._stats.index_skipped_files}")
+
+        if self._stats.store_answered_files:
+            message_parts.append(f"Files answered from columnar store: {self._stats.store_answered_files}")
+
+        if self._stats.prefetch:
+            prefetch = self._stats.prefetch
+            message_parts.append(
+                f"I/O prefetch ({self._stats.io_threads} threads): {prefetch.hits} files ready, "
+                f"{prefetch.waits} waited for, {prefetch.misses} read by workers, {prefetch.skipped} too large to buffer, "
+                f"{prefetch.prefetched_bytes / 1_048_576:.1f} MB read in {prefetch.read_seconds:.2f} seconds")
+
+        if self._stats.memory:
+            memory = self._stats.memory
+            message_parts.append(
+                f"Memory budget: {memory.budget_bytes / 1_048_576:.0f} MB, expansion factor "
+                f"{memory.expansion_factor:.1f} ({memory.factor_samples} samples), peak reserved "
+                f"{memory.peak_reserved_bytes / 1_048_576:.0f} MB, {memory.waits} files waited "
+                f"{memory.wait_seconds:.2f} seconds, {memory.streamed_files} streamed, "
+                f"{memory.exclusive_files} parsed alone")
+
+        if self._stats.encodings:
+            encodings = self._stats.encodings
+            message_parts.append(
+                "Encodings: " + ", ".join(f"{name} {count}" for name, count in
+                                          sorted(encodings.files_by_encoding.items(), key=lambda item: -item[1]))
+                + f"; {encodings.corrected_files} files not in their declared encoding, "
+                  f"{encodings.recovered_files} files recovered from {encodings.recovered_errors} parse errors")
+
+        if self._stats.row_layout == ROW_LAYOUT_LONG:
+            message_parts.append("Rows written in long layout: Filename, Column, Index, Value")
+
+        if self._stats.xlsx:
+            xlsx = self._stats.xlsx
+            truncated = f", {xlsx.truncated_cells} values cut off at Excel's cell limit" if xlsx.truncated_cells else ""
+            message_parts.append(f"XLSX workbook: {xlsx.rows_written} rows on {xlsx.sheets} sheets{truncated}")
+
+        if self._stats.capped_files:
+            message_parts.append(
+                f"Files truncated by the match caps: {self._stats.capped_files} "
+                f"(per column {self.max_column_matches or 'unlimited'}, per file {self.max_file_rows or 'unlimited'} rows)")
+
+        if self._stats.resumed_files:
+            message_parts.append(
+                f"Resumed from checkpoint: {self._stats.resumed_files} files skipped")
+
         if self._stats.errors:
             message_parts.append(
-                f"Errors encountered: {len(self._stats.errors)}")
+                f"Errors encountered: {self._stats.errors}, journaled to {self._error_journal.path.name}")
+            message_parts.extend(f"  {line}" for line in self._error_journal.summary_lines())
 
         self.signals.program_output_progress_set_text.emit(
             "\n".join(message_parts))
@@ -496,7 +1828,29 @@ def create_xpath_searcher_and_csv_exporter(
     output_save_path_for_csv_export: str,
     csv_headers_list: List[str],
     group_matches_flag: bool = True,
-    max_threads: int = None
+    max_threads: int | str | None = "auto",
+    scheduling_policy: str = "directory",
+    resume_from_checkpoint: bool = True,
+    deduplicate_files: bool = False,
+    namespaces: Optional[Dict[str, str]] = None,
+    output_mode: str = OUTPUT_ROWS,
+    aggregate_columns: Optional[List[str]] = None,
+    use_corpus_index: bool = False,
+    use_columnar_store: bool = False,
+    xml_files: Optional[List[str]] = None,
+    io_threads: int = 0,
+    prefetch_buffer_bytes: int = DEFAULT_PREFETCH_BUFFER_BYTES,
+    shard: Optional[Tuple[int, int]] = None,
+    memory_budget_bytes: int | str = AUTO_MEMORY_BUDGET,
+    retry_failed_files: bool = False,
+    detect_encodings: bool = True,
+    trace_stages: bool = False,
+    trace_sample_every: int = 1,
+    write_metrics: bool = True,
+    prometheus_textfile_dir: Optional[str] = None,
+    row_layout: str = ROW_LAYOUT_WIDE,
+    max_column_matches: int = 0,
+    max_file_rows: int = 0
 ) -> OptimizedCSVExportThread:
     """Create an optimized CSV export thread.
 
@@ -506,14 +1860,52 @@ def create_xpath_searcher_and_csv_exporter(
         output_save_path_for_csv_export: Output CSV file path
         csv_headers_list: CSV headers for each XPath
         group_matches_flag: Whether to group matches in single row
-        max_threads: Maximum threads to use (defaults to CPU count)
+        max_threads: Worker threads to use, or "auto" to start from the cgroup aware
+            CPU budget and adapt to measured throughput and I/O wait during the run
+        scheduling_policy: Task order, "directory", "largest_first" or "size_aware"
+        resume_from_checkpoint: Continue an interrupted export of the same job from its checkpoint
+        deduplicate_files: Hash file contents and evaluate byte-identical files only once
+        namespaces: Prefix to namespace URI map for the XPaths, None detects it from a sample of files
+        output_mode: "rows" writes one CSV row per match (or file), "aggregate" writes value
+            frequencies and files per value for each column plus a per-column summary CSV
+        aggregate_columns: Output columns to aggregate (default all), e.g. ["Description"]
+        use_corpus_index: Only parse files the folder's corpus index can't rule out
+        use_columnar_store: Answer simple path XPaths from the folder's columnar store, only
+            new or changed files are parsed
+        xml_files: Only export these file names of the folder (default all *.xml files)
+        io_threads: Threads of a separate I/O stage reading files ahead of the parser workers
+            (sized independently of max_threads), 0 lets every worker read its own files
+        prefetch_buffer_bytes: Memory the I/O stage may fill with files not parsed yet
+        shard: (index, count) to export only shard ``index`` of ``count`` (counted from 1), files are
+            assigned by a stable hash of their name; the rows are ordered by filename and the
+            statistics saved next to the output for merge_shard_outputs
+        memory_budget_bytes: Memory the parsed trees of the files in flight may take together,
+            a file reserves its size times a learned expansion factor before it is parsed and
+            waits while the budget is used up; files too large for the whole budget are streamed
+            (simple path XPaths) or parsed alone. "auto" uses half of the memory available to the
+            process (cgroup aware), 0 disables admission control
+        retry_failed_files: Only export the files that failed to read or parse in the last run, as
+            listed in its error journal (``<output>.errors.jsonl``), and append their rows to the output
+        detect_encodings: Read each file once and detect its encoding from the byte order mark,
+            the declaration and the content, so misdeclared UTF-8, ISO-8859-1 and Windows-1252
+            files are decoded correctly instead of being damaged by recover mode
+        trace_stages: Record the time spent enumerating, reading, parsing, evaluating XPaths,
+            formatting, queueing and writing per worker thread, written as Chrome trace JSON to
+            ``<output>.trace.json`` (open it in chrome://tracing or ui.perfetto.dev)
+        trace_sample_every: Only trace the stages of every n-th file, keeps long runs small
+        write_metrics: Write ``<output>.metrics.json`` after every run (completed, aborted or failed):
+            files/s, bytes/s, stage timings, peak memory, workers, cache hit rates, errors and the
+            job fingerprint, in a stable format for monitoring
+        prometheus_textfile_dir: Also write the metrics as a ``.prom`` file to this directory,
+            for the node exporter textfile collector
+        row_layout: "wide" writes a column per XPath and pads shorter columns with Null, "long"
+            writes one row per value (Filename, Column, Index, Value) without padding
+        max_column_matches: Values written per column of a file at most, 0 = all
+        max_file_rows: Rows written per file at most, 0 = all
 
     Returns:
         Optimized CSV export thread
     """
-    if max_threads is None:
-        max_threads = min(os.cpu_count() or 4, 16)  # Reasonable default
-
     return OptimizedCSVExportThread(
         "export",
         folder_path_containing_xml_files=folder_path_containing_xml_files,
@@ -521,5 +1913,27 @@ def create_xpath_searcher_and_csv_exporter(
         output_save_path_for_csv_export=output_save_path_for_csv_export,
         csv_headers_list=csv_headers_list,
         group_matches_flag=group_matches_flag,
-        max_threads=max_threads
+        max_threads=max_threads,
+        scheduling_policy=scheduling_policy,
+        resume_from_checkpoint=resume_from_checkpoint,
+        deduplicate_files=deduplicate_files,
+        namespaces=namespaces,
+        output_mode=output_mode,
+        aggregate_columns=aggregate_columns,
+        use_corpus_index=use_corpus_index,
+        use_columnar_store=use_columnar_store,
+        xml_files=xml_files,
+        io_threads=io_threads,
+        prefetch_buffer_bytes=prefetch_buffer_bytes,
+        shard=shard,
+        memory_budget_bytes=memory_budget_bytes,
+        retry_failed_files=retry_failed_files,
+        detect_encodings=detect_encodings,
+        trace_stages=trace_stages,
+        trace_sample_every=trace_sample_every,
+        write_metrics=write_metrics,
+        prometheus_textfile_dir=prometheus_textfile_dir,
+        row_layout=row_layout,
+        max_column_matches=max_column_matches,
+        max_file_rows=max_file_rows
     )
@@ -0,0 +1,78 @@
+"""Check of the adaptive worker limit with I/O bound and CPU bound tasks.
+
+An I/O bound corpus (tasks that only sleep, like reads from network storage)
+must take the limit above the CPU budget; a CPU bound one must keep it there.
+
+Run from the repository root: python tests/AdaptiveConcurrencyCheck.py
+The test_* functions also run under pytest.
+"""
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from modules.worker_tuning import AdaptiveConcurrencyController  # noqa: E402
+
+CPU_BUDGET = 2
+CEILING = 6
+INTERVAL = 0.3
+RUN_SECONDS = 6.0
+TASK_SECONDS = 0.02
+
+
+def io_bound_task():
+    time.sleep(TASK_SECONDS)
+
+
+def cpu_bound_task():
+    end = time.thread_time() + TASK_SECONDS
+    while time.thread_time() < end:
+        pass
+
+
+def drive(task) -> AdaptiveConcurrencyController:
+    """Run the task the way the exporter runs files: at most controller.limit in flight."""
+    controller = AdaptiveConcurrencyController(initial_limit=CPU_BUDGET, cpu_budget=CPU_BUDGET,
+                                               ceiling=CEILING, interval=INTERVAL)
+    pending = set()
+    deadline = time.perf_counter() + RUN_SECONDS
+    with ThreadPoolExecutor(max_workers=CEILING) as executor:
+        while time.perf_counter() < deadline:
+            while len(pending) < controller.limit:
+                pending.add(executor.submit(controller.run_timed, task))
+            done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+            controller.record_completed(len(done))
+            controller.maybe_adjust()
+        wait(pending)
+    return controller
+
+
+def describe(controller: AdaptiveConcurrencyController) -> str:
+    return (f"limit {controller.limit}, peak {controller.peak_limit}, "
+            f"changes {[(c.old_limit, c.new_limit, c.reason) for c in controller.changes]}")
+
+
+def test_io_bound_tasks_grow_past_cpu_budget():
+    controller = drive(io_bound_task)
+    assert controller.limit > CPU_BUDGET, describe(controller)
+
+
+def test_cpu_bound_tasks_stay_at_cpu_budget():
+    controller = drive(cpu_bound_task)
+    # A probe may be running when the run ends, but none is kept
+    assert controller.limit <= CPU_BUDGET + 1, describe(controller)
+    assert all(c.new_limit <= CPU_BUDGET + 1 for c in controller.changes), describe(controller)
+
+
+def main():
+    for name, task in (("I/O bound", io_bound_task), ("CPU bound", cpu_bound_task)):
+        print(f"{name}: {describe(drive(task))}")
+    test_io_bound_tasks_grow_past_cpu_budget()
+    test_cpu_bound_tasks_stay_at_cpu_budget()
+    print("Checks passed.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Micro-benchmark of the per-match cost of evaluating and formatting XPath values.
+
+Compares the former per-match path (smart strings, format_match_value and newline
+flattening per match, a Python element per counted node) with the batch path of
+OptimizedXMLProcessor (plain strings, format_match_values, count() in libxml2).
+
+Run from the repository root: python tests/ValueFormattingBenchmark.py [file.xml xpath [xpath ...]]
+Without arguments a text-heavy synthetic profile is generated.
+"""
+import sys
+import threading
+import timeit
+from pathlib import Path
+
+from lxml import etree as ET
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from modules.xpath_search_and_csv_export import (  # noqa: E402
+    OptimizedXMLProcessor,
+    _collect_match_values,
+)
+from modules.xpath_analysis import COLUMN_STRINGS  # noqa: E402
+
+ITEMS = 20_000
+ROUNDS = 20
+SYNTHETIC_XPATHS = ["//item/name/text()", "//item/@id", "//item/note/text()", "//item", "//item/note"]
+
+
+def synthetic_profile() -> ET._Element:
+    """Items with padded text, empty values and a multiline value every 50 items."""
+    parts = ["<profile>"]
+    for i in range(ITEMS):
+        note = f"  first line {i}\n  second line  " if i % 50 == 0 else f" note {i} "
+        parts.append(f'<item id="unit-{i}"><name>  Name of item {i}  </name><note>{note}</note>'
+                     f'<empty> </empty></item>')
+    parts.append("</profile>")
+    return ET.fromstring("".join(parts).encode("utf-8"))
+
+
+def per_match_values(processor: OptimizedXMLProcessor, compiled, root, xpaths, headers):
+    """The former path: every match is formatted and flattened on its own."""
+    all_results = {}
+    for xpath, header in zip(xpaths, headers):
+        matches = compiled[xpath](root)
+        if processor.column_kind(xpath) == COLUMN_STRINGS:
+            values = []
+            for match in matches:
+                formatted_value = processor.format_match_value(match)
+                if formatted_value:
+                    if "\n" in formatted_value or "\r" in formatted_value:
+                        formatted_value = formatted_value.replace("\n", " ").replace("\r", " ")
+                    values.append(formatted_value)
+            all_results[header] = values
+        elif matches:
+            all_results[f"{header} Match Count"] = [str(len(matches))]
+    return all_results
+
+
+def batch_values(processor: OptimizedXMLProcessor, root, xpaths, headers):
+    results = processor.execute_xpath_batch(root, xpaths)
+    return _collect_match_values(xpaths, headers, threading.Event(), processor, results)[0]
+
+
+def bench(label: str, func, matches: int) -> float:
+    seconds = min(timeit.repeat(func, number=ROUNDS, repeat=3)) / ROUNDS
+    print(f"{label:<28} {seconds * 1000:8.2f} ms per file  {seconds / max(matches, 1) * 1e9:7.0f} ns per match")
+    return seconds
+
+
+def main():
+    if len(sys.argv) > 2:
+        root = ET.parse(sys.argv[1], ET.XMLParser(huge_tree=True)).getroot()
+        xpaths = sys.argv[2:]
+    else:
+        root = synthetic_profile()
+        xpaths = SYNTHETIC_XPATHS
+    headers = [f"Column {n}" for n in range(len(xpaths))]
+    processor = OptimizedXMLProcessor()
+    smart = {xpath: ET.XPath(xpath) for xpath in xpaths}
+
+    before = per_match_values(processor, smart, root, xpaths, headers)
+    after = {column: values for column, values in batch_values(processor, root, xpaths, headers).items() if values}
+    if before != after:
+        raise SystemExit("Batch values differ from the per-match values")
+    matches = sum(len(smart[xpath](root)) for xpath in xpaths)
+    print(f"{len(xpaths)} XPaths, {matches} matches per file")
+
+    old = bench("per match (smart strings)", lambda: per_match_values(processor, smart, root, xpaths, headers),
+                matches)
+    new = bench("batch (plain strings)", lambda: batch_values(processor, root, xpaths, headers), matches)
+    print(f"Saving: {(old - new) / max(matches, 1) * 1e9:.0f} ns per match ({old / new:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()